@@ -0,0 +1,116 @@
+"""
+Chat history query latency before and after the chat_messages indexes.
+
+Seeds a throwaway collection on a real MongoDB with N chat documents spread
+over several streams, then times the queries behind /api/chat-history with
+no secondary indexes and again after creating CHAT_MESSAGE_INDEXES. The
+winning plan of each query is printed so a COLLSCAN + SORT can be told
+apart from an IXSCAN. Requires a running mongod.
+
+Usage (from backend/):
+    python -m benchmarks.chat_history_indexes --mongo-url mongodb://localhost:27017
+    python -m benchmarks.chat_history_indexes --documents 5000000 --runs 20
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from services.database import CHAT_MESSAGE_INDEXES
+
+STREAMS = [f"streamer{i}" for i in range(20)]
+
+
+async def seed(collection, documents: int, batch_size: int = 10000):
+    started_at = datetime.now() - timedelta(days=30)
+    step = timedelta(days=30) / documents
+    inserted = 0
+    while inserted < documents:
+        count = min(batch_size, documents - inserted)
+        await collection.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "user": f"viewer{random.randrange(50000)}",
+                "message": "hola " * random.randint(1, 5),
+                "timestamp": started_at + step * (inserted + i),
+                "username_stream": random.choice(STREAMS)
+            }
+            for i in range(count)
+        ], ordered=False)
+        inserted += count
+        if inserted % 500000 == 0 or inserted == documents:
+            print(f"  seeded {inserted}/{documents}")
+
+
+def winning_stages(plan: dict) -> str:
+    """Flatten a winning plan into e.g. LIMIT > FETCH > IXSCAN"""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(stages)
+
+
+async def time_queries(collection, runs: int, limit: int):
+    queries = {
+        "newest (all streams)": {},
+        "newest (one stream)": {"username_stream": STREAMS[0]},
+        "newest (one user)": {"user": "viewer42"},
+    }
+    order = [("timestamp", -1), ("id", -1)]
+    results = {}
+    for label, query in queries.items():
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await collection.find(query).sort(order).limit(limit).to_list(length=limit)
+            samples.append(time.perf_counter() - started)
+        explain = await collection.find(query).sort(order).limit(limit).explain()
+        plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        results[label] = (statistics.median(samples), max(samples), winning_stages(plan))
+    return results
+
+
+def report(title: str, results: dict):
+    print(title)
+    for label, (median, worst, plan) in results.items():
+        print(f"  {label:<22} median {median * 1000:>9.2f}ms  max {worst * 1000:>9.2f}ms  plan {plan}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--documents", type=int, default=5_000_000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="do not drop the seeded collection")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    collection = client["tiktok_tts_bot_bench"][f"chat_messages_{uuid.uuid4().hex[:8]}"]
+
+    print(f"Seeding {args.documents} documents into {collection.full_name}")
+    await seed(collection, args.documents)
+
+    report("Without indexes:", await time_queries(collection, args.runs, args.limit))
+
+    for name, keys in CHAT_MESSAGE_INDEXES:
+        started = time.perf_counter()
+        await collection.create_index(keys, name=name)
+        print(f"Built index {name} in {time.perf_counter() - started:.1f}s")
+
+    report("With indexes:", await time_queries(collection, args.runs, args.limit))
+
+    if not args.keep:
+        await collection.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Chat persistence benchmark: one insert_one per message vs write-behind batching.
+
+Runs against a real MongoDB when --mongo-url is given (a throwaway
+collection is created and dropped), otherwise against an in-process
+stand-in collection that charges a fixed round-trip time per call plus a
+small per-document cost.
+
+Usage (from backend/):
+    python -m benchmarks.chat_persistence
+    python -m benchmarks.chat_persistence --messages 50000 --rtt 0.001
+    python -m benchmarks.chat_persistence --mongo-url mongodb://localhost:27017
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from models.chat_message import ChatMessage
+from services.database import BufferedChatWriter
+
+
+class SimulatedCollection:
+    """Stand-in for a Motor collection with a fixed network round trip"""
+
+    def __init__(self, rtt: float, per_document: float):
+        self.rtt = rtt
+        self.per_document = per_document
+        self.documents = 0
+        self.round_trips = 0
+
+    async def insert_one(self, document):
+        await asyncio.sleep(self.rtt + self.per_document)
+        self.documents += 1
+        self.round_trips += 1
+
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(self.rtt + self.per_document * len(documents))
+        self.documents += len(documents)
+        self.round_trips += 1
+
+
+async def run_single(collection, messages, concurrency):
+    queue = asyncio.Queue()
+    for message in messages:
+        queue.put_nowait(message)
+
+    async def worker():
+        while not queue.empty():
+            message = queue.get_nowait()
+            await collection.insert_one(message.to_dict())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def run_batched(collection, messages, batch_size, flush_interval):
+    writer = BufferedChatWriter(collection, batch_size=batch_size, flush_interval=flush_interval, max_buffer=len(messages) + 1)
+    writer.start()
+    started = time.perf_counter()
+    for index, message in enumerate(messages):
+        writer.add(message.to_dict())
+        if index % batch_size == 0:
+            # Let the flusher run, as it would between incoming comments
+            await asyncio.sleep(0)
+    await writer.stop()
+    return time.perf_counter() - started, writer
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel insert_one workers (pipeline persistence concurrency)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--rtt", type=float, default=0.0005, help="stand-in round trip in seconds")
+    parser.add_argument("--per-doc", type=float, default=0.00001, help="stand-in cost per document in seconds")
+    parser.add_argument("--mongo-url", default=None)
+    args = parser.parse_args()
+
+    messages = [ChatMessage(user=f"viewer{i % 300}", message=f"mensaje {i}", username_stream="bench") for i in range(args.messages)]
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url)
+        database = client["tiktok_tts_bot_bench"]
+        single_collection = database[f"single_{uuid.uuid4().hex[:8]}"]
+        batched_collection = database[f"batched_{uuid.uuid4().hex[:8]}"]
+        target = args.mongo_url
+    else:
+        single_collection = SimulatedCollection(args.rtt, args.per_doc)
+        batched_collection = SimulatedCollection(args.rtt, args.per_doc)
+        target = f"stand-in (rtt {args.rtt * 1000:.2f}ms)"
+
+    single_elapsed = await run_single(single_collection, messages, args.concurrency)
+    # Fresh documents: insert_one added _id to the dicts of the first run
+    messages = [ChatMessage(user=m.user, message=m.message, username_stream=m.username_stream) for m in messages]
+    batched_elapsed, writer = await run_batched(batched_collection, messages, args.batch_size, args.flush_interval)
+
+    print(f"target: {target}, messages: {args.messages}")
+    print(f"single  insert_one x{args.concurrency:<3} {args.messages / single_elapsed:>10.0f} msg/s  round trips {args.messages}")
+    print(f"batched insert_many     {args.messages / batched_elapsed:>10.0f} msg/s  round trips {writer.flushes}")
+    print(f"speedup: {single_elapsed / batched_elapsed:.1f}x")
+
+    if args.mongo_url:
+        await single_collection.drop()
+        await batched_collection.drop()
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Connection registry micro-benchmark: connect/disconnect churn.
+
+Connects N clients to a WebSocketManager, then disconnects them all in
+random order (a mass disconnect after a deploy), for several rounds. The
+same churn is replayed against a list-backed registry with linear lookup
+and list.remove, as WebSocketManager used to keep its connections.
+
+Usage (from backend/):
+    python -m benchmarks.connection_registry
+    python -m benchmarks.connection_registry --connections 20000 --rounds 3
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from services.websocket_connection import ClientConnection
+from services.websocket_manager import WebSocketManager
+
+
+class NullWebSocket:
+    """Client stand-in that accepts every frame"""
+
+    client = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+
+class ListRegistry:
+    """The previous registry: a list scanned on every lookup and removal"""
+
+    def __init__(self):
+        self.active_connections = []
+
+    def connect(self, websocket):
+        self.active_connections.append(ClientConnection(websocket, on_failure=lambda client: None))
+
+    def disconnect(self, websocket):
+        for client in self.active_connections:
+            if client.websocket is websocket:
+                if client in self.active_connections:
+                    self.active_connections.remove(client)
+                return
+
+
+async def churn_manager(connections: int) -> tuple:
+    manager = WebSocketManager()
+    sockets = [NullWebSocket() for _ in range(connections)]
+    started = time.perf_counter()
+    for websocket in sockets:
+        await manager.connect(websocket)
+    connected = time.perf_counter() - started
+
+    random.shuffle(sockets)
+    started = time.perf_counter()
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    disconnected = time.perf_counter() - started
+    await asyncio.sleep(0)  # let cancelled writer tasks finish
+    return connected, disconnected
+
+
+def churn_list(connections: int) -> tuple:
+    registry = ListRegistry()
+    sockets = [NullWebSocket() for _ in range(connections)]
+    started = time.perf_counter()
+    for websocket in sockets:
+        registry.connect(websocket)
+    connected = time.perf_counter() - started
+
+    random.shuffle(sockets)
+    started = time.perf_counter()
+    for websocket in sockets:
+        registry.disconnect(websocket)
+    return connected, time.perf_counter() - started
+
+
+def report(label: str, connections: int, samples: list):
+    connect = min(sample[0] for sample in samples)
+    disconnect = min(sample[1] for sample in samples)
+    print(
+        f"{label:<14} connect {connect * 1000:>9.1f}ms ({connect / connections * 1e6:>7.2f}us/op)  "
+        f"disconnect {disconnect * 1000:>9.1f}ms ({disconnect / connections * 1e6:>7.2f}us/op)"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(7)
+
+    manager_samples = [await churn_manager(args.connections) for _ in range(args.rounds)]
+    list_samples = [churn_list(args.connections) for _ in range(args.rounds)]
+
+    print(f"{args.connections} connections, best of {args.rounds} rounds")
+    report("dict registry", args.connections, manager_samples)
+    report("list registry", args.connections, list_samples)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
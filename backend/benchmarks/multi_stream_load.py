@@ -0,0 +1,181 @@
+"""
+Multi-stream load test.
+
+Follows N simulated streams at once through TikTokService, each backed by a
+fake TikTokLiveClient that emits comments at a fixed rate, and reports:
+
+- comments handled vs emitted
+- event loop lag (how late a 10 ms timer fires) p50/p99/max
+- ingestion pipeline queue depth and per-stage latency
+
+Comments flow through the real ingestion pipeline; --db-latency makes every
+database write slow to show that persistence no longer backs up ingestion.
+
+Usage (from backend/):
+    python -m benchmarks.multi_stream_load
+    python -m benchmarks.multi_stream_load --streams 50 --rate 20 --duration 10
+    python -m benchmarks.multi_stream_load --streams 10 --rate 20 --db-latency 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from TikTokLive.events import CommentEvent, ConnectEvent, DisconnectEvent
+
+from services.ingestion_pipeline import IngestionPipeline
+from services.tiktok_service import TikTokService
+from services.websocket_manager import WebSocketManager
+
+
+class FakeTikTokLiveClient:
+    """Stand-in for TikTokLiveClient that emits synthetic comments"""
+
+    rate = 20.0  # comments per second, set by the benchmark
+    emitted = 0
+
+    def __init__(self, unique_id: str):
+        self.unique_id = unique_id
+        self._handlers = {}
+        self._task = None
+
+    def on(self, event_type):
+        def decorator(handler):
+            self._handlers.setdefault(event_type, []).append(handler)
+            return handler
+        return decorator
+
+    def _emit(self, event_type, event):
+        # TikTokLive schedules coroutine handlers as tasks, like pyee does
+        for handler in self._handlers.get(event_type, []):
+            asyncio.create_task(handler(event))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _run(self):
+        self._emit(ConnectEvent, SimpleNamespace(unique_id=self.unique_id))
+        interval = 1.0 / self.rate
+        index = 0
+        next_at = time.perf_counter()
+        while True:
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            index += 1
+            FakeTikTokLiveClient.emitted += 1
+            self._emit(CommentEvent, SimpleNamespace(
+                user=SimpleNamespace(nickname=f"viewer{index % 500}"),
+                comment=f"comment {index} on {self.unique_id}"
+            ))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self._emit(DisconnectEvent, SimpleNamespace())
+
+
+class CountingDatabase:
+    """Database stand-in that counts saves, optionally with a per-write delay"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.saved = 0
+
+    async def save_chat_message(self, chat_message):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.saved += 1
+
+
+class NullWebSocket:
+    """Overlay stand-in that accepts every frame"""
+
+    client = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+async def monitor_loop_lag(samples, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=20.0, help="comments per second per stream")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=10, help="WebSocket clients per stream")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds per simulated database write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    FakeTikTokLiveClient.rate = args.rate
+    service = TikTokService()
+    service.client_factory = FakeTikTokLiveClient
+    manager = WebSocketManager()
+    database = CountingDatabase(args.db_latency)
+    pipeline = IngestionPipeline()
+    service.set_dependencies(manager, database, pipeline)
+    await pipeline.start()
+
+    usernames = [f"stream{i}" for i in range(args.streams)]
+    for username in usernames:
+        for _ in range(args.clients):
+            websocket = NullWebSocket()
+            await manager.connect(websocket)
+            manager.subscribe(websocket, [username])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(service.connect_stream(username) for username in usernames))
+
+    # Measure loop lag while all streams are live, not during connect/teardown
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await monitor
+
+    connected = sum(1 for status in service.list_streams() if status["connected"])
+    elapsed = time.perf_counter() - started
+    emitted, handled = FakeTikTokLiveClient.emitted, database.saved
+    stats = pipeline.stats()
+    await asyncio.gather(*(service.disconnect_stream(username) for username in usernames))
+    await pipeline.stop()
+
+    print(f"streams connected:  {connected}/{args.streams}")
+    print(f"comments emitted:   {emitted} ({emitted / elapsed:.0f}/s)")
+    print(f"comments persisted: {handled} ({handled / elapsed:.0f}/s)")
+    print(
+        f"event loop lag:     p50 {percentile(lag_samples, 50) * 1000:.2f}ms  "
+        f"p99 {percentile(lag_samples, 99) * 1000:.2f}ms  max {max(lag_samples) * 1000:.2f}ms"
+    )
+    print(f"ingress depth:      {stats['ingress_depth']} (dropped {stats['dropped']})")
+    for name, stage in stats["stages"].items():
+        print(
+            f"stage {name:<13} depth {stage['queue_depth']:>5}  processed {stage['processed']:>6}  "
+            f"dropped {stage['dropped']:>5}  latency p50 {stage['latency']['p50_ms']:.2f}ms "
+            f"p99 {stage['latency']['p99_ms']:.2f}ms  queue wait p99 {stage['queue_wait']['p99_ms']:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
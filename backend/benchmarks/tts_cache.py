@@ -0,0 +1,90 @@
+"""
+TTS audio cache benchmark: hit rate and synthesis saved on repetitive chat.
+
+Replays a synthetic chat stream with the repetition of real live chats: a
+small set of stock comments ("hola", "jajaja", emoji spam, greetings) makes
+up most messages and a pool of regulars writes most of them, with a long
+tail of one-off text and first-time viewers. Each message goes through
+TTSService.speak with the deterministic fake engine, once with the audio
+cache and once with every clip synthesized from scratch.
+
+Usage (from backend/):
+    python -m benchmarks.tts_cache
+    python -m benchmarks.tts_cache --messages 5000 --stock-share 0.6
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+from benchmarks.wire_format import WORDS
+from services.audio_cache import AudioCache
+from services.tts_engine import FakeTTSEngine
+from services.tts_service import TTSService
+
+STOCK_MESSAGES = ["hola", "jajaja", "jajajaja", "🔥🔥🔥", "👏👏", "saludos", "hola hola", "buen stream",
+                  "gracias", "crack", "saludos desde méxico", "que onda", "❤️", "jaja", "holaaa"]
+
+
+def build_chat(count: int, stock_share: float, regulars: int, regular_share: float) -> list:
+    chat = []
+    for _ in range(count):
+        if random.random() < regular_share:
+            user = f"regular_{int(random.paretovariate(1.2)) % regulars}"
+        else:
+            user = f"viewer_{random.randrange(1_000_000)}"
+        if random.random() < stock_share:
+            message = STOCK_MESSAGES[int(random.paretovariate(1.0)) % len(STOCK_MESSAGES)]
+        else:
+            message = " ".join(random.choice(WORDS) for _ in range(random.randint(2, 10)))
+        chat.append((user, message))
+    return chat
+
+
+class UncachedService(TTSService):
+    """Synthesizes every clip, as before the cache"""
+
+    async def _clip(self, text: str, key=None) -> bytes:
+        return await self._synthesize(text, key)
+
+
+async def run(service: TTSService, chat: list) -> float:
+    started = time.perf_counter()
+    for user, message in chat:
+        await service.speak(user, message)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--stock-share", type=float, default=0.5, help="fraction of messages that are stock comments")
+    parser.add_argument("--regulars", type=int, default=200)
+    parser.add_argument("--regular-share", type=float, default=0.7, help="fraction of messages written by regulars")
+    args = parser.parse_args()
+
+    random.seed(7)
+    chat = build_chat(args.messages, args.stock_share, args.regulars, args.regular_share)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cached = TTSService(engine=FakeTTSEngine(), cache=AudioCache(directory=directory))
+        cached_elapsed = await run(cached, chat)
+        await cached.stop()
+    with tempfile.TemporaryDirectory() as directory:
+        uncached = UncachedService(engine=FakeTTSEngine(), cache=AudioCache(directory=directory))
+        uncached_elapsed = await run(uncached, chat)
+        await uncached.stop()
+
+    stats = cached.cache.stats()
+    print(f"{args.messages} messages, {args.stock_share:.0%} stock comments, {args.regular_share:.0%} from {args.regulars} regulars")
+    print(f"clip hit rate        {stats['hit_rate']:.1%} ({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} misses)")
+    print(f"messages fully cached {cached.fully_cached / args.messages:.1%}")
+    print(f"bytes saved          {stats['bytes_saved'] / 1024 / 1024:.1f} MiB")
+    print(f"syntheses            {cached.synthesized} cached vs {uncached.synthesized} uncached")
+    print(f"wall time            {cached_elapsed:.2f}s cached vs {uncached_elapsed:.2f}s uncached")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+TTS synthesis pool benchmark: event-loop latency while synthesis is saturated.
+
+A ticker broadcasts a chat message to WebSocket clients every few
+milliseconds and records how late each broadcast completes relative to the
+moment it was due (the time a chat message waits before it reaches clients).
+Meanwhile producers keep synthesis saturated with the CPU-bound fake
+engine, either rendering in the event loop (as without the pool) or
+through a SynthesisPool of worker processes. An idle run gives the
+baseline.
+
+Usage (from backend/):
+    python -m benchmarks.tts_pool
+    python -m benchmarks.tts_pool --duration 5 --workers 4 --clients 500
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+
+from benchmarks.connection_registry import NullWebSocket
+from benchmarks.wire_format import WORDS
+from services.ingestion_pipeline import _percentiles_ms
+from services.tts_engine import FakeTTSEngine, TTSOverloaded
+from services.tts_pool import SynthesisPool
+from services.websocket_manager import WebSocketManager
+from models.chat_message import ChatMessage
+
+
+async def ticker(manager: WebSocketManager, interval: float, duration: float) -> list:
+    latencies = []
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    while loop.time() - started < duration:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        message = ChatMessage(user="viewer", message="hola", username_stream="streamer")
+        await manager.broadcast_json(message.to_websocket_dict(), stream="streamer")
+        latencies.append(loop.time() - scheduled)
+    return latencies
+
+
+async def producer(synthesize, stop: asyncio.Event, counters: dict):
+    while not stop.is_set():
+        text = " ".join(random.choice(WORDS) for _ in range(random.randint(3, 12)))
+        try:
+            await synthesize(text)
+            counters["completed"] += 1
+        except TTSOverloaded:
+            counters["rejected"] += 1
+            await asyncio.sleep(0.01)
+        # Like a pipeline worker taking its next message off the queue
+        await asyncio.sleep(0)
+
+
+async def run(mode: str, args) -> tuple:
+    manager = WebSocketManager()
+    sockets = [NullWebSocket() for _ in range(args.clients)]
+    for websocket in sockets:
+        await manager.connect(websocket)
+
+    engine = FakeTTSEngine()
+    pool = None
+    if mode == "pool":
+        pool = SynthesisPool(engine, workers=args.workers, queue_size=args.workers * 2, timeout=30)
+        await pool.synthesize("warm up")  # spawn the worker processes outside the measurement
+        synthesize = pool.synthesize
+    else:
+        synthesize = engine.synthesize
+
+    stop = asyncio.Event()
+    counters = {"completed": 0, "rejected": 0}
+    producers = [] if mode == "idle" else [
+        asyncio.create_task(producer(synthesize, stop, counters)) for _ in range(args.producers)
+    ]
+    latencies = await ticker(manager, args.interval, args.duration)
+    stop.set()
+    await asyncio.gather(*producers)
+    if pool:
+        await pool.shutdown()
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    await asyncio.sleep(0)  # let cancelled writer tasks finish
+    return latencies, counters
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per run")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between chat broadcasts")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--producers", type=int, default=8, help="concurrent synthesis requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(7)
+
+    print(f"chat broadcast every {args.interval * 1000:.0f}ms to {args.clients} clients, {args.producers} synthesis producers")
+    print(f"{'synthesis':<22} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'clips':>7} {'rejected':>9}")
+    for mode, label in (("idle", "none (baseline)"), ("inline", "in event loop"), ("pool", f"pool, {args.workers} processes")):
+        latencies, counters = await run(mode, args)
+        latency = _percentiles_ms(latencies)
+        print(
+            f"{label:<22} {latency['p50_ms']:>8.2f} {latency['p99_ms']:>8.2f} {latency['max_ms']:>8.2f} "
+            f"{counters['completed']:>7} {counters['rejected']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+TTS priority benchmark: scoring cost and what gets spoken on a busy stream.
+
+First, the per-comment cost of CommentScorer with sliding windows of growing
+size, which should stay flat (O(1) amortized upkeep per comment).
+
+Then a simulated big stream, in virtual time: chat arrives faster than one
+voice can read it, mostly stock comments from a pool of chatty regulars,
+with first-time viewers, gifters and moderators mixed in. A speaker takes a
+message from a SpeechQueue each time it finishes the previous one, under
+the latest and priority policies, and the spoken messages are tallied.
+
+Usage (from backend/):
+    python -m benchmarks.tts_priority
+    python -m benchmarks.tts_priority --rate 50 --duration 600 --queue-size 5
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.tts_cache import STOCK_MESSAGES
+from benchmarks.wire_format import WORDS
+from models.chat_message import ChatMessage
+from services.tts_priority import CommentScorer
+from services.tts_scheduler import POLICY_LATEST, POLICY_PRIORITY, SpeechCandidate, SpeechQueue
+
+
+def scoring_cost(window_messages: int, comments: int) -> float:
+    """Microseconds per scored comment with a full window of window_messages"""
+    scorer = CommentScorer(seconds=1e9, max_messages=window_messages)
+    messages = [
+        ChatMessage(user=f"viewer_{random.randrange(window_messages)}", message=random.choice(STOCK_MESSAGES), username_stream="s")
+        for _ in range(1000)
+    ]
+    for i in range(window_messages):
+        scorer.score(messages[i % len(messages)], now=0.0)
+    started = time.perf_counter()
+    for i in range(comments):
+        scorer.score(messages[i % len(messages)], now=0.0)
+    return (time.perf_counter() - started) / comments * 1e6
+
+
+def build_chat(args) -> list:
+    """(arrival time, message, kind) for a busy stream"""
+    regulars = [f"regular_{i}" for i in range(args.regulars)]
+    chat = []
+    now = 0.0
+    while now < args.duration:
+        now += random.expovariate(args.rate)
+        roll = random.random()
+        if roll < 0.01:
+            kind, user, extra = "moderator", random.choice(regulars), {"moderator": True}
+        elif roll < 0.04:
+            kind, user, extra = "gifter", f"gifter_{random.randrange(50)}", {"gifter": True}
+        elif roll < 0.14:
+            kind, user, extra = "first_time", f"viewer_{len(chat)}", {}
+        else:
+            kind, user, extra = "regular", random.choice(regulars), {}
+        if kind == "regular" and random.random() < 0.7:
+            text = random.choice(STOCK_MESSAGES)
+            kind = "stock"
+        else:
+            text = " ".join(random.choice(WORDS) for _ in range(random.randint(3, 12)))
+        chat.append((now, ChatMessage(user=user, message=text, username_stream="streamer", **extra), kind))
+    return chat
+
+
+def simulate(policy: str, chat: list, args) -> dict:
+    kinds = {message.id: kind for _, message, kind in chat}
+    scorer = CommentScorer()
+    queue = SpeechQueue(policy, args.queue_size)
+    tally = {}
+    free_at = 0.0
+
+    def speak(start: float) -> float:
+        kind = kinds[queue.pop().message.id]
+        tally[kind] = tally.get(kind, 0) + 1
+        return start + args.speech_seconds
+
+    for order, (arrived, message, _) in enumerate(chat):
+        # The speaker takes the next waiting message each time it finishes one
+        while queue and free_at <= arrived:
+            free_at = speak(free_at)
+        score = scorer.score(message, now=arrived) if policy == POLICY_PRIORITY else 0.0
+        queue.offer(SpeechCandidate(message, score, order))
+        if free_at <= arrived:
+            free_at = speak(arrived)
+    return {"spoken": sum(tally.values()), "kinds": tally}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20.0, help="chat messages per second")
+    parser.add_argument("--duration", type=float, default=300.0, help="seconds of simulated chat")
+    parser.add_argument("--speech-seconds", type=float, default=3.0, help="how long one message takes to speak")
+    parser.add_argument("--queue-size", type=int, default=3)
+    parser.add_argument("--regulars", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(7)
+    print("scoring cost per comment")
+    for window_messages in (1_000, 10_000, 100_000):
+        print(f"  window {window_messages:>7} messages  {scoring_cost(window_messages, 50_000):6.2f} µs")
+
+    chat = build_chat(args)
+    offered = {}
+    for _, _, kind in chat:
+        offered[kind] = offered.get(kind, 0) + 1
+
+    columns = ("first_time", "gifter", "moderator", "regular", "stock")
+    print(f"\n{len(chat)} messages at {args.rate:.0f}/s, {args.speech_seconds:.0f}s per spoken message, queue size {args.queue_size}")
+    print(f"{'':<10} {'spoken':>7} " + " ".join(f"{column:>11}" for column in columns))
+    print(f"{'chat':<10} {'':>7} " + " ".join(f"{offered.get(column, 0) / len(chat):>11.1%}" for column in columns))
+    for policy in (POLICY_LATEST, POLICY_PRIORITY):
+        result = simulate(policy, chat, args)
+        shares = " ".join(f"{result['kinds'].get(column, 0) / result['spoken']:>11.1%}" for column in columns)
+        print(f"{policy:<10} {result['spoken']:>7} {shares}")
+
+
+if __name__ == "__main__":
+    main()
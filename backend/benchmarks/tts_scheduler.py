@@ -0,0 +1,119 @@
+"""
+TTS scheduler benchmark: synthesis work for a chat faster than speech.
+
+Replays a burst of chat for one stream at a fixed rate in real time. Without
+the scheduler every message goes to synthesis as it arrives (what the "tts"
+stage did before, leaving browsers to pick what to play); with it only the
+messages the queue policy hands to the speaker are synthesized. Uses the
+deterministic fake engine and a fresh audio cache per run; wall time
+includes draining the synthesis backlog.
+
+Usage (from backend/):
+    python -m benchmarks.tts_scheduler
+    python -m benchmarks.tts_scheduler --rate 50 --duration 20 --policy fifo --queue-size 5
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+
+from benchmarks.wire_format import WORDS
+from config.settings import settings
+from models.chat_message import ChatMessage
+from services.audio_cache import AudioCache
+from services.ingestion_pipeline import PipelineStage
+from services.tts_engine import FakeTTSEngine, TTSError
+from services.tts_scheduler import TTSScheduler
+from services.tts_service import TTSService
+
+
+class CountingManager:
+    """Stands in for the WebSocket manager and counts speech announcements"""
+
+    def __init__(self):
+        self.announced = 0
+
+    def add_listener(self, message_type, callback):
+        pass
+
+    async def broadcast_json(self, data: dict, stream=None):
+        self.announced += 1
+
+
+def build_chat(count: int) -> list:
+    return [
+        (f"viewer_{random.randrange(500)}", " ".join(random.choice(WORDS) for _ in range(random.randint(2, 10))))
+        for _ in range(count)
+    ]
+
+
+async def replay(handle, chat: list, rate: float):
+    for user, message in chat:
+        await handle(ChatMessage(user=user, message=message, username_stream="streamer"))
+        await asyncio.sleep(1 / rate)
+
+
+async def run(scheduled: bool, chat: list, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        service = TTSService(engine=FakeTTSEngine(), cache=AudioCache(directory=directory))
+        if scheduled:
+            service.scheduler = TTSScheduler(service.announce, policy=args.policy, queue_size=args.queue_size)
+            manager = CountingManager()
+            service.set_dependencies(manager)
+            handle = service.handle_chat_message
+        else:
+            async def synthesize(chat_message):
+                try:
+                    await service.speak(chat_message.user, chat_message.message, key=chat_message.username_stream)
+                except TTSError:
+                    pass
+
+            # The "tts" stage as it was: every message synthesized by the stage's workers
+            stage = PipelineStage("tts", synthesize, concurrency=settings.PIPELINE_TTS_CONCURRENCY)
+            stage.start()
+
+            async def handle(chat_message):
+                stage.offer(chat_message)
+
+        started = time.perf_counter()
+        await replay(handle, chat, args.rate)
+        if not scheduled:
+            await stage.queue.join()
+            await stage.stop()
+        elapsed = time.perf_counter() - started
+        await service.stop()
+        return {
+            "synthesized": service.synthesized,
+            "synthesis_seconds": service.synthesis_seconds,
+            "spoken": service.scheduler.spoken if scheduled else None,
+            "dropped": service.scheduler.dropped + service.scheduler.expired if scheduled else None,
+            "elapsed": elapsed
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20.0, help="chat messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of chat")
+    parser.add_argument("--policy", default="latest")
+    parser.add_argument("--queue-size", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(7)
+    chat = build_chat(int(args.rate * args.duration))
+
+    print(f"{len(chat)} messages at {args.rate:.0f}/s, policy {args.policy} (queue size {args.queue_size})")
+    print(f"{'mode':<22} {'syntheses':>10} {'synth s':>8} {'spoken':>7} {'dropped':>8} {'wall s':>7}")
+    for scheduled, label in ((False, "synthesize everything"), (True, "scheduled")):
+        result = await run(scheduled, chat, args)
+        spoken = "-" if result["spoken"] is None else result["spoken"]
+        dropped = "-" if result["dropped"] is None else result["dropped"]
+        print(f"{label:<22} {result['synthesized']:>10} {result['synthesis_seconds']:>8.2f} {spoken:>7} {dropped:>8} {result['elapsed']:>7.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+"""
+WebSocket broadcast benchmark.
+
+Starts an in-process uvicorn server that registers every socket with a fresh
+WebSocketManager, attaches N local WebSocket clients (a fraction of them
+artificially slow on the server side) and measures, per broadcast:
+
+- call latency: how long ``broadcast_json`` takes to return
+- delivery latency: time until every fast client has received the frame
+
+Usage (from backend/):
+    python -m benchmarks.websocket_broadcast
+    python -m benchmarks.websocket_broadcast --clients 1 100 1000 --slow-fraction 0.05 --slow-delay 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import uvicorn
+import websockets
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from services.websocket_manager import WebSocketManager
+
+
+class SlowWebSocket:
+    """Server-side proxy that delays every send to emulate a client on a bad link"""
+
+    def __init__(self, websocket: WebSocket, delay: float):
+        self._websocket = websocket
+        self._delay = delay
+
+    def __getattr__(self, name):
+        return getattr(self._websocket, name)
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self._delay)
+        await self._websocket.send_text(data)
+
+    async def send_bytes(self, data: bytes):
+        await asyncio.sleep(self._delay)
+        await self._websocket.send_bytes(data)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_app(manager: WebSocketManager, slow_delay: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def endpoint(websocket: WebSocket):
+        slow = websocket.query_params.get("slow") == "1"
+        connection = SlowWebSocket(websocket, slow_delay) if slow else websocket
+        await manager.connect(connection)
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            manager.disconnect(connection)
+        except Exception:
+            manager.disconnect(connection)
+
+    return app
+
+
+async def start_server(app: FastAPI):
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", ws="websockets")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, port
+
+
+async def run_case(client_count: int, messages: int, slow_fraction: float, slow_delay: float):
+    manager = WebSocketManager()
+    server, server_task, port = await start_server(build_app(manager, slow_delay))
+
+    slow_count = int(client_count * slow_fraction) if client_count > 1 else 0
+    fast_count = client_count - slow_count
+    received = {}  # message index -> fast clients that got it
+    delivered_at = {}
+    all_delivered = {}
+
+    async def reader(ws, is_slow):
+        async for raw in ws:
+            for item in _iter_events(raw):
+                if item.get("type") != "bench":
+                    continue
+                if is_slow:
+                    continue
+                index = item["index"]
+                received[index] = received.get(index, 0) + 1
+                if received[index] == fast_count:
+                    delivered_at[index] = time.perf_counter()
+                    all_delivered[index].set()
+
+    clients, readers = [], []
+    for batch_start in range(0, client_count, 100):
+        batch = range(batch_start, min(client_count, batch_start + 100))
+        sockets = await asyncio.gather(*(
+            websockets.connect(f"ws://127.0.0.1:{port}/ws?slow={1 if i < slow_count else 0}", max_queue=None)
+            for i in batch
+        ))
+        for i, ws in zip(batch, sockets):
+            clients.append(ws)
+            readers.append(asyncio.create_task(reader(ws, i < slow_count)))
+
+    while len(manager.active_connections) < client_count:
+        await asyncio.sleep(0.01)
+
+    call_latencies, delivery_latencies = [], []
+    for index in range(messages):
+        all_delivered[index] = asyncio.Event()
+        sent_at = time.perf_counter()
+        await manager.broadcast_json({"type": "bench", "index": index, "user": "bench", "message": "x" * 40})
+        call_latencies.append(time.perf_counter() - sent_at)
+        try:
+            await asyncio.wait_for(all_delivered[index].wait(), timeout=10)
+            delivery_latencies.append(delivered_at[index] - sent_at)
+        except asyncio.TimeoutError:
+            pass
+
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in clients), return_exceptions=True)
+    server.should_exit = True
+    await server_task
+
+    return {
+        "clients": client_count,
+        "slow": slow_count,
+        "call_p50_ms": percentile(call_latencies, 50) * 1000,
+        "call_p99_ms": percentile(call_latencies, 99) * 1000,
+        "delivery_p50_ms": percentile(delivery_latencies, 50) * 1000,
+        "delivery_p99_ms": percentile(delivery_latencies, 99) * 1000,
+        "delivered": len(delivery_latencies),
+    }
+
+
+def _iter_events(raw):
+    data = json.loads(raw)
+    return data if isinstance(data, list) else [data]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds added to each send for slow clients")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Teardown closes clients mid-send; keep those expected errors out of the report
+    logging.getLogger("services").setLevel(logging.CRITICAL)
+
+    print(f"{'clients':>8} {'slow':>5} {'call p50':>10} {'call p99':>10} {'deliv p50':>10} {'deliv p99':>10} {'delivered':>10}")
+    for count in args.clients:
+        result = await run_case(count, args.messages, args.slow_fraction, args.slow_delay)
+        print(
+            f"{result['clients']:>8} {result['slow']:>5} "
+            f"{result['call_p50_ms']:>8.2f}ms {result['call_p99_ms']:>8.2f}ms "
+            f"{result['delivery_p50_ms']:>8.2f}ms {result['delivery_p99_ms']:>8.2f}ms "
+            f"{result['delivered']:>6}/{args.messages}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Wire format benchmark: frame size and encode/decode time per /api/ws encoding.
+
+Builds realistic chat_message events (as broadcast_json sends them, with
+seq and stream) and measures, for each available encoding, the average
+frame size, the bandwidth at a given message rate, and per-frame encode
+and decode time.
+
+Usage (from backend/):
+    python -m benchmarks.wire_format
+    python -m benchmarks.wire_format --messages 50000 --rate 5000
+"""
+
+import argparse
+import random
+import time
+
+from models.chat_message import ChatMessage
+from services import wire_format
+
+WORDS = ["hola", "jaja", "saludos", "desde", "méxico", "que", "buen", "stream", "🔥", "👏", "gracias", "crack"]
+
+
+def build_events(count: int) -> list:
+    events = []
+    for seq in range(1, count + 1):
+        text = " ".join(random.choice(WORDS) for _ in range(random.randint(1, 12)))
+        message = ChatMessage(user=f"viewer_{random.randrange(100000)}", message=text, username_stream="streamer")
+        events.append({**message.to_websocket_dict(), "seq": seq, "stream": "streamer"})
+    return events
+
+
+def measure(events: list, encoding: str) -> dict:
+    started = time.perf_counter()
+    frames = [wire_format.encode(event, encoding) for event in events]
+    encode_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for frame in frames:
+        wire_format.decode(frame, encoding)
+    decode_elapsed = time.perf_counter() - started
+
+    sizes = [len(frame.encode() if isinstance(frame, str) else frame) for frame in frames]
+    return {
+        "bytes": sum(sizes) / len(sizes),
+        "encode_us": encode_elapsed / len(events) * 1e6,
+        "decode_us": decode_elapsed / len(events) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=3000, help="messages per minute used for the bandwidth column")
+    args = parser.parse_args()
+
+    random.seed(7)
+    events = build_events(args.messages)
+    results = {encoding: measure(events, encoding) for encoding in wire_format.available_encodings()}
+    baseline = results[wire_format.JSON]["bytes"]
+
+    print(f"{args.messages} chat events, bandwidth at {args.rate} msg/min")
+    print(f"{'encoding':<9} {'bytes/frame':>11} {'vs json':>8} {'KiB/min':>9} {'encode':>10} {'decode':>10}")
+    for encoding, result in results.items():
+        print(
+            f"{encoding:<9} {result['bytes']:>11.1f} {result['bytes'] / baseline:>7.0%} "
+            f"{result['bytes'] * args.rate / 1024:>9.1f} {result['encode_us']:>8.2f}us {result['decode_us']:>8.2f}us"
+        )
+    if wire_format.MSGPACK not in results:
+        print("msgpack not installed; pip install msgpack to include it")
+
+
+if __name__ == "__main__":
+    main()
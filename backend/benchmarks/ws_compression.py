@@ -0,0 +1,77 @@
+"""
+permessage-deflate benchmark: CPU time and bytes on the wire for chat bursts.
+
+Serializes a burst of chat events into server-side WebSocket frames exactly
+as the websockets library does (header + payload, through the negotiated
+extension) with compression off, on, and on with the WS_COMPRESSION_MIN_SIZE
+threshold, for one-event frames and for micro-batched array frames. CPU
+time covers compression and framing for one client connection.
+
+Usage (from backend/):
+    python -m benchmarks.ws_compression
+    python -m benchmarks.ws_compression --messages 50000 --batch 50 --encoding msgpack
+"""
+
+import argparse
+import random
+import time
+
+from websockets.frames import OP_BINARY, OP_TEXT, Frame
+
+from benchmarks.wire_format import build_events
+from config.settings import settings
+from services import wire_format
+from services.ws_compression import ThresholdPerMessageDeflate
+
+
+def build_frames(events: list, encoding: str, batch: int) -> list:
+    frames = [wire_format.encode(event, encoding) for event in events]
+    if batch > 1:
+        frames = [wire_format.encode_batch(frames[i:i + batch], encoding) for i in range(0, len(frames), batch)]
+    return [frame.encode() if isinstance(frame, str) else frame for frame in frames]
+
+
+def run(payloads: list, opcode, extension) -> tuple:
+    extensions = [extension] if extension else []
+    started = time.process_time()
+    wire_bytes = sum(len(Frame(opcode, payload).serialize(mask=False, extensions=extensions)) for payload in payloads)
+    return wire_bytes, time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=20, help="events per frame for the batched rows")
+    parser.add_argument("--encoding", default=wire_format.JSON, choices=wire_format.available_encodings())
+    parser.add_argument("--min-size", type=int, default=settings.WS_COMPRESSION_MIN_SIZE, help="threshold for the thresholded rows")
+    parser.add_argument("--level", type=int, default=6)
+    args = parser.parse_args()
+
+    random.seed(7)
+    events = build_events(args.messages)
+    opcode = OP_BINARY if args.encoding == wire_format.MSGPACK else OP_TEXT
+    compress_settings = {"memLevel": 5, "level": args.level}
+
+    configurations = {
+        "off": lambda: None,
+        "deflate": lambda: ThresholdPerMessageDeflate(False, False, 15, 15, compress_settings),
+        f"deflate >= {args.min_size}B": lambda: ThresholdPerMessageDeflate(False, False, 15, 15, compress_settings, min_size=args.min_size),
+        "deflate no-takeover": lambda: ThresholdPerMessageDeflate(True, True, 15, 15, compress_settings),
+    }
+
+    print(f"{args.messages} chat events, encoding {args.encoding}, level {args.level}")
+    print(f"{'frames':<10} {'compression':<20} {'KiB on wire':>12} {'vs off':>7} {'CPU ms':>9} {'us/event':>9}")
+    for label, batch in (("single", 1), (f"batch {args.batch}", args.batch)):
+        payloads = build_frames(events, args.encoding, batch)
+        baseline = None
+        for name, make_extension in configurations.items():
+            wire_bytes, cpu = run(payloads, opcode, make_extension())
+            baseline = baseline or wire_bytes
+            print(
+                f"{label:<10} {name:<20} {wire_bytes / 1024:>12.1f} {wire_bytes / baseline:>6.0%} "
+                f"{cpu * 1000:>9.1f} {cpu / args.messages * 1e6:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -8,14 +9,113 @@ class Settings:
     # Database configuration
     MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
     DATABASE_NAME = "tiktok_tts_bot"
+    DB_ENSURE_INDEXES = os.environ.get('DB_ENSURE_INDEXES', 'true').lower() == 'true'
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    # Write-behind buffering for chat messages (insert_many on size or time)
+    DB_WRITE_BEHIND = os.environ.get('DB_WRITE_BEHIND', 'true').lower() == 'true'
+    DB_WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', '500'))
+    DB_WRITE_FLUSH_INTERVAL = float(os.environ.get('DB_WRITE_FLUSH_INTERVAL', '0.5'))
+    DB_WRITE_MAX_BUFFER = int(os.environ.get('DB_WRITE_MAX_BUFFER', '50000'))
+    # On-disk spill of unflushed chat messages while MongoDB is unavailable (the directory may be
+    # shared by workers: each writes its own segments and replays them, or those of dead workers)
+    DB_SPILL_ENABLED = os.environ.get('DB_SPILL_ENABLED', 'true').lower() == 'true'
+    DB_SPILL_DIR = os.environ.get('DB_SPILL_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'spill'))
+    DB_SPILL_SEGMENT_BYTES = int(os.environ.get('DB_SPILL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+    DB_SPILL_FSYNC = os.environ.get('DB_SPILL_FSYNC', 'always')  # always | interval | never
+    # Hard upper bound for one /api/chat-history page
+    CHAT_HISTORY_MAX_PAGE_SIZE = int(os.environ.get('CHAT_HISTORY_MAX_PAGE_SIZE', '200'))
+    # Recent messages kept in memory per stream to answer history pages without MongoDB (0 disables)
+    CHAT_HISTORY_CACHE_SIZE = int(os.environ.get('CHAT_HISTORY_CACHE_SIZE', '1000'))
     
     # TikTok configuration
     SING_API_KEY = os.environ.get('SING_API_KEY', '')
+    TIKTOK_MAX_STREAMS = int(os.environ.get('TIKTOK_MAX_STREAMS', '100'))
+    # Per-stream leases so exactly one worker follows each stream (on by default with WS_BACKPLANE=unix);
+    # workers poll every TIKTOK_LEASE_INTERVAL seconds to take over streams whose owner died
+    TIKTOK_STREAM_LEASES = os.environ.get('TIKTOK_STREAM_LEASES', 'true' if os.environ.get('WS_BACKPLANE') == 'unix' else 'false').lower() == 'true'
+    TIKTOK_LEASE_DIR = os.environ.get('TIKTOK_LEASE_DIR', os.path.join(tempfile.gettempdir(), 'tiktok_tts_leases'))
+    TIKTOK_LEASE_INTERVAL = float(os.environ.get('TIKTOK_LEASE_INTERVAL', '2.0'))
+    # Supervised reconnect: exponential backoff with jitter, up to TIKTOK_RECONNECT_MAX_RETRIES
+    # consecutive failures (0 disables). Streams whose user is offline back off from a longer base.
+    TIKTOK_RECONNECT_MAX_RETRIES = int(os.environ.get('TIKTOK_RECONNECT_MAX_RETRIES', '10'))
+    TIKTOK_RECONNECT_BASE_DELAY = float(os.environ.get('TIKTOK_RECONNECT_BASE_DELAY', '1.0'))
+    TIKTOK_RECONNECT_MAX_DELAY = float(os.environ.get('TIKTOK_RECONNECT_MAX_DELAY', '60'))
+    TIKTOK_RECONNECT_OFFLINE_DELAY = float(os.environ.get('TIKTOK_RECONNECT_OFFLINE_DELAY', '30'))
+    TIKTOK_RECONNECT_OFFLINE_MAX_DELAY = float(os.environ.get('TIKTOK_RECONNECT_OFFLINE_MAX_DELAY', '300'))
     
     # Server configuration
     HOST = "0.0.0.0"
     PORT = 8001
     
+    # WebSocket configuration
+    WS_SEND_TIMEOUT = float(os.environ.get('WS_SEND_TIMEOUT', '2.0'))
+    WS_QUEUE_SIZE = int(os.environ.get('WS_QUEUE_SIZE', '256'))
+    WS_MAX_OVERFLOWS = int(os.environ.get('WS_MAX_OVERFLOWS', '64'))
+    # Message types that are never dropped from a full client queue; everything else drops oldest
+    WS_NEVER_DROP_TYPES = set(os.environ.get('WS_NEVER_DROP_TYPES', 'connection_status,tts_status').split(','))
+    # Sequenced events kept per stream so reconnecting clients can resume from their last seq
+    WS_REPLAY_BUFFER_SIZE = int(os.environ.get('WS_REPLAY_BUFFER_SIZE', '1000'))
+    # Micro-batching for clients that opt in with ?batch=1: above WS_BATCH_MIN_RATE events/s
+    # the writer waits WS_BATCH_WINDOW seconds to coalesce up to WS_BATCH_MAX_EVENTS into one frame
+    WS_BATCH_MIN_RATE = float(os.environ.get('WS_BATCH_MIN_RATE', '50'))
+    WS_BATCH_WINDOW = float(os.environ.get('WS_BATCH_WINDOW', '0.03'))
+    WS_BATCH_MAX_EVENTS = int(os.environ.get('WS_BATCH_MAX_EVENTS', '100'))
+    # Cross-worker fan-out: 'inprocess' (single worker) or 'unix' (broker on a local Unix socket)
+    WS_BACKPLANE = os.environ.get('WS_BACKPLANE', 'inprocess')
+    WS_BACKPLANE_SOCKET = os.environ.get('WS_BACKPLANE_SOCKET', os.path.join(tempfile.gettempdir(), 'tiktok_tts_backplane.sock'))
+    # Application-level heartbeat: ping idle clients every interval, evict after timeout without activity
+    WS_HEARTBEAT_INTERVAL = float(os.environ.get('WS_HEARTBEAT_INTERVAL', '20'))
+    WS_HEARTBEAT_TIMEOUT = float(os.environ.get('WS_HEARTBEAT_TIMEOUT', '60'))
+    # permessage-deflate (applies when served through main.py / CompressionWebSocketProtocol)
+    WS_COMPRESSION = os.environ.get('WS_COMPRESSION', 'true').lower() == 'true'
+    WS_COMPRESSION_MIN_SIZE = int(os.environ.get('WS_COMPRESSION_MIN_SIZE', '64'))
+    WS_COMPRESSION_LEVEL = int(os.environ.get('WS_COMPRESSION_LEVEL', '6'))
+    # Loopback clients without X-Forwarded-For are local overlays: save the CPU instead
+    WS_COMPRESSION_SKIP_LOOPBACK = os.environ.get('WS_COMPRESSION_SKIP_LOOPBACK', 'true').lower() == 'true'
+    
+    # Ingestion pipeline configuration
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '10000'))
+    PIPELINE_BROADCAST_CONCURRENCY = int(os.environ.get('PIPELINE_BROADCAST_CONCURRENCY', '1'))
+    PIPELINE_PERSISTENCE_CONCURRENCY = int(os.environ.get('PIPELINE_PERSISTENCE_CONCURRENCY', '4'))
+    PIPELINE_TTS_CONCURRENCY = int(os.environ.get('PIPELINE_TTS_CONCURRENCY', '2'))
+    
+    # Server-side TTS: 'auto' (piper if TTS_PIPER_MODEL is set, else espeak-ng if installed),
+    # 'espeak-ng', 'piper', 'fake' (deterministic tones for tests) or 'none' (browser speech only)
+    TTS_ENGINE = os.environ.get('TTS_ENGINE', 'auto')
+    TTS_VOICE = os.environ.get('TTS_VOICE', 'es')
+    TTS_RATE = int(os.environ.get('TTS_RATE', '160'))  # espeak-ng words per minute
+    TTS_ESPEAK_BINARY = os.environ.get('TTS_ESPEAK_BINARY', 'espeak-ng')
+    TTS_PIPER_BINARY = os.environ.get('TTS_PIPER_BINARY', 'piper')
+    TTS_PIPER_MODEL = os.environ.get('TTS_PIPER_MODEL', '')
+    TTS_SYNTH_TIMEOUT = float(os.environ.get('TTS_SYNTH_TIMEOUT', '10'))
+    # Synthesis runs in this many worker processes (0 = in the event loop); at most TTS_POOL_QUEUE_SIZE
+    # jobs wait for a free process, and a queued job is dropped when a newer one for its stream arrives
+    TTS_POOL_WORKERS = int(os.environ.get('TTS_POOL_WORKERS', '2'))
+    TTS_POOL_QUEUE_SIZE = int(os.environ.get('TTS_POOL_QUEUE_SIZE', '32'))
+    TTS_POOL_SUPERSEDE = os.environ.get('TTS_POOL_SUPERSEDE', 'true').lower() == 'true'
+    # Scheduling priority of the synthesis processes relative to the server (higher = yields more)
+    TTS_POOL_NICE = int(os.environ.get('TTS_POOL_NICE', '10'))
+    TTS_MAX_CHARS = int(os.environ.get('TTS_MAX_CHARS', '300'))
+    # Content-addressed audio cache: per-worker memory LRU in front of a directory shared by every
+    # worker on the host (so any of them can serve a clip); both tiers are bounded in bytes
+    TTS_AUDIO_DIR = os.environ.get('TTS_AUDIO_DIR', os.path.join(tempfile.gettempdir(), 'tiktok_tts_audio'))
+    TTS_AUDIO_MEMORY_BYTES = int(os.environ.get('TTS_AUDIO_MEMORY_BYTES', str(32 * 1024 * 1024)))
+    TTS_AUDIO_DISK_BYTES = int(os.environ.get('TTS_AUDIO_DISK_BYTES', str(256 * 1024 * 1024)))
+    # Per-stream speech scheduling on the server: 'latest' (keep the newest TTS_QUEUE_SIZE waiting
+    # messages), 'fifo' (turn new messages away when full) or 'priority' (keep the highest scored)
+    TTS_QUEUE_POLICY = os.environ.get('TTS_QUEUE_POLICY', 'latest')
+    TTS_QUEUE_SIZE = int(os.environ.get('TTS_QUEUE_SIZE', '1'))
+    TTS_QUEUE_MAX_AGE = float(os.environ.get('TTS_QUEUE_MAX_AGE', '30'))  # seconds a message may wait
+    TTS_QUEUE_GAP = float(os.environ.get('TTS_QUEUE_GAP', '0.2'))  # pause between spoken messages
+    # Pace of browser speech ("{user} dice: {message}" at rate 0.9), used when there is no engine
+    TTS_BROWSER_CHARS_PER_SECOND = float(os.environ.get('TTS_BROWSER_CHARS_PER_SECOND', '13'))
+    # Comment ranking for the 'priority' policy: recent chat (this many seconds, at most this many
+    # messages per stream) tells repeated text and chatty users apart; first-time chatters are
+    # remembered per stream up to TTS_PRIORITY_SEEN_USERS
+    TTS_PRIORITY_WINDOW = float(os.environ.get('TTS_PRIORITY_WINDOW', '60'))
+    TTS_PRIORITY_WINDOW_MESSAGES = int(os.environ.get('TTS_PRIORITY_WINDOW_MESSAGES', '2000'))
+    TTS_PRIORITY_SEEN_USERS = int(os.environ.get('TTS_PRIORITY_SEEN_USERS', '50000'))
+    
     # App configuration
     APP_TITLE = "TikTok Live TTS Bot"
     APP_VERSION = "1.0.0"
@@ -7,16 +7,27 @@ This is the file that should be executed to run the application.
 Usage:
     python main.py
     uvicorn main:app --host 0.0.0.0 --port 8001
+
+Running through python main.py serves /api/ws with the configurable
+permessage-deflate protocol (WS_COMPRESSION* settings); the plain uvicorn
+command uses uvicorn's default compression for every client.
+
+With several workers (uvicorn main:app --workers 4) set WS_BACKPLANE=unix so
+events from the worker following a TikTok stream reach clients on all workers;
+that also turns on stream leases (TIKTOK_STREAM_LEASES), so each stream is
+followed by exactly one worker and another takes it over if that one dies.
 """
 
 import uvicorn
 from server import app
 from config.settings import settings
+from services.ws_compression import CompressionWebSocketProtocol
 
 if __name__ == "__main__":
     uvicorn.run(
         "server:app",
         host=settings.HOST,
         port=settings.PORT,
+        ws=CompressionWebSocketProtocol,
         reload=False  # Set to False for production
     )
\ No newline at end of file
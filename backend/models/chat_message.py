@@ -1,14 +1,22 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
+import base64
+import json
 import uuid
 
 class ChatMessage:
-    def __init__(self, user: str, message: str, username_stream: str = ""):
+    def __init__(self, user: str, message: str, username_stream: str = "", user_id: str = "",
+                 moderator: bool = False, gifter: bool = False, subscriber: bool = False):
         self.id = str(uuid.uuid4())
         self.user = user
         self.message = message
         self.timestamp = datetime.now()
         self.username_stream = username_stream
+        # The author's standing in the stream, as reported by TikTok (not persisted or broadcast)
+        self.user_id = user_id or user
+        self.moderator = moderator
+        self.gifter = gifter
+        self.subscriber = subscriber
     
     def to_dict(self):
         return {
@@ -22,9 +30,11 @@ class ChatMessage:
     def to_websocket_dict(self, tts_enabled: bool = True):
         return {
             "type": "chat_message", 
+            "id": self.id,
             "user": self.user,
             "message": self.message,
             "timestamp": self.timestamp.isoformat(),
+            "username_stream": self.username_stream,
             "tts_enabled": tts_enabled
         }
     
@@ -32,8 +42,23 @@ class ChatMessage:
     def format_for_frontend(db_message: dict):
         """Format database message for frontend consumption"""
         return {
-            "id": db_message.get("id", str(db_message["_id"])),
+            "id": db_message["id"] if "id" in db_message else str(db_message["_id"]),
             "user": db_message["user"],
             "message": db_message["message"],
-            "timestamp": db_message["timestamp"].isoformat() if hasattr(db_message["timestamp"], 'isoformat') else str(db_message["timestamp"])
-        }
\ No newline at end of file
+            "timestamp": db_message["timestamp"].isoformat() if hasattr(db_message["timestamp"], 'isoformat') else str(db_message["timestamp"]),
+            "username_stream": db_message.get("username_stream", "")
+        }
+
+def encode_history_cursor(timestamp: datetime, message_id: str) -> str:
+    """Opaque keyset cursor for a (timestamp, id) position in chat history"""
+    raw = json.dumps([timestamp.isoformat(timespec="milliseconds"), message_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_history_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
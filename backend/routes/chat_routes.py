@@ -1,17 +1,64 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from config.settings import settings
 from services.database import db_service
-from models.chat_message import ChatMessage
+from services.chat_history_cache import chat_history_cache
+from models.chat_message import ChatMessage, encode_history_cursor, decode_history_cursor
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
 @router.get("/chat-history")
-async def get_chat_history(limit: int = 50):
-    """Get chat message history"""
-    messages = await db_service.get_chat_history(limit)
-    
-    # Convert messages for frontend
-    formatted_messages = []
-    for msg in messages:
-        formatted_messages.append(ChatMessage.format_for_frontend(msg))
-    
-    return {"messages": formatted_messages}
\ No newline at end of file
+async def get_chat_history(limit: int = Query(50, ge=1), before: Optional[str] = None, after: Optional[str] = None,
+                           username_stream: Optional[str] = None, user: Optional[str] = None):
+    """Get chat message history, newest first.
+
+    Pages are keyset based: pass before_cursor from a response as ?before=
+    for older messages, or after_cursor as ?after= for newer ones.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    try:
+        before_position = decode_history_cursor(before) if before else None
+        after_position = decode_history_cursor(after) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limit = min(limit, settings.CHAT_HISTORY_MAX_PAGE_SIZE)
+    if username_stream:
+        username_stream = username_stream.replace("@", "").strip()
+
+    # Recent pages come straight from memory
+    cached = chat_history_cache.page(
+        limit, before=before_position, after=after_position, username_stream=username_stream, user=user
+    )
+    if cached:
+        entries, has_more = cached
+    else:
+        # One extra row tells us whether another page exists in the direction we are paging
+        messages = await db_service.get_chat_history(
+            limit + 1, before=before_position, after=after_position, username_stream=username_stream, user=user
+        )
+        has_more = len(messages) > limit
+        if has_more:
+            messages = messages[1:] if after_position else messages[:limit]
+
+        # Convert messages for frontend
+        entries = [(msg["timestamp"], ChatMessage.format_for_frontend(msg)) for msg in messages]
+
+    before_cursor = after_cursor = None
+    if entries:
+        (newest_timestamp, newest), (oldest_timestamp, oldest) = entries[0], entries[-1]
+        after_cursor = encode_history_cursor(newest_timestamp, newest["id"])
+        before_cursor = encode_history_cursor(oldest_timestamp, oldest["id"])
+    elif before_position or after_position:
+        # Empty page: keep the caller's position so polling with it continues to work
+        before_cursor = before
+        after_cursor = after
+
+    return {
+        "messages": [formatted for _, formatted in entries],
+        "limit": limit,
+        "has_more": has_more,
+        "before_cursor": before_cursor,
+        "after_cursor": after_cursor
+    }
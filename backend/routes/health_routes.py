@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 from services.database import db_service
+from services.ingestion_pipeline import ingestion_pipeline
+from services.chat_history_cache import chat_history_cache
+from services.stream_lease import stream_leases
+from services.tts_service import tts_service
 from datetime import datetime
 
 router = APIRouter(prefix="/api", tags=["health"])
@@ -15,5 +19,18 @@ async def health_check():
     return {
         "status": "healthy",
         "database": "connected" if db_service.client else "disconnected",
+        "missing_indexes": db_service.missing_indexes,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.get("/pipeline/stats")
+async def pipeline_stats():
+    """Ingestion queue depth, per-stage latency, database write buffer, history cache, stream leases and TTS"""
+    return {
+        **ingestion_pipeline.stats(),
+        "write_buffer": db_service.writer.stats() if db_service.writer else None,
+        "history_cache": chat_history_cache.stats(),
+        "stream_leases": stream_leases.stats(),
+        "tts": tts_service.stats(),
         "timestamp": datetime.now().isoformat()
     }
\ No newline at end of file
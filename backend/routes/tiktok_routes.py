@@ -1,13 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from services.tiktok_service import tiktok_service
 from services.websocket_manager import websocket_manager
+from services.tts_service import tts_service
 import json
 from datetime import datetime
 
 router = APIRouter(prefix="/api", tags=["tiktok"])
 
-# Global TTS enabled state
-tts_enabled = True
 current_username = ""
 
 @router.get("/status")
@@ -16,7 +15,8 @@ async def get_status():
     return {
         "connected": tiktok_service.is_connected,
         "username": tiktok_service.username,
-        "tts_enabled": tts_enabled,
+        "tts_enabled": tts_service.enabled,
+        "tts_engine": tts_service.engine_name,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -73,15 +73,59 @@ async def get_connection_details():
         "has_client": tiktok_service.client is not None,
         "has_connection_task": tiktok_service.connection_task is not None,
         "task_done": tiktok_service.connection_task.done() if tiktok_service.connection_task else None,
-        "tts_enabled": tts_enabled,
+        "tts_enabled": tts_service.enabled,
         "timestamp": datetime.now().isoformat()
     }
 
+@router.get("/streams")
+async def list_streams():
+    """List every stream this backend is following"""
+    return {
+        "streams": tiktok_service.list_streams(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.post("/streams/{username}/connect")
+async def connect_stream(username: str):
+    """Follow an additional TikTok Live stream without dropping the others"""
+    username = username.replace("@", "").strip()
+    if not username:
+        raise HTTPException(status_code=400, detail="Username is required")
+    if not tiktok_service.has_capacity_for(username):
+        raise HTTPException(status_code=429, detail="Maximum number of followed streams reached")
+    
+    success = await tiktok_service.connect_stream(username)
+    
+    if success:
+        return {"success": True, "message": f"Connected to @{username}"}
+    else:
+        raise HTTPException(status_code=500, detail="Failed to connect to TikTok live")
+
+@router.post("/streams/{username}/disconnect")
+async def disconnect_stream(username: str):
+    """Stop following a single TikTok Live stream"""
+    success = await tiktok_service.disconnect_stream(username)
+    
+    if success:
+        return {"success": True, "message": f"Disconnected from @{username.replace('@', '')}"}
+    else:
+        raise HTTPException(status_code=404, detail="Stream is not being followed")
+
+@router.get("/streams/{username}/status")
+async def get_stream_status(username: str):
+    """Get connection status for a single followed stream"""
+    status = tiktok_service.get_stream_status(username)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Stream is not being followed")
+    
+    return {**status, "timestamp": datetime.now().isoformat()}
+
 @router.post("/toggle-tts")
 async def toggle_tts():
     """Toggle TTS on/off"""
-    global tts_enabled
-    tts_enabled = not tts_enabled
+    # The state lives in the tts_status events every worker listens to, so the
+    # toggle flips what all workers agree on rather than this worker's copy
+    tts_enabled = not tts_service.enabled
     
     await websocket_manager.broadcast_json({
         "type": "tts_status",
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+from services.tts_service import tts_service
+
+router = APIRouter(prefix="/api", tags=["tts"])
+
+@router.get("/tts/audio/{audio_id}")
+async def get_tts_audio(audio_id: str):
+    """Audio synthesized for a chat message, as announced by a tts_speaking event"""
+    audio = await tts_service.get_audio(audio_id)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    # Audio for an id never changes, so players and proxies can keep it
+    return Response(
+        content=audio,
+        media_type=tts_service.engine.mime_type if tts_service.engine else "audio/wav",
+        headers={"Cache-Control": "public, max-age=3600, immutable"}
+    )
@@ -7,17 +7,100 @@ import logging
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def _split_param(value):
+    """Split a comma separated query parameter into a list"""
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+def _parse_last_seqs(value) -> dict:
+    """Parse ?resume=<stream>:<seq>,... (or a {"stream": seq} object) into {stream: seq}"""
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = [item.rsplit(":", 1) for item in _split_param(value) if ":" in item]
+    last_seqs = {}
+    for stream, seq in items:
+        try:
+            last_seqs[stream] = int(seq)
+        except (TypeError, ValueError):
+            continue
+    return last_seqs
+
+@router.get("/api/ws/stats")
+async def get_websocket_stats():
+    """Per-client queue depth and dropped frame counters"""
+    return websocket_manager.get_stats()
+
+@router.get("/api/ws/connections")
+async def get_websocket_connections():
+    """Admin view of connected clients with last-activity timestamps"""
+    return websocket_manager.get_connections()
+
 @router.websocket("/api/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time communication"""
-    await websocket_manager.connect(websocket)
+    """WebSocket endpoint for real-time communication.
+    
+    Clients may narrow what they receive with ?stream=<username>&types=chat,status
+    on connect, or later with a {"type": "subscribe"} message.
+
+    Broadcast events carry "seq" and "stream". A reconnecting client passes
+    ?epoch=<epoch from hello>&resume=<stream>:<last seq>,... to receive the
+    events it missed before any new ones.
+
+    ?encoding=json|compact|msgpack selects the wire format (see
+    services/wire_format.py); JSON is the default. With ?batch=1 the client
+    accepts array frames holding several events, used during comment bursts.
+    ?tts=0 (or "tts": false in subscribe) marks chat messages as not to be
+    spoken and leaves out tts_speaking events, for display-only overlays.
+
+    Idle clients are sent {"type": "ping"} and must answer {"type": "pong"}
+    (any message counts) within WS_HEARTBEAT_TIMEOUT or they are
+    disconnected; clients that cannot do so connect with ?heartbeat=0.
+    """
+    await websocket_manager.connect(
+        websocket,
+        encoding=websocket.query_params.get("encoding"),
+        batch=websocket.query_params.get("batch", "").lower() in ("1", "true"),
+        heartbeat=websocket.query_params.get("heartbeat", "1").lower() not in ("0", "false")
+    )
+    websocket_manager.subscribe(
+        websocket,
+        streams=_split_param(websocket.query_params.get("stream")),
+        message_types=_split_param(websocket.query_params.get("types")),
+        tts=websocket.query_params.get("tts", "1").lower() not in ("0", "false")
+    )
+    # Replay before yielding to the event loop, so missed events precede live ones
+    last_seqs = _parse_last_seqs(websocket.query_params.get("resume"))
+    if last_seqs:
+        websocket_manager.resume(websocket, websocket.query_params.get("epoch"), last_seqs)
     try:
         while True:
             data = await websocket.receive_text()
+            websocket_manager.touch(websocket)
             message_data = json.loads(data)
             
             # Handle different message types
-            if message_data.get("type") == "test_message":
+            if message_data.get("type") == "pong":
+                continue  # heartbeat reply; touch() above already recorded it
+            
+            elif message_data.get("type") == "subscribe":
+                streams = message_data.get("username_stream") or message_data.get("streams") or []
+                if isinstance(streams, str):
+                    streams = [streams]
+                client = websocket_manager.subscribe(
+                    websocket, streams, message_data.get("message_types") or [], tts=message_data.get("tts")
+                )
+                if client:
+                    await websocket_manager.send_personal_json({
+                        "type": "subscribed",
+                        "streams": sorted(client.streams),
+                        "message_types": sorted(client.message_types),
+                        "tts": client.tts
+                    }, websocket)
+            
+            elif message_data.get("type") == "resume":
+                websocket_manager.resume(websocket, message_data.get("epoch"), _parse_last_seqs(message_data.get("last_seq") or {}))
+            
+            elif message_data.get("type") == "test_message":
                 # Simulate a chat message for testing using the actual message content
                 user = message_data.get("user", "TestUser")
                 message = message_data.get("message", "Test message")
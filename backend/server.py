@@ -24,6 +24,7 @@ from routes.health_routes import router as health_router
 from routes.tiktok_routes import router as tiktok_router
 from routes.chat_routes import router as chat_router
 from routes.websocket_routes import router as websocket_router
+from routes.tts_routes import router as tts_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,6 +51,7 @@ app.include_router(health_router)
 app.include_router(tiktok_router)
 app.include_router(chat_router)
 app.include_router(websocket_router)
+app.include_router(tts_router)
 
 @app.on_event("startup")
 async def startup_event():
@@ -67,9 +69,26 @@ async def startup_event():
     # Initialize TikTok service dependencies
     from services.tiktok_service import tiktok_service
     from services.websocket_manager import websocket_manager
-    tiktok_service.set_dependencies(websocket_manager, db_service)
+    from services.ingestion_pipeline import ingestion_pipeline
+    tiktok_service.set_dependencies(websocket_manager, db_service, ingestion_pipeline)
     logger.info("✅ TikTok service dependencies initialized")
     
+    # Pick what each stream speaks on the server (synthesized here when a local TTS engine is available)
+    from services.tts_service import tts_service
+    tts_service.set_dependencies(websocket_manager, ingestion_pipeline)
+    logger.info(f"✅ TTS engine: {tts_service.engine_name or 'none (browser speech)'}")
+    
+    # Join the cross-worker backplane, ping idle WebSocket clients and reap dead ones
+    await websocket_manager.start()
+    logger.info(f"✅ WebSocket manager started ({websocket_manager.backplane.kind} backplane)")
+    
+    # Start the ingestion pipeline between TikTok handlers and sinks
+    await ingestion_pipeline.start()
+    logger.info("✅ Ingestion pipeline started")
+    
+    # Follow the streams whose leases this worker holds or can take over
+    tiktok_service.start_leases()
+    
     logger.info("🎯 TikTok Live TTS Bot started successfully!")
 
 @app.on_event("shutdown")
@@ -77,6 +96,29 @@ async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("🛑 Shutting down TikTok Live TTS Bot...")
     
+    # Release stream leases so another worker takes our streams over
+    from services.tiktok_service import tiktok_service
+    await tiktok_service.stop_leases()
+    
+    # Drain queued chat messages before the database goes away
+    from services.ingestion_pipeline import ingestion_pipeline
+    await ingestion_pipeline.stop()
+    logger.info("✅ Ingestion pipeline stopped")
+    
+    from services.websocket_manager import websocket_manager
+    await websocket_manager.stop()
+    
+    # Stop the TTS worker processes
+    from services.tts_service import tts_service
+    await tts_service.stop()
+    
+    # Flush buffered chat messages
+    try:
+        await db_service.flush_pending_writes()
+        logger.info("✅ Buffered chat messages flushed")
+    except Exception as e:
+        logger.error(f"❌ Flushing buffered chat messages failed: {e}")
+    
     # Disconnect from database
     try:
         await db_service.disconnect()
@@ -89,9 +131,11 @@ async def shutdown_event():
 # For debugging and development
 if __name__ == "__main__":
     import uvicorn
+    from services.ws_compression import CompressionWebSocketProtocol
     uvicorn.run(
         "server:app",
         host=settings.HOST,
         port=settings.PORT,
+        ws=CompressionWebSocketProtocol,
         reload=True  # Enable hot reload for development
     )
\ No newline at end of file
@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from typing import Optional
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def normalize_speech_text(text: str) -> str:
+    """Text as it affects the spoken result: case and spacing do not"""
+    return " ".join(text.split()).casefold()
+
+def audio_key(text: str, voice: str) -> str:
+    """Content address of a clip: normalized text spoken by one engine voice (voice, rate, model, ...)"""
+    return hashlib.sha256(f"{voice}\0{normalize_speech_text(text)}".encode()).hexdigest()[:32]
+
+class AudioCache:
+    """Two-tier cache of synthesized clips keyed by audio_key.
+
+    The memory tier is an LRU bounded by total bytes. The disk tier is a
+    directory shared by every worker on the host, bounded by total bytes
+    too: files are touched on every hit, and when the directory grows past
+    its budget the least recently used files are removed. Keys are content
+    hashes, so a clip written by any worker is valid for all of them.
+
+    Disk reads, writes and eviction run in threads (asyncio.to_thread), so
+    a slow disk never stalls the event loop. The directory size is tracked
+    as a running total of this worker's writes; it is rescanned only when
+    the total goes over budget, to evict with every worker's files in view.
+    """
+
+    def __init__(self, directory: str = None, memory_bytes: int = None, disk_bytes: int = None):
+        self.directory = directory or settings.TTS_AUDIO_DIR
+        self.memory_bytes = settings.TTS_AUDIO_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.disk_bytes = settings.TTS_AUDIO_DISK_BYTES if disk_bytes is None else disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None  # measured lazily, then tracked approximately
+        self._disk_lock = threading.Lock()
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.disk_evictions = 0
+
+    def _path(self, key: str) -> Optional[str]:
+        if not KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.directory, f"{key}.wav")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Clip for a key from memory, then disk; None on a miss"""
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            self.bytes_saved += len(audio)
+            return audio
+
+        audio = await asyncio.to_thread(self._read_disk, key)
+        if audio is not None:
+            self.disk_hits += 1
+            self.bytes_saved += len(audio)
+            self._remember(key, audio)
+            return audio
+
+        self.misses += 1
+        return None
+
+    async def peek(self, key: str) -> Optional[bytes]:
+        """Like get, for serving clips that are already known to exist; not counted as a lookup"""
+        audio = self._memory.get(key)
+        return audio if audio is not None else await asyncio.to_thread(self._read_disk, key)
+
+    async def put(self, key: str, audio: bytes, memory: bool = True):
+        """Store a clip; memory=False keeps one-off clips out of the memory LRU (disk tier only)"""
+        if memory or self.disk_bytes <= 0:
+            self._remember(key, audio)
+        await asyncio.to_thread(self._write_disk, key, audio)
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if path is None or self.disk_bytes <= 0:
+            return None
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # recency for LRU eviction
+        except OSError:
+            pass
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._path(key)
+        if path is None or self.disk_bytes <= 0:
+            return
+        try:
+            # Same key, same content (possibly written by another worker): just refresh its recency
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temp file of our own, then link it into place so a worker serving
+        # the clip never reads it half written. Linking fails if another thread or
+        # worker got there first, which keeps that clip from being counted twice.
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f"{key}.", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.link(tmp_path, path)
+        except FileExistsError:
+            return
+        except OSError as e:
+            logger.error(f"Could not write TTS audio to {self.directory}: {e}")
+            return
+        finally:
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+        with self._disk_lock:
+            if self._disk_used is None:
+                self._disk_used = self._scan_disk()[0]
+            else:
+                self._disk_used += len(audio)
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        """(total bytes, [(mtime, size, path)]) of the clips on disk, all workers included"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(".wav"):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return sum(size for _, size, _ in entries), entries
+
+    def _evict_disk(self):
+        # Rescan: other workers write to the same directory, so the running total is only an estimate.
+        # Called with _disk_lock held.
+        total, entries = self._scan_disk()
+        # Go a little below the budget so eviction does not run on every write
+        target = self.disk_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                total -= size
+        self._disk_used = total
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "memory_limit_bytes": self.memory_bytes,
+            "disk_bytes": self._disk_used,
+            "disk_limit_bytes": self.disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "disk_evictions": self.disk_evictions
+        }
@@ -0,0 +1,213 @@
+from typing import Awaitable, Callable, Optional, Set
+import asyncio
+import fcntl
+import json
+import logging
+import os
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Backplane kinds (WS_BACKPLANE)
+IN_PROCESS = "inprocess"
+UNIX_SOCKET = "unix"
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+class InProcessBackplane:
+    """Single-worker backplane: published events are delivered straight back to this process"""
+
+    kind = IN_PROCESS
+
+    def __init__(self, handler: EventHandler):
+        self._handler = handler
+        self.published = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: dict):
+        self.published += 1
+        await self._handler(event)
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "published": self.published}
+
+class UnixSocketBackplane:
+    """Fans events out to every worker on this host through a Unix socket broker.
+
+    Each worker connects to the socket as a peer. Whichever worker holds the
+    lock file hosts the broker, which relays every published line (one JSON
+    event per line) to all peers, the publisher included, so every worker
+    sees the same events in the same order. If the broker's worker exits,
+    the others reconnect and one of them takes the lock over. While a worker
+    is not connected its events are delivered locally only.
+    """
+
+    kind = UNIX_SOCKET
+
+    def __init__(self, handler: EventHandler, path: str = None, reconnect_delay: float = 0.5,
+                 max_peer_buffer: int = 8 * 1024 * 1024):
+        self._handler = handler
+        self.path = path or settings.WS_BACKPLANE_SOCKET
+        self.reconnect_delay = reconnect_delay
+        self.max_peer_buffer = max_peer_buffer
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._peer_tasks: Set[asyncio.Task] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Counters
+        self.published = 0
+        self.received = 0
+        self.local_only = 0
+        self.peers_dropped = 0
+
+    @property
+    def is_broker(self) -> bool:
+        return self._server is not None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            if not self.is_broker:
+                await self._try_become_broker()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._writer = writer
+            logger.info(f"Backplane connected to {self.path} ({'broker' if self.is_broker else 'peer'})")
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self.received += 1
+                    try:
+                        await self._handler(json.loads(line))
+                    except Exception as e:
+                        logger.error(f"Backplane event handler failed: {e}")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+
+            if not self._stopping:
+                logger.warning("Backplane connection lost, reconnecting")
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _try_become_broker(self):
+        """Host the broker if no other worker holds the lock"""
+        try:
+            lock_file = open(f"{self.path}.lock", "a")
+        except OSError as e:
+            logger.error(f"Could not open backplane lock file: {e}")
+            return
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()  # another worker is the broker
+            return
+
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # left behind by a broker that died; we hold the lock now
+            self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+            self._lock_file = lock_file
+            logger.info(f"Backplane broker listening on {self.path}")
+        except OSError as e:
+            logger.error(f"Could not start backplane broker on {self.path}: {e}")
+            lock_file.close()
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        self._peer_tasks.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    if peer.transport.get_write_buffer_size() > self.max_peer_buffer:
+                        # A worker that stopped reading must not grow the broker's memory without bound
+                        logger.warning("Dropping backplane peer that is not keeping up")
+                        self._peers.discard(peer)
+                        self.peers_dropped += 1
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            self._peer_tasks.discard(asyncio.current_task())
+            writer.close()
+
+    async def publish(self, event: dict):
+        self.published += 1
+        if self.connected:
+            self._writer.write(json.dumps(event).encode() + b"\n")
+            return
+        # No broker reachable: at least serve this worker's own clients
+        self.local_only += 1
+        await self._handler(event)
+
+    async def stop(self):
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._server:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            # Peer handlers finish on their own once their connections are closed
+            await asyncio.gather(*self._peer_tasks, return_exceptions=True)
+            self._peers.clear()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "path": self.path,
+            "role": "broker" if self.is_broker else "peer",
+            "connected": self.connected,
+            "peers": len(self._peers) if self.is_broker else None,
+            "published": self.published,
+            "received": self.received,
+            "local_only": self.local_only,
+            "peers_dropped": self.peers_dropped
+        }
+
+def create_backplane(handler: EventHandler, kind: str = None):
+    """Backplane configured by WS_BACKPLANE"""
+    kind = (kind or settings.WS_BACKPLANE).lower()
+    if kind == UNIX_SOCKET:
+        return UnixSocketBackplane(handler)
+    if kind != IN_PROCESS:
+        logger.warning(f"Unknown WS_BACKPLANE '{kind}', using {IN_PROCESS}")
+    return InProcessBackplane(handler)
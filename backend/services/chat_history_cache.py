@@ -0,0 +1,125 @@
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import heapq
+import logging
+
+from config.settings import settings
+from models.chat_message import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Ring holding the recent messages of every stream, for unfiltered history requests
+ALL_STREAMS = "*"
+
+# (timestamp, id) position of a message in history order
+Position = Tuple[datetime, str]
+
+def _storage_timestamp(timestamp: datetime) -> datetime:
+    """Truncate to milliseconds, the precision MongoDB stores, so cached and stored positions agree"""
+    return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+
+class ChatHistoryCache:
+    """Per-stream ring buffers of recently handled chat messages.
+
+    Messages are stored already formatted for the frontend. The cache is fed
+    from broadcast chat_message events, which reach every worker through the
+    WebSocket backplane in the same order, so each ring is a contiguous
+    window of the newest history: a page that falls entirely inside the
+    window can be answered without MongoDB. Pages reaching past the oldest
+    cached message return None and the caller falls back to the database.
+    """
+
+    def __init__(self, capacity: int = None):
+        self.capacity = settings.CHAT_HISTORY_CACHE_SIZE if capacity is None else capacity
+        self._rings: Dict[str, Deque[Tuple[Position, str, dict]]] = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def add(self, chat_message: ChatMessage):
+        """Record a handled message in its stream's ring and the all-streams ring"""
+        self._add_document(chat_message.to_dict())
+
+    def add_event(self, event: dict):
+        """Record a broadcast chat_message event (ChatMessage.to_websocket_dict shape)"""
+        if "id" not in event:
+            return
+        self._add_document({
+            "id": event["id"],
+            "user": event["user"],
+            "message": event["message"],
+            "timestamp": datetime.fromisoformat(event["timestamp"]),
+            "username_stream": event.get("username_stream", "")
+        })
+
+    def _add_document(self, document: dict):
+        if not self.enabled:
+            return
+        document["timestamp"] = _storage_timestamp(document["timestamp"])
+        entry = ((document["timestamp"], document["id"]), document["user"], ChatMessage.format_for_frontend(document))
+        for key in (document["username_stream"], ALL_STREAMS):
+            ring = self._rings.get(key)
+            if ring is None:
+                ring = self._rings[key] = deque(maxlen=self.capacity)
+            ring.append(entry)
+
+    def page(self, limit: int, before: Optional[Position] = None, after: Optional[Position] = None,
+             username_stream: Optional[str] = None, user: Optional[str] = None) -> Optional[Tuple[List[Tuple[datetime, dict]], bool]]:
+        """Answer a history page from memory, newest first.
+
+        Returns (entries, has_more) with entries as (timestamp, formatted
+        message), or None when the page is not fully inside the cached window.
+        """
+        ring = self._rings.get(username_stream or ALL_STREAMS)
+        if not ring:
+            self.misses += 1
+            return None
+
+        # Messages sharing the oldest cached timestamp may have been evicted
+        # partially, so only positions strictly newer than it are complete.
+        oldest_timestamp = ring[0][0][0]
+
+        if after:
+            if after[0] <= oldest_timestamp:
+                self.misses += 1
+                return None
+            matches = [entry for entry in ring if entry[0] > after and (user is None or entry[1] == user)]
+            newest = heapq.nsmallest(limit + 1, matches, key=lambda entry: entry[0])
+            has_more = len(newest) > limit
+            entries = newest[:limit][::-1]
+        else:
+            matches = [
+                entry for entry in ring
+                if entry[0][0] > oldest_timestamp
+                and (before is None or entry[0] < before)
+                and (user is None or entry[1] == user)
+            ]
+            if len(matches) <= limit:
+                # Cannot tell whether older messages exist beyond the window
+                self.misses += 1
+                return None
+            entries = heapq.nlargest(limit, matches, key=lambda entry: entry[0])
+            has_more = True
+
+        self.hits += 1
+        return [(position[0], formatted) for position, _, formatted in entries], has_more
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "streams": len([key for key in self._rings if key != ALL_STREAMS]),
+            "cached_messages": sum(len(ring) for key, ring in self._rings.items() if key != ALL_STREAMS),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+# Global chat history cache instance
+chat_history_cache = ChatHistoryCache()
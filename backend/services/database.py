@@ -1,46 +1,356 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
 from config.settings import settings
+from services.spill_log import SpillLog
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Indexes backing chat history queries, as (name, keys). History is ordered by
+# (timestamp, id) so keyset pagination has a unique tie-breaker.
+CHAT_MESSAGE_INDEXES = [
+    ("username_stream_timestamp_id", [("username_stream", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ("user_timestamp_id", [("user", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ("timestamp_id", [("timestamp", DESCENDING), ("id", DESCENDING)]),
+]
+
+# Earlier index names that are now covered by a CHAT_MESSAGE_INDEXES prefix
+SUPERSEDED_CHAT_MESSAGE_INDEXES = ["username_stream_timestamp", "timestamp"]
+
+class BufferedChatWriter:
+    """Write-behind buffer that persists chat documents with insert_many.
+
+    Documents are flushed when the buffer reaches batch_size or when
+    flush_interval seconds have passed since the last flush, whichever
+    comes first.
+
+    With a spill log, batches that fail to write (and buffer overflow while
+    the database is unavailable) go to disk instead of being lost, and are
+    replayed in bulk once the database answers again.
+    """
+
+    def __init__(self, collection, batch_size: int = None, flush_interval: float = None, max_buffer: int = None,
+                 spill: Optional[SpillLog] = None):
+        self.collection = collection
+        self.spill = spill
+        self.db_available = True
+        self.batch_size = batch_size or settings.DB_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.DB_WRITE_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.DB_WRITE_MAX_BUFFER
+        self._buffer = deque()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Counters
+        self.documents_written = 0
+        self.documents_dropped = 0
+        self.documents_spilled = 0
+        self.documents_replayed = 0
+        self.segments_quarantined = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def add(self, document: dict):
+        """Buffer a document; never waits on the database"""
+        if len(self._buffer) >= self.max_buffer and self.spill:
+            # Database is not keeping up: send the backlog to disk until it catches up
+            if self.db_available:
+                logger.warning(f"Chat write buffer full ({self.max_buffer}), spilling to disk")
+                self.db_available = False
+            self._wake.set()
+        elif len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.documents_dropped += 1
+            logger.warning(f"Chat write buffer full ({self.max_buffer}), dropping oldest message")
+        self._buffer.append(document)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self.spill:
+                await self.replay_spill()
+
+    async def flush(self):
+        """Write everything buffered so far in batches of batch_size"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if self.db_available or not self.spill:
+                    await self._write_batch(batch)
+                else:
+                    await self._spill_batch(batch)
+
+    async def _write_batch(self, batch: List[dict]) -> bool:
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.documents_written += len(batch)
+            self.flushes += 1
+            logger.debug(f"Flushed {len(batch)} chat messages")
+            return True
+        except BulkWriteError as e:
+            # ordered=False: everything except the reported failures was written.
+            # Duplicate keys (code 11000) come from replaying a batch that was already stored.
+            errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+            self.documents_written += len(batch) - len(errors)
+            self.flushes += 1
+            if errors:
+                logger.error(f"Bulk write of chat messages had {len(errors)} errors")
+            return True
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Error saving {len(batch)} messages to database: {e}")
+            if self.spill:
+                self.db_available = False
+                await self._spill_batch(batch)
+            return False
+
+    async def _spill_batch(self, batch: List[dict]):
+        """Append a batch to the on-disk spill log without blocking the event loop"""
+        for document in batch:
+            # Fix the _id now so a replay that partly succeeded earlier is idempotent
+            document.setdefault("_id", ObjectId())
+        try:
+            await asyncio.to_thread(self.spill.append, batch)
+            self.documents_spilled += len(batch)
+            logger.warning(f"Spilled {len(batch)} chat messages to disk while the database is unavailable")
+        except Exception as e:
+            self.documents_dropped += len(batch)
+            logger.error(f"Error spilling {len(batch)} chat messages to disk: {e}")
+
+    async def _database_reachable(self) -> bool:
+        try:
+            await self.collection.database.command("ping")
+            return True
+        except Exception:
+            return False
+
+    async def replay_spill(self):
+        """Move spilled documents back into MongoDB once it is reachable again"""
+        async with self._flush_lock:
+            if not await asyncio.to_thread(self.spill.has_pending):
+                return
+            if not self.db_available:
+                if not await self._database_reachable():
+                    return
+                logger.info("Database reachable again, replaying spilled chat messages")
+                self.db_available = True
+
+            await asyncio.to_thread(self.spill.seal)
+            for path in await asyncio.to_thread(self.spill.segments):
+                handle = await asyncio.to_thread(self.spill.claim, path)
+                if handle is None:
+                    continue  # another worker is replaying it
+                try:
+                    if not await self._replay_segment(path):
+                        return
+                finally:
+                    await asyncio.to_thread(self.spill.release, handle)
+
+    async def _replay_segment(self, path: str) -> bool:
+        """Insert one claimed segment and remove it; False if replay should stop for now"""
+        documents = await asyncio.to_thread(self.spill.read_segment, path)
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys come from an earlier partial replay; anything else quarantines the segment
+                errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+                if errors:
+                    # Retrying would fail the same way on every flush: set the segment aside instead
+                    quarantined = await asyncio.to_thread(self.spill.quarantine, path)
+                    self.segments_quarantined += 1
+                    logger.error(f"Replay of {os.path.basename(path)} had {len(errors)} write errors "
+                                 f"({errors[0].get('errmsg')}), moved it to {os.path.basename(quarantined)}")
+                    return True
+            except Exception as e:
+                logger.error(f"Replay of spilled chat messages failed, will retry: {e}")
+                self.db_available = False
+                return False
+            self.documents_replayed += len(batch)
+        await asyncio.to_thread(self.spill.remove, path)
+        logger.info(f"Replayed {len(documents)} spilled chat messages")
+        return True
+
+    async def stop(self):
+        """Stop the background flusher and write whatever is left"""
+        if self._task:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "documents_written": self.documents_written,
+            "documents_dropped": self.documents_dropped,
+            "documents_spilled": self.documents_spilled,
+            "documents_replayed": self.documents_replayed,
+            "segments_quarantined": self.segments_quarantined,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "db_available": self.db_available,
+            "spill": self.spill.stats() if self.spill else None
+        }
+
 class DatabaseService:
     def __init__(self):
         self.client = None
         self.db = None
-    
+        self.writer: Optional[BufferedChatWriter] = None
+        self.missing_indexes: Optional[List[str]] = None  # None until the startup check has run
+        self._index_task: Optional[asyncio.Task] = None
+
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(settings.MONGO_URL)
+            self.client = AsyncIOMotorClient(settings.MONGO_URL, serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS)
             self.db = self.client[settings.DATABASE_NAME]
             logger.info(f"Connected to MongoDB: {settings.DATABASE_NAME}")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
-    
+
+        # Index setup talks to the server, so keep it off the startup path
+        self._index_task = asyncio.create_task(self._prepare_indexes())
+
+        if settings.DB_WRITE_BEHIND:
+            spill = None
+            if settings.DB_SPILL_ENABLED:
+                spill = SpillLog(settings.DB_SPILL_DIR, settings.DB_SPILL_SEGMENT_BYTES, settings.DB_SPILL_FSYNC)
+            self.writer = BufferedChatWriter(self.db.chat_messages, spill=spill)
+            self.writer.start()
+
+    async def _prepare_indexes(self):
+        if settings.DB_ENSURE_INDEXES:
+            await self.ensure_indexes()
+        await self.check_indexes()
+
+    async def ensure_indexes(self):
+        """Create the chat history indexes if they do not exist yet"""
+        for name, keys in CHAT_MESSAGE_INDEXES:
+            try:
+                await self.db.chat_messages.create_index(keys, name=name)
+            except Exception as e:
+                logger.error(f"Failed to create index {name} on chat_messages: {e}")
+
+        try:
+            existing = await self.db.chat_messages.index_information()
+            for name in SUPERSEDED_CHAT_MESSAGE_INDEXES:
+                if name in existing:
+                    await self.db.chat_messages.drop_index(name)
+                    logger.info(f"Dropped superseded index {name} on chat_messages")
+        except Exception as e:
+            logger.error(f"Failed to drop superseded chat_messages indexes: {e}")
+
+    async def check_indexes(self) -> List[str]:
+        """Report chat history indexes that are missing, matched by key pattern"""
+        try:
+            existing = await self.db.chat_messages.index_information()
+        except Exception as e:
+            logger.error(f"Could not read chat_messages indexes: {e}")
+            return self.missing_indexes
+
+        existing_keys = [
+            [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in index["key"]]
+            for index in existing.values()
+        ]
+        self.missing_indexes = [name for name, keys in CHAT_MESSAGE_INDEXES if keys not in existing_keys]
+        if self.missing_indexes:
+            logger.warning(f"chat_messages is missing indexes: {', '.join(self.missing_indexes)}; history queries will scan the collection")
+        else:
+            logger.info("chat_messages indexes are in place")
+        return self.missing_indexes
+
+    async def flush_pending_writes(self):
+        """Persist any buffered chat messages now"""
+        if self.writer:
+            await self.writer.stop()
+            self.writer = None
+
     async def disconnect(self):
         """Disconnect from MongoDB"""
+        if self._index_task and not self._index_task.done():
+            self._index_task.cancel()
+        await self.flush_pending_writes()
         if self.client:
             self.client.close()
             logger.info("Disconnected from MongoDB")
-    
+
     async def save_chat_message(self, chat_message):
         """Save chat message to database"""
+        if self.writer:
+            self.writer.add(chat_message.to_dict())
+            return
+
         try:
             await self.db.chat_messages.insert_one(chat_message.to_dict())
             logger.info(f"Saved chat message: {chat_message.user}: {chat_message.message}")
         except Exception as e:
             logger.error(f"Error saving message to database: {e}")
-            
-    async def get_chat_history(self, limit: int = 50):
-        """Get chat history from database"""
+
+    async def get_chat_history(self, limit: int = 50, before: Optional[Tuple[datetime, str]] = None,
+                               after: Optional[Tuple[datetime, str]] = None, username_stream: Optional[str] = None,
+                               user: Optional[str] = None):
+        """Get one page of chat history, newest first.
+
+        before/after are (timestamp, id) keyset positions: before returns
+        messages older than the position, after returns messages newer than
+        it. Both are served by the (..., timestamp, id) indexes, so deep pages
+        cost the same as the first one.
+        """
+        query = {}
+        if username_stream:
+            query["username_stream"] = username_stream
+        if user:
+            query["user"] = user
+
+        direction = DESCENDING
+        if before:
+            timestamp, message_id = before
+            query["$or"] = [{"timestamp": {"$lt": timestamp}}, {"timestamp": timestamp, "id": {"$lt": message_id}}]
+        elif after:
+            timestamp, message_id = after
+            query["$or"] = [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "id": {"$gt": message_id}}]
+            direction = ASCENDING
+
         try:
-            messages = await self.db.chat_messages.find().sort("timestamp", -1).limit(limit).to_list(length=limit)
+            cursor = self.db.chat_messages.find(query).sort([("timestamp", direction), ("id", direction)]).limit(limit)
+            messages = await cursor.to_list(length=limit)
+            if direction == ASCENDING:
+                messages.reverse()
             return messages
         except Exception as e:
             logger.error(f"Error fetching chat history: {e}")
             return []
 
 # Global database instance
-db_service = DatabaseService()
\ No newline at end of file
+db_service = DatabaseService()
@@ -0,0 +1,179 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Number of recent samples kept for latency percentiles
+LATENCY_WINDOW = 1024
+
+def _percentiles_ms(samples) -> dict:
+    if not samples:
+        return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "p50_ms": round(ordered[round(last * 0.50)] * 1000, 3),
+        "p99_ms": round(ordered[round(last * 0.99)] * 1000, 3),
+        "max_ms": round(ordered[last] * 1000, 3)
+    }
+
+class PipelineStage:
+    """A consumer stage with its own bounded queue and worker pool"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], concurrency: int = 1, queue_size: int = None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.PIPELINE_QUEUE_SIZE)
+        self._workers: List[asyncio.Task] = []
+
+        # Counters
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._handler_latency = deque(maxlen=LATENCY_WINDOW)
+        self._queue_wait = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def offer(self, event) -> bool:
+        """Hand an event to this stage without waiting; drops it if the stage is full"""
+        try:
+            self.queue.put_nowait((time.perf_counter(), event))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _worker(self):
+        while True:
+            enqueued_at, event = await self.queue.get()
+            started = time.perf_counter()
+            self._queue_wait.append(started - enqueued_at)
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Pipeline stage '{self.name}' failed: {e}")
+            finally:
+                self._handler_latency.append(time.perf_counter() - started)
+                self.queue.task_done()
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "queue_wait": _percentiles_ms(self._queue_wait),
+            "latency": _percentiles_ms(self._handler_latency)
+        }
+
+class IngestionPipeline:
+    """Decouples TikTok event handlers from downstream sinks.
+
+    Handlers submit lightweight events onto a bounded ingress queue and
+    return immediately. A dispatcher copies every event to each registered
+    stage (broadcast, persistence, ...), and the stages run in parallel with
+    their own concurrency limits.
+    """
+
+    def __init__(self, queue_size: int = None):
+        self._queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._stages: Dict[str, PipelineStage] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None and not self._dispatcher.done()
+
+    def add_stage(self, name: str, handler: Callable[[Any], Awaitable[None]], concurrency: int = 1, queue_size: int = None):
+        """Register a consumer stage; stages added while running start immediately"""
+        if name in self._stages:
+            return
+        stage = PipelineStage(name, handler, concurrency, queue_size)
+        self._stages[name] = stage
+        if self.running:
+            stage.start()
+
+    def submit(self, event) -> bool:
+        """Queue an event for all stages without blocking the caller"""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(event)
+            self.submitted += 1
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Ingestion queue full ({self._queue.maxsize}), dropping event")
+            return False
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        for stage in self._stages.values():
+            stage.start()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        logger.info(f"Ingestion pipeline started with stages: {', '.join(self._stages)}")
+
+    async def _dispatch(self):
+        while True:
+            event = await self._queue.get()
+            for stage in self._stages.values():
+                if not stage.offer(event):
+                    logger.warning(f"Pipeline stage '{stage.name}' is full, dropping event")
+            self._queue.task_done()
+
+    async def stop(self, timeout: float = 5.0):
+        """Drain queued events (up to timeout) and stop all workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingestion pipeline did not drain before shutdown timeout")
+
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        for stage in self._stages.values():
+            await stage.stop()
+        logger.info("Ingestion pipeline stopped")
+
+    async def _drain(self):
+        await self._queue.join()
+        for stage in self._stages.values():
+            await stage.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "ingress_depth": self._queue.qsize() if self._queue else 0,
+            "ingress_size": self._queue_size,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "stages": {name: stage.stats() for name, stage in self._stages.items()}
+        }
+
+# Global ingestion pipeline instance
+ingestion_pipeline = IngestionPipeline()
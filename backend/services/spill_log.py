@@ -0,0 +1,194 @@
+from typing import List
+import fcntl
+import logging
+import os
+import struct
+import time
+import zlib
+
+import bson
+
+logger = logging.getLogger(__name__)
+
+# Record layout: 4-byte big-endian payload length, 4-byte CRC32 of the payload, BSON payload
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_PREFIX = "chat-"
+SEGMENT_SUFFIX = ".seg"
+# Segments MongoDB rejected for reasons other than duplicates are renamed with this suffix and kept for inspection
+QUARANTINE_SUFFIX = ".bad"
+
+# fsync policies
+FSYNC_ALWAYS = "always"      # fsync after every append
+FSYNC_INTERVAL = "interval"  # fsync at most once per fsync_interval seconds
+FSYNC_NEVER = "never"        # leave it to the OS
+
+class SpillLog:
+    """Append-only segment files holding chat documents that could not be written to MongoDB.
+
+    Appends go to the newest segment until it reaches segment_bytes. Replay
+    reads sealed segments oldest first; a torn record at the end of a
+    segment (crash mid-append) is detected by its length/CRC and ignored.
+    All methods are blocking and meant to be called via asyncio.to_thread.
+
+    Every worker may share the directory: segment names carry the writer's
+    pid, and the writer holds an exclusive flock on its active segment.
+    A worker replays the segments it sealed itself and those of writers
+    that are no longer running, each under an exclusive flock (see claim)
+    so that no two workers replay the same segment.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, fsync_policy: str = FSYNC_ALWAYS, fsync_interval: float = 1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.pid = os.getpid()
+        self._active = None
+        self._active_path = None
+        self._last_fsync = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, documents: List[dict]):
+        """Durably (per fsync policy) append documents to the active segment"""
+        if not documents:
+            return
+        records = []
+        for document in documents:
+            payload = bson.encode(document)
+            records.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            records.append(payload)
+
+        segment = self._active_segment()
+        segment.write(b"".join(records))
+        segment.flush()
+        self._maybe_fsync(segment)
+
+        if segment.tell() >= self.segment_bytes:
+            self.seal()
+
+    def _active_segment(self):
+        if self._active is None:
+            self._active_path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{self.pid}-{time.time_ns():020d}{SEGMENT_SUFFIX}")
+            self._active = open(self._active_path, "ab")
+            # Held until sealed (or the process dies) so no other worker claims it mid-write
+            fcntl.flock(self._active.fileno(), fcntl.LOCK_EX)
+        return self._active
+
+    def _maybe_fsync(self, segment):
+        if self.fsync_policy == FSYNC_ALWAYS:
+            os.fsync(segment.fileno())
+        elif self.fsync_policy == FSYNC_INTERVAL and time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(segment.fileno())
+            self._last_fsync = time.monotonic()
+
+    def seal(self):
+        """Close the active segment so the next append starts a new one"""
+        if self._active is not None:
+            if self.fsync_policy != FSYNC_NEVER:
+                os.fsync(self._active.fileno())
+            self._active.close()
+            self._active = None
+            self._active_path = None
+
+    @staticmethod
+    def _parse_name(name: str):
+        """(writer pid or None, creation time in ns) of a segment file name"""
+        stem = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+        pid, _, created = stem.rpartition("-")
+        # Segments written before names carried a pid have no owner
+        return (int(pid) if pid.isdigit() else None), int(created) if created.isdigit() else 0
+
+    @staticmethod
+    def _writer_running(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def segments(self) -> List[str]:
+        """Sealed segments this process may replay, oldest first: its own and those of writers that are gone"""
+        found = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            pid, created = self._parse_name(name)
+            if pid is not None and pid != self.pid and self._writer_running(pid):
+                continue
+            path = os.path.join(self.directory, name)
+            if path != self._active_path:
+                found.append((created, path))
+        return [path for _, path in sorted(found)]
+
+    def claim(self, path: str):
+        """Lock a segment for replay; returns the handle to pass to release, or None if another worker has it"""
+        try:
+            handle = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        # Another worker may have replayed and removed it between our open and flock
+        if os.fstat(handle.fileno()).st_nlink == 0:
+            handle.close()
+            return None
+        return handle
+
+    def release(self, handle):
+        handle.close()
+
+    def has_pending(self) -> bool:
+        return self._active is not None or bool(self.segments())
+
+    def read_segment(self, path: str) -> List[dict]:
+        """Decode every intact record in a segment"""
+        documents = []
+        with open(path, "rb") as segment:
+            data = segment.read()
+
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.warning(f"Ignoring torn record at offset {offset} in {os.path.basename(path)}")
+                break
+            documents.append(bson.decode(payload))
+            offset = start + length
+        return documents
+
+    def remove(self, path: str):
+        """Delete a replayed segment; call while holding its claim"""
+        os.remove(path)
+
+    def quarantine(self, path: str) -> str:
+        """Set aside a segment that cannot be replayed so it is not retried; call while holding its claim"""
+        quarantined = path + QUARANTINE_SUFFIX
+        os.replace(path, quarantined)
+        return quarantined
+
+    def quarantined(self) -> List[str]:
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX + QUARANTINE_SUFFIX)
+        )
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        pending_bytes = sum(os.path.getsize(path) for path in segments)
+        if self._active_path and os.path.exists(self._active_path):
+            segments.append(self._active_path)
+            pending_bytes += os.path.getsize(self._active_path)
+        return {
+            "directory": self.directory,
+            "fsync_policy": self.fsync_policy,
+            "pending_segments": len(segments),
+            "pending_bytes": pending_bytes,
+            "quarantined_segments": len(self.quarantined())
+        }
@@ -0,0 +1,188 @@
+from typing import Dict, IO, Optional
+import fcntl
+import logging
+import os
+import re
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Shared file recording which stream the single-stream API (/api/connect) follows
+PRIMARY_FILE = "primary"
+
+def _file_key(key: str) -> str:
+    """Stream key made safe for use as a file name"""
+    return re.sub(r"[^a-z0-9._-]", "_", key)
+
+class StreamLeaseManager:
+    """Cross-worker ownership of followed TikTok streams.
+
+    Every worker on the host shares a lease directory. A stream somebody
+    asked to follow has a "<key>.want" file holding its username, and the
+    worker that follows it holds an exclusive flock on "<key>.lock" (which
+    also records the owner's pid). flock locks die with their process, so
+    when the owner exits or crashes the lease frees up by itself and the
+    next worker to poll the wanted streams takes the stream over. Want files
+    outlive the workers, so followed streams come back after a restart.
+
+    When leases are disabled every acquire succeeds and nothing is shared,
+    which is the single-worker behaviour.
+    """
+
+    def __init__(self, directory: str = None, enabled: bool = None):
+        self.directory = directory or settings.TIKTOK_LEASE_DIR
+        self.enabled = settings.TIKTOK_STREAM_LEASES if enabled is None else enabled
+        self._held: Dict[str, IO] = {}
+
+        # Counters
+        self.acquired = 0
+        self.contended = 0
+        self.released = 0
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{_file_key(key)}.{suffix}")
+
+    # Ownership
+
+    def owns(self, key: str) -> bool:
+        return key in self._held
+
+    def acquire(self, key: str) -> bool:
+        """Take the lease for a stream unless another worker holds it"""
+        if not self.enabled or key in self._held:
+            return True
+        lock_file = open(self._path(key, "lock"), "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            self.contended += 1
+            return False
+
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._held[key] = lock_file
+        self.acquired += 1
+        logger.info(f"🔒 Acquired lease for @{key} (pid {os.getpid()})")
+        return True
+
+    def release(self, key: str):
+        lock_file = self._held.pop(key, None)
+        if lock_file:
+            # Closing the descriptor drops the flock; the file stays for the next owner
+            lock_file.close()
+            self.released += 1
+            logger.info(f"🔓 Released lease for @{key}")
+
+    def release_all(self):
+        for key in list(self._held):
+            self.release(key)
+
+    def owner(self, key: str) -> Optional[int]:
+        """Pid of the worker holding a stream's lease, None when nobody does"""
+        if key in self._held:
+            return os.getpid()
+        if not self.enabled:
+            return None
+        try:
+            lock_file = open(self._path(key, "lock"), "r")
+        except FileNotFoundError:
+            return None
+        with lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                try:
+                    return int(lock_file.read().strip() or 0) or None
+                except ValueError:
+                    return None
+            # Nobody holds it; let go straight away so an owner can still take it
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            return None
+
+    # Desired streams
+
+    def want(self, key: str, username: str):
+        """Record that a stream should be followed by some worker"""
+        if self.enabled:
+            self._write(self._path(key, "want"), username)
+
+    def unwant(self, key: str):
+        if self.enabled:
+            self._remove(self._path(key, "want"))
+
+    def is_wanted(self, key: str) -> bool:
+        return not self.enabled or os.path.exists(self._path(key, "want"))
+
+    def wanted(self) -> Dict[str, str]:
+        """Stream key -> username for every stream some worker was asked to follow"""
+        if not self.enabled:
+            return {}
+        streams = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".want"):
+                continue
+            username = self._read(os.path.join(self.directory, name))
+            if username:
+                streams[username.replace("@", "").strip().lower()] = username
+        return streams
+
+    # Primary stream
+
+    def set_primary(self, username: Optional[str]):
+        if not self.enabled:
+            return
+        path = os.path.join(self.directory, PRIMARY_FILE)
+        if username:
+            self._write(path, username)
+        else:
+            self._remove(path)
+
+    def primary(self) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return self._read(os.path.join(self.directory, PRIMARY_FILE)) or None
+
+    # Files
+
+    @staticmethod
+    def _write(path: str, content: str):
+        # Write then rename so readers on other workers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path: str) -> str:
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory if self.enabled else None,
+            "pid": os.getpid(),
+            "held": sorted(self._held),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "released": self.released
+        }
+
+# Global stream lease manager instance
+stream_leases = StreamLeaseManager()
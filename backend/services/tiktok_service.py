@@ -1,312 +1,144 @@
 import asyncio
-import json
 import logging
+import os
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from TikTokLive import TikTokLiveClient
-from TikTokLive.events import ConnectEvent, CommentEvent, DisconnectEvent, UserStatsEvent
 
 from config.settings import settings
 from models.chat_message import ChatMessage
+from services.chat_history_cache import chat_history_cache
+from services.stream_lease import stream_leases
+from services.tiktok_stream import TikTokStream
+from services.tts_service import tts_service
 
 logger = logging.getLogger(__name__)
 
+def normalize_username(username: str) -> str:
+    """Registry key for a TikTok username"""
+    return username.replace("@", "").strip().lower()
+
 class TikTokService:
+    """Registry of followed TikTok Live streams.
+
+    Each stream has its own client and lifecycle. The original single-stream
+    API (connect_to_stream, disconnect_from_stream, client, username, ...)
+    operates on the "primary" stream so the existing endpoints keep working.
+
+    With stream leases enabled (multi-worker deployments) a worker only
+    creates a client for streams whose lease it holds; requests for a stream
+    another worker owns just record that it is wanted, and a periodic
+    reconcile takes over wanted streams whose owner has gone away.
+    """
     _instance = None
     _lock = asyncio.Lock()
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(TikTokService, cls).__new__(cls)
-            cls._instance.client: Optional[TikTokLiveClient] = None
-            cls._instance.is_connected = False
-            cls._instance.username = ""
-            cls._instance.connection_task: Optional[asyncio.Task] = None
+            cls._instance._streams: Dict[str, TikTokStream] = {}
+            cls._instance._primary: Optional[str] = None
+            cls._instance.client_factory = TikTokLiveClient
             cls._instance._websocket_manager = None
             cls._instance._db_service = None
+            cls._instance._pipeline = None
+            cls._instance._lease_task: Optional[asyncio.Task] = None
         return cls._instance
-    
-    def set_dependencies(self, websocket_manager, db_service):
-        """Set dependencies to avoid circular imports"""
+
+    def set_dependencies(self, websocket_manager, db_service, pipeline=None):
+        """Set dependencies to avoid circular imports.
+
+        When an ingestion pipeline is given, chat messages are handed to it
+        and broadcast/persistence run as separate stages.
+        """
         self._websocket_manager = websocket_manager
         self._db_service = db_service
-        
+        self._pipeline = pipeline
+
+        # Recent history is cached from broadcasts, which every worker receives via the backplane
+        if websocket_manager:
+            websocket_manager.add_listener("chat_message", chat_history_cache.add_event)
+
+        if pipeline:
+            pipeline.add_stage("broadcast", self._broadcast_chat_message, concurrency=settings.PIPELINE_BROADCAST_CONCURRENCY)
+            pipeline.add_stage("persistence", self._persist_chat_message, concurrency=settings.PIPELINE_PERSISTENCE_CONCURRENCY)
+
+    # Primary stream (single-stream API)
+
+    @property
+    def _primary_stream(self) -> Optional[TikTokStream]:
+        return self._streams.get(self._primary) if self._primary else None
+
+    @property
+    def client(self) -> Optional[TikTokLiveClient]:
+        return self._primary_stream.client if self._primary_stream else None
+
+    @property
+    def is_connected(self) -> bool:
+        if self._primary_stream:
+            return self._primary_stream.is_connected
+        return self._remote_primary() is not None
+
+    @property
+    def username(self) -> str:
+        if self._primary_stream:
+            return self._primary_stream.username
+        return self._remote_primary() or ""
+
+    def _remote_primary(self) -> Optional[str]:
+        """Username of the primary stream when another worker is following it"""
+        username = stream_leases.primary()
+        if username and stream_leases.owner(normalize_username(username)) is not None:
+            return username
+        return None
+
+    def _primary_key(self) -> Optional[str]:
+        """Primary stream key, whichever worker follows it"""
+        if self._primary:
+            return self._primary
+        username = stream_leases.primary()
+        return normalize_username(username) if username else None
+
+    @property
+    def connection_task(self) -> Optional[asyncio.Task]:
+        return self._primary_stream.connection_task if self._primary_stream else None
+
     async def connect_to_stream(self, username: str) -> bool:
-        """Connect to TikTok Live stream with proper cleanup"""
+        """Connect the primary stream, replacing whatever it was following"""
         async with self._lock:
-            try:
-                # Clean username (remove @ if present)
-                clean_username = username.replace("@", "").strip()
-                
-                logger.info(f"Using SING_API_KEY: {settings.SING_API_KEY[:20]}..." if settings.SING_API_KEY else "No SING_API_KEY found")
-                
-                # CRITICAL: Always force disconnect and cleanup first
-                if self.client or self.is_connected:
-                    logger.info("🧹 FORCE CLEANING: Clearing existing client and event handlers to prevent duplicates")
-                    await self._force_cleanup()
-                
-                # Initialize TikTok Live client with basic configuration for 6.5.2
-                logger.info(f"🔧 Creating NEW TikTok client for @{clean_username}")
-                self.client = TikTokLiveClient(unique_id=clean_username)
-                
-                # Set up event handlers (now on clean client)
-                self._setup_event_handlers()
-                
-                # Start connection in background
-                self.username = clean_username
-                self.connection_task = asyncio.create_task(self._start_client())
-                
-                logger.info(f"Attempting to connect to @{clean_username}'s live stream")
-                return True
-                
-            except Exception as e:
-                logger.error(f"Failed to connect to TikTok live: {e}")
-                import traceback
-                logger.error(f"Full traceback: {traceback.format_exc()}")
-                
-                if self._websocket_manager:
-                    await self._websocket_manager.broadcast_json({
-                        "type": "connection_status",
-                        "connected": False,
-                        "error": str(e),
-                        "timestamp": datetime.now().isoformat()
-                    })
-                return False
-    
-    async def _force_cleanup(self):
-        """Force cleanup of all existing connections and handlers"""
-        try:
-            # Set disconnected state immediately
-            self.is_connected = False
-            
-            # Cancel existing connection task if running
-            if self.connection_task and not self.connection_task.done():
-                logger.info("Cancelling existing connection task...")
-                self.connection_task.cancel()
-                try:
-                    await asyncio.wait_for(self.connection_task, timeout=2.0)
-                except (asyncio.CancelledError, asyncio.TimeoutError):
-                    logger.info("Connection task cancelled successfully")
-                except Exception as e:
-                    logger.warning(f"Error cancelling connection task: {e}")
-            
-            # Force stop the client with aggressive connection termination
-            if self.client:
-                logger.info("🔥 AGGRESSIVE DISCONNECT: Force stopping existing TikTok client...")
-                try:
-                    # Clear event handlers immediately
-                    if hasattr(self.client, '_event_handlers'):
-                        handler_count = len(self.client._event_handlers) if self.client._event_handlers else 0
-                        logger.info(f"Clearing {handler_count} existing event handlers")
-                        self.client._event_handlers.clear()
-                    
-                    # AGGRESSIVE FIX: Close WebSocket connection directly first
-                    if hasattr(self.client, '_websocket') and self.client._websocket:
-                        logger.info("🔌 Closing WebSocket connection directly...")
-                        try:
-                            await asyncio.wait_for(self.client._websocket.close(), timeout=1.0)
-                            logger.info("✅ WebSocket closed directly")
-                        except Exception as ws_error:
-                            logger.warning(f"Error closing WebSocket directly: {ws_error}")
-                    
-                    # Try to close any other connection attributes
-                    if hasattr(self.client, '_connection') and self.client._connection:
-                        logger.info("🔌 Closing connection attribute...")
-                        try:
-                            await self.client._connection.close()
-                        except Exception as conn_error:
-                            logger.warning(f"Error closing connection: {conn_error}")
-                    
-                    # Now try the standard stop method with timeout
-                    if hasattr(self.client, 'stop'):
-                        logger.info("⏱️ Calling client.stop() with timeout...")
-                        try:
-                            await asyncio.wait_for(self.client.stop(), timeout=2.0)
-                            logger.info("✅ Client.stop() completed")
-                        except asyncio.TimeoutError:
-                            logger.warning("⏰ Client.stop() timed out - continuing with force cleanup")
-                        except Exception as stop_error:
-                            logger.warning(f"Error in client.stop(): {stop_error}")
-                    
-                    # Final cleanup - close any remaining connections
-                    connection_attrs = ['_websocket', '_connection', 'websocket', 'connection']
-                    for attr in connection_attrs:
-                        if hasattr(self.client, attr):
-                            conn = getattr(self.client, attr)
-                            if conn and hasattr(conn, 'close'):
-                                try:
-                                    await conn.close()
-                                    logger.info(f"✅ Closed {attr}")
-                                except Exception as e:
-                                    logger.warning(f"Error closing {attr}: {e}")
-                    
-                    logger.info("🔥 AGGRESSIVE DISCONNECT COMPLETED")
-                    
-                except Exception as e:
-                    logger.warning(f"Error during aggressive client cleanup: {e}")
-                    logger.info("🔥 Continuing with state reset despite cleanup errors")
-            
-            # Reset all state
-            self.client = None
-            self.connection_task = None
-            self.username = ""
-            
-            # Force garbage collection
-            import gc
-            gc.collect()
-            
-            logger.info("✅ Force cleanup completed")
-            
-        except Exception as e:
-            logger.error(f"Error in force cleanup: {e}")
-    
-    def _setup_event_handlers(self):
-        """Set up all TikTok Live event handlers with unique identifier"""
-        # Generate unique handler ID for debugging
-        handler_id = datetime.now().strftime("%H:%M:%S.%f")
-        logger.info(f"🔧 Setting up SINGLE event handler set with ID: {handler_id}")
-        
-        @self.client.on(ConnectEvent)
-        async def on_connect(event):
-            # Check if we should still process connection events
-            if not self.client:
-                logger.info(f"🚫 [Handler {handler_id}] Ignoring connect event - client is None")
-                return
-                
-            self.is_connected = True
-            logger.info(f"✅ [SINGLE Handler {handler_id}] Successfully connected to live stream!")
-            
-            if self._websocket_manager:
-                await self._websocket_manager.broadcast_json({
-                    "type": "connection_status",
-                    "connected": True,
-                    "username": getattr(event, 'unique_id', self.username),
-                    "timestamp": datetime.now().isoformat()
-                })
-        
-        @self.client.on(CommentEvent)
-        async def on_comment(event):
-            try:
-                # CRITICAL FIX: Check if we should still process events
-                if not self.is_connected or not self.client:
-                    logger.info(f"🚫 [Handler {handler_id}] Ignoring comment event - service disconnected")
-                    return
-                
-                logger.info(f"🔍 [SINGLE Handler {handler_id}] Raw comment event received: {type(event)}")
-                
-                # Extract user info safely
-                user_name = self._extract_user_name(event)
-                message = self._extract_message_content(event)
-                
-                logger.info(f"💬 [SINGLE Handler {handler_id}] Comentario procesado - {user_name}: {message}")
-                await self._handle_chat_message(user_name, message)
-                
-            except Exception as e:
-                logger.error(f"💥 [SINGLE Handler {handler_id}] Error processing comment event: {e}")
-        
-        @self.client.on(DisconnectEvent)
-        async def on_disconnect(event):
-            self.is_connected = False
-            logger.info(f"❌ [SINGLE Handler {handler_id}] Disconnected from TikTok live stream")
-            
-            if self._websocket_manager:
-                await self._websocket_manager.broadcast_json({
-                    "type": "connection_status",
-                    "connected": False,
-                    "username": "",
-                    "timestamp": datetime.now().isoformat()
-                })
-        
-        logger.info(f"✅ SINGLE event handler set complete with ID: {handler_id}")
-    
-    def _extract_user_name(self, event) -> str:
-        """Extract user name from TikTok event safely"""
-        user_name = "Usuario Anónimo"
-        
-        try:
-            if hasattr(event, 'user') and event.user:
-                user_name = getattr(event.user, 'nickname', 
-                          getattr(event.user, 'display_name', 
-                          getattr(event.user, 'unique_id', 'Usuario Anónimo')))
-        except Exception as user_error:
-            logger.warning(f"⚠️ Error accessing event.user: {user_error}")
-            user_name = "Usuario Anónimo"
-        
-        return user_name
-    
-    def _extract_message_content(self, event) -> str:
-        """Extract message content from TikTok event safely"""
-        message = "Mensaje sin contenido"
-        
-        try:
-            if hasattr(event, 'comment'):
-                message = str(event.comment) if event.comment else "Mensaje vacío"
-            elif hasattr(event, 'content'):
-                message = str(event.content) if event.content else "Mensaje vacío"
-            elif hasattr(event, 'text'):
-                message = str(event.text) if event.text else "Mensaje vacío"
-        except Exception as msg_error:
-            logger.warning(f"⚠️ Error accessing message: {msg_error}")
-            message = "Error al leer mensaje"
-        
-        return message
-    
-    async def _start_client(self):
-        """Start the TikTok Live client"""
-        try:
-            if self.client:
-                logger.info(f"🚀 Starting TikTok Live client for @{self.username}")
-                await self.client.start()
-                logger.info(f"🎯 TikTok Live client started successfully")
-        except Exception as e:
-            logger.error(f"💥 Error starting TikTok client: {e}")
-            self.is_connected = False
-            
-            # Handle specific TikTok errors
-            error_message = self._format_error_message(e)
-            
-            if self._websocket_manager:
-                await self._websocket_manager.broadcast_json({
-                    "type": "connection_status",
-                    "connected": False,
-                    "error": error_message,
-                    "timestamp": datetime.now().isoformat()
-                })
-    
-    def _format_error_message(self, error) -> str:
-        """Format error message for user display"""
-        error_message = str(error)
-        if "UserOfflineError" in str(type(error)) or "No Message Provided" in error_message:
-            error_message = f"@{self.username} is not currently live. Please try again when they start streaming."
-        elif "Failed to parse room ID" in error_message:
-            error_message = f"Could not find live stream for @{self.username}. Please check the username and try again."
-        else:
-            error_message = f"Failed to connect to @{self.username}'s live stream: {error_message}"
-        
-        return error_message
-    
-    async def _handle_chat_message(self, user: str, message: str):
-        """Handle incoming chat messages from TikTok Live"""
-        chat_message = ChatMessage(user=user, message=message, username_stream=self.username)
-        
-        # Broadcast to all connected clients
-        if self._websocket_manager:
-            await self._websocket_manager.broadcast_json(chat_message.to_websocket_dict())
-        
-        # Store in database
-        if self._db_service:
-            await self._db_service.save_chat_message(chat_message)
-        
-        logger.info(f"Chat message from {user}: {message}")
-    
+            # Clean username (remove @ if present)
+            clean_username = username.replace("@", "").strip()
+
+            logger.info(f"Using SING_API_KEY: {settings.SING_API_KEY[:20]}..." if settings.SING_API_KEY else "No SING_API_KEY found")
+
+            # CRITICAL: Always force disconnect and cleanup the previous primary first
+            previous_primary = self._primary_key()
+            if previous_primary:
+                logger.info("🧹 FORCE CLEANING: Clearing existing primary stream to prevent duplicates")
+                await self._remove_stream(previous_primary)
+                self._primary = None
+                stream_leases.set_primary(None)
+            await self._remove_stream(normalize_username(clean_username))
+
+            success = await self._add_stream(clean_username)
+            if success:
+                self._primary = normalize_username(clean_username)
+                stream_leases.set_primary(clean_username)
+            return success
+
     async def disconnect_from_stream(self) -> bool:
         """Disconnect from TikTok Live stream with comprehensive cleanup"""
         async with self._lock:
             try:
                 logger.info("Starting comprehensive disconnect process...")
-                await self._force_cleanup()
-                
+                previous_username = self.username
+                previous_primary = self._primary_key()
+                if previous_primary:
+                    await self._remove_stream(previous_primary)
+                self._primary = None
+                stream_leases.set_primary(None)
+
                 # Broadcast disconnection status
                 if self._websocket_manager:
                     await self._websocket_manager.broadcast_json({
@@ -315,37 +147,212 @@ class TikTokService:
                         "username": "",
                         "message": "Desconectado completamente",
                         "timestamp": datetime.now().isoformat()
-                    })
-                
+                    }, stream=previous_username)
+
                 logger.info("Successfully and completely disconnected from TikTok live stream")
                 return True
-                
+
             except Exception as e:
                 logger.error(f"Failed to disconnect: {e}")
                 return True  # Return True since we attempt to reset state
-    
+
     async def force_disconnect(self) -> bool:
         """Force disconnect with aggressive cleanup"""
         async with self._lock:
             try:
                 logger.info("Force disconnect requested - performing aggressive cleanup")
-                await self._force_cleanup()
-                
+                previous_username = self.username
+                previous_primary = self._primary_key()
+                if previous_primary:
+                    await self._remove_stream(previous_primary)
+                self._primary = None
+                stream_leases.set_primary(None)
+
                 if self._websocket_manager:
                     await self._websocket_manager.broadcast_json({
-                        "type": "connection_status", 
+                        "type": "connection_status",
                         "connected": False,
                         "username": "",
                         "message": "Desconexión forzada completada",
                         "timestamp": datetime.now().isoformat()
-                    })
-                
+                    }, stream=previous_username)
+
                 logger.info("Force disconnect completed successfully")
                 return True
-                
+
             except Exception as e:
                 logger.error(f"Error in force disconnect: {e}")
                 return True
 
+    # Multi-stream API
+
+    def has_capacity_for(self, username: str) -> bool:
+        """Whether another stream can be followed without exceeding TIKTOK_MAX_STREAMS"""
+        return normalize_username(username) in self._streams or len(self._streams) < settings.TIKTOK_MAX_STREAMS
+
+    async def connect_stream(self, username: str) -> bool:
+        """Start following a stream alongside any others already followed"""
+        clean_username = username.replace("@", "").strip()
+        stream = self._streams.get(normalize_username(clean_username))
+        if stream:
+            # Reconnect in place; the stream's own lock serialises its lifecycle
+            return await stream.connect()
+        return await self._add_stream(clean_username)
+
+    async def disconnect_stream(self, username: str) -> bool:
+        """Stop following a single stream"""
+        key = normalize_username(username)
+        if key not in self._streams and key not in stream_leases.wanted():
+            return False
+
+        await self._remove_stream(key)
+        if key == self._primary_key():
+            self._primary = None
+            stream_leases.set_primary(None)
+
+        if self._websocket_manager:
+            await self._websocket_manager.broadcast_json({
+                "type": "connection_status",
+                "connected": False,
+                "username": "",
+                "message": "Desconectado completamente",
+                "timestamp": datetime.now().isoformat()
+            }, stream=key)
+        return True
+
+    def get_stream_status(self, username: str) -> Optional[dict]:
+        """Connection details for one followed stream"""
+        key = normalize_username(username)
+        stream = self._streams.get(key)
+        if stream:
+            return self._stream_status(stream)
+        remote_username = stream_leases.wanted().get(key)
+        return self._remote_stream_status(key, remote_username) if remote_username else None
+
+    def list_streams(self) -> List[dict]:
+        """Connection details for every followed stream"""
+        statuses = [self._stream_status(stream) for stream in self._streams.values()]
+        for key, username in stream_leases.wanted().items():
+            if key not in self._streams:
+                statuses.append(self._remote_stream_status(key, username))
+        return statuses
+
+    def _stream_status(self, stream: TikTokStream) -> dict:
+        if not stream_leases.enabled:
+            return stream.status()
+        return {**stream.status(), "owner_pid": os.getpid()}
+
+    def _remote_stream_status(self, key: str, username: str) -> dict:
+        """A wanted stream followed by another worker (owner_pid None while awaiting takeover)"""
+        return {"username": username, "connected": None, "owner_pid": stream_leases.owner(key)}
+
+    async def _add_stream(self, clean_username: str) -> bool:
+        key = normalize_username(clean_username)
+        stream_leases.want(key, clean_username)
+        if not stream_leases.acquire(key):
+            # Exactly one worker holds each stream's client; the owner keeps serving it
+            logger.info(f"@{clean_username} is followed by worker {stream_leases.owner(key)}, not connecting here")
+            return True
+
+        stream = TikTokStream(self, clean_username)
+        self._streams[key] = stream
+        success = await stream.connect()
+        if not success:
+            self._streams.pop(key, None)
+            stream_leases.unwant(key)
+            stream_leases.release(key)
+        return success
+
+    async def _remove_stream(self, key: str):
+        """Stop following a stream, on whichever worker owns it"""
+        stream_leases.unwant(key)
+        await self._stop_local_stream(key)
+
+    async def _stop_local_stream(self, key: str):
+        """Tear down this worker's client for a stream and give up its lease"""
+        stream = self._streams.pop(key, None)
+        if stream:
+            await stream.disconnect()
+        tts_service.forget_stream(key)
+        stream_leases.release(key)
+
+    # Stream leases (multi-worker ownership)
+
+    def start_leases(self):
+        """Start reconciling wanted streams with the leases this worker holds"""
+        if stream_leases.enabled and not self._lease_task:
+            self._lease_task = asyncio.create_task(self._lease_loop())
+
+    async def stop_leases(self):
+        """Stop reconciling and hand this worker's streams over to the others"""
+        if self._lease_task:
+            self._lease_task.cancel()
+            await asyncio.gather(self._lease_task, return_exceptions=True)
+            self._lease_task = None
+        if stream_leases.enabled:
+            async with self._lock:
+                for key in list(self._streams):
+                    await self._stop_local_stream(key)
+                self._primary = None
+
+    async def _lease_loop(self):
+        while True:
+            try:
+                await self.reconcile_leases()
+            except Exception as e:
+                logger.error(f"Stream lease reconcile failed: {e}")
+            await asyncio.sleep(settings.TIKTOK_LEASE_INTERVAL)
+
+    async def reconcile_leases(self):
+        """Drop local streams nobody wants any more and take over wanted streams without an owner"""
+        wanted = stream_leases.wanted()
+        async with self._lock:
+            for key in [key for key in self._streams if key not in wanted]:
+                logger.info(f"@{key} was disconnected through another worker, stopping its client")
+                await self._stop_local_stream(key)
+                if key == self._primary:
+                    self._primary = None
+
+            primary = stream_leases.primary()
+            for key, username in wanted.items():
+                if key in self._streams or len(self._streams) >= settings.TIKTOK_MAX_STREAMS:
+                    continue
+                if not stream_leases.acquire(key):
+                    continue
+                logger.info(f"👑 Took over the lease for @{username}, connecting")
+                if await self._add_stream(username) and primary and normalize_username(primary) == key:
+                    self._primary = key
+
+    async def _handle_chat_message(self, user: str, message: str, username_stream: Optional[str] = None, **user_info):
+        """Handle incoming chat messages from TikTok Live; user_info is the author's id and standing"""
+        if username_stream is None:
+            username_stream = self.username
+        chat_message = ChatMessage(user=user, message=message, username_stream=username_stream, **user_info)
+
+        # Hand off to the pipeline so slow sinks never block TikTok event handlers. A full
+        # pipeline drops the message (counted in its stats) rather than processing it inline here.
+        if self._pipeline and self._pipeline.running:
+            if self._pipeline.submit(chat_message):
+                logger.debug(f"Chat message from {user} queued for processing")
+            return
+
+        # No pipeline running (not configured or not started yet): process inline,
+        # through the same sinks as the pipeline's stages
+        await self._broadcast_chat_message(chat_message)
+        await self._persist_chat_message(chat_message)
+        await tts_service.handle_chat_message(chat_message)
+
+        logger.info(f"Chat message from {user}: {message}")
+
+    async def _broadcast_chat_message(self, chat_message: ChatMessage):
+        """Broadcast to clients following this stream"""
+        if self._websocket_manager:
+            await self._websocket_manager.broadcast_json(chat_message.to_websocket_dict(), stream=chat_message.username_stream)
+
+    async def _persist_chat_message(self, chat_message: ChatMessage):
+        """Store in database"""
+        if self._db_service:
+            await self._db_service.save_chat_message(chat_message)
+
 # Create singleton instance
-tiktok_service = TikTokService()
\ No newline at end of file
+tiktok_service = TikTokService()
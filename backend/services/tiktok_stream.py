@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import Optional
+
+from TikTokLive import TikTokLiveClient
+from TikTokLive.events import ConnectEvent, CommentEvent, DisconnectEvent
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Connection failure classes, deciding how (and whether) the supervisor retries
+FAILURE_OFFLINE = "offline"      # the user is not live: poll slowly until they start
+FAILURE_NOT_FOUND = "not_found"  # no such user or room: retrying cannot help
+FAILURE_TRANSIENT = "transient"  # network errors and dropped connections: retry quickly
+
+def reconnect_delay(attempt: int, failure: str) -> float:
+    """Exponential backoff with jitter for the given (1-based) retry attempt.
+
+    The ceiling doubles per attempt up to its cap and the delay is drawn
+    from its upper half, so many streams dropped together spread their
+    reconnects instead of hitting TikTok at the same instant.
+    """
+    if failure == FAILURE_OFFLINE:
+        base, cap = settings.TIKTOK_RECONNECT_OFFLINE_DELAY, settings.TIKTOK_RECONNECT_OFFLINE_MAX_DELAY
+    else:
+        base, cap = settings.TIKTOK_RECONNECT_BASE_DELAY, settings.TIKTOK_RECONNECT_MAX_DELAY
+    ceiling = min(cap, base * 2 ** (attempt - 1))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+class TikTokStream:
+    """Connection lifecycle for a single followed TikTok Live stream"""
+    
+    def __init__(self, service, username: str):
+        self._service = service
+        self.username = username
+        self.client: Optional[TikTokLiveClient] = None
+        self.is_connected = False
+        self.connection_task: Optional[asyncio.Task] = None
+        self.connected_at: Optional[datetime] = None
+        self.reconnect_attempts = 0
+        self.last_error: Optional[str] = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def _websocket_manager(self):
+        return self._service._websocket_manager
+    
+    async def connect(self) -> bool:
+        """Create a fresh client for this stream and start it in the background"""
+        async with self._lock:
+            try:
+                if self.client or self.is_connected:
+                    logger.info(f"🧹 FORCE CLEANING: Clearing existing client for @{self.username} to prevent duplicates")
+                    await self._force_cleanup()
+                
+                logger.info(f"🔧 Creating NEW TikTok client for @{self.username}")
+                self.client = self._service.client_factory(unique_id=self.username)
+                
+                # Set up event handlers (now on clean client)
+                self._setup_event_handlers()
+                
+                # Start connection in background, supervised so drops reconnect on their own
+                self.reconnect_attempts = 0
+                self.last_error = None
+                self.connection_task = asyncio.create_task(self._supervise_client())
+                
+                logger.info(f"Attempting to connect to @{self.username}'s live stream")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Failed to connect to TikTok live @{self.username}: {e}")
+                import traceback
+                logger.error(f"Full traceback: {traceback.format_exc()}")
+                
+                if self._websocket_manager:
+                    await self._websocket_manager.broadcast_json({
+                        "type": "connection_status",
+                        "connected": False,
+                        "error": str(e),
+                        "timestamp": datetime.now().isoformat()
+                    }, stream=self.username)
+                return False
+    
+    async def disconnect(self):
+        """Tear down this stream's client and connection task"""
+        async with self._lock:
+            await self._force_cleanup()
+    
+    def status(self) -> dict:
+        """Connection details for this stream"""
+        return {
+            "username": self.username,
+            "connected": self.is_connected,
+            "has_client": self.client is not None,
+            "has_connection_task": self.connection_task is not None,
+            "task_done": self.connection_task.done() if self.connection_task else None,
+            "connected_at": self.connected_at.isoformat() if self.connected_at else None,
+            "reconnect_attempts": self.reconnect_attempts,
+            "last_error": self.last_error
+        }
+    
+    async def _force_cleanup(self):
+        """Force cleanup of all existing connections and handlers"""
+        try:
+            # Set disconnected state immediately
+            self.is_connected = False
+            
+            # Cancel existing connection task if running
+            if self.connection_task and not self.connection_task.done():
+                logger.info("Cancelling existing connection task...")
+                self.connection_task.cancel()
+                try:
+                    await asyncio.wait_for(self.connection_task, timeout=2.0)
+                except (asyncio.CancelledError, asyncio.TimeoutError):
+                    logger.info("Connection task cancelled successfully")
+                except Exception as e:
+                    logger.warning(f"Error cancelling connection task: {e}")
+            
+            # Force stop the client with aggressive connection termination
+            if self.client:
+                logger.info("🔥 AGGRESSIVE DISCONNECT: Force stopping existing TikTok client...")
+                try:
+                    # Clear event handlers immediately
+                    if hasattr(self.client, '_event_handlers'):
+                        handler_count = len(self.client._event_handlers) if self.client._event_handlers else 0
+                        logger.info(f"Clearing {handler_count} existing event handlers")
+                        self.client._event_handlers.clear()
+                    
+                    # AGGRESSIVE FIX: Close WebSocket connection directly first
+                    if hasattr(self.client, '_websocket') and self.client._websocket:
+                        logger.info("🔌 Closing WebSocket connection directly...")
+                        try:
+                            await asyncio.wait_for(self.client._websocket.close(), timeout=1.0)
+                            logger.info("✅ WebSocket closed directly")
+                        except Exception as ws_error:
+                            logger.warning(f"Error closing WebSocket directly: {ws_error}")
+                    
+                    # Try to close any other connection attributes
+                    if hasattr(self.client, '_connection') and self.client._connection:
+                        logger.info("🔌 Closing connection attribute...")
+                        try:
+                            await self.client._connection.close()
+                        except Exception as conn_error:
+                            logger.warning(f"Error closing connection: {conn_error}")
+                    
+                    # Now try the standard stop method with timeout
+                    if hasattr(self.client, 'stop'):
+                        logger.info("⏱️ Calling client.stop() with timeout...")
+                        try:
+                            await asyncio.wait_for(self.client.stop(), timeout=2.0)
+                            logger.info("✅ Client.stop() completed")
+                        except asyncio.TimeoutError:
+                            logger.warning("⏰ Client.stop() timed out - continuing with force cleanup")
+                        except Exception as stop_error:
+                            logger.warning(f"Error in client.stop(): {stop_error}")
+                    
+                    # Final cleanup - close any remaining connections
+                    connection_attrs = ['_websocket', '_connection', 'websocket', 'connection']
+                    for attr in connection_attrs:
+                        if hasattr(self.client, attr):
+                            conn = getattr(self.client, attr)
+                            if conn and hasattr(conn, 'close'):
+                                try:
+                                    await conn.close()
+                                    logger.info(f"✅ Closed {attr}")
+                                except Exception as e:
+                                    logger.warning(f"Error closing {attr}: {e}")
+                    
+                    logger.info("🔥 AGGRESSIVE DISCONNECT COMPLETED")
+                    
+                except Exception as e:
+                    logger.warning(f"Error during aggressive client cleanup: {e}")
+                    logger.info("🔥 Continuing with state reset despite cleanup errors")
+            
+            # Reset all state
+            self.client = None
+            self.connection_task = None
+            
+            # Force garbage collection
+            import gc
+            gc.collect()
+            
+            logger.info("✅ Force cleanup completed")
+            
+        except Exception as e:
+            logger.error(f"Error in force cleanup: {e}")
+    
+    def _setup_event_handlers(self):
+        """Set up all TikTok Live event handlers with unique identifier"""
+        # Generate unique handler ID for debugging
+        handler_id = datetime.now().strftime("%H:%M:%S.%f")
+        logger.info(f"🔧 Setting up SINGLE event handler set with ID: {handler_id}")
+        
+        @self.client.on(ConnectEvent)
+        async def on_connect(event):
+            # Check if we should still process connection events
+            if not self.client:
+                logger.info(f"🚫 [Handler {handler_id}] Ignoring connect event - client is None")
+                return
+                
+            self.is_connected = True
+            # A connection that came up earns the next drop a fresh retry budget
+            self.reconnect_attempts = 0
+            self.last_error = None
+            logger.info(f"✅ [SINGLE Handler {handler_id}] Successfully connected to live stream!")
+            
+            if self._websocket_manager:
+                await self._websocket_manager.broadcast_json({
+                    "type": "connection_status",
+                    "connected": True,
+                    "username": getattr(event, 'unique_id', self.username),
+                    "timestamp": datetime.now().isoformat()
+                }, stream=self.username)
+        
+        @self.client.on(CommentEvent)
+        async def on_comment(event):
+            try:
+                # CRITICAL FIX: Check if we should still process events
+                if not self.is_connected or not self.client:
+                    logger.info(f"🚫 [Handler {handler_id}] Ignoring comment event - service disconnected")
+                    return
+                
+                logger.info(f"🔍 [SINGLE Handler {handler_id}] Raw comment event received: {type(event)}")
+                
+                # Extract user info safely
+                user_name = self._extract_user_name(event)
+                message = self._extract_message_content(event)
+                user_info = self._extract_user_info(event)
+                
+                logger.info(f"💬 [SINGLE Handler {handler_id}] Comentario procesado - {user_name}: {message}")
+                await self._service._handle_chat_message(user_name, message, self.username, **user_info)
+                
+            except Exception as e:
+                logger.error(f"💥 [SINGLE Handler {handler_id}] Error processing comment event: {e}")
+        
+        @self.client.on(DisconnectEvent)
+        async def on_disconnect(event):
+            self.is_connected = False
+            logger.info(f"❌ [SINGLE Handler {handler_id}] Disconnected from TikTok live stream")
+            # Connection state is reported to clients by the supervisor only, which
+            # sees the same disconnect and decides whether it is final or a retry
+        
+        logger.info(f"✅ SINGLE event handler set complete with ID: {handler_id}")
+    
+    def _extract_user_name(self, event) -> str:
+        """Extract user name from TikTok event safely"""
+        user_name = "Usuario Anónimo"
+        
+        try:
+            if hasattr(event, 'user') and event.user:
+                user_name = getattr(event.user, 'nickname', 
+                          getattr(event.user, 'display_name', 
+                          getattr(event.user, 'unique_id', 'Usuario Anónimo')))
+        except Exception as user_error:
+            logger.warning(f"⚠️ Error accessing event.user: {user_error}")
+            user_name = "Usuario Anónimo"
+        
+        return user_name
+    
+    def _extract_user_info(self, event) -> dict:
+        """Stable id and standing of a comment's author (used to rank comments for TTS)"""
+        info = {}
+        try:
+            user = getattr(event, 'user', None)
+            if user and getattr(user, 'unique_id', None):
+                info["user_id"] = user.unique_id
+            identity = getattr(event, 'user_identity', None)
+            if identity:
+                info["moderator"] = bool(identity.is_moderator_of_anchor)
+                info["gifter"] = bool(identity.is_gift_giver_of_anchor)
+                info["subscriber"] = bool(identity.is_subscriber_of_anchor)
+        except Exception as user_error:
+            logger.warning(f"⚠️ Error accessing user identity: {user_error}")
+        return info
+    
+    def _extract_message_content(self, event) -> str:
+        """Extract message content from TikTok event safely"""
+        message = "Mensaje sin contenido"
+        
+        try:
+            if hasattr(event, 'comment'):
+                message = str(event.comment) if event.comment else "Mensaje vacío"
+            elif hasattr(event, 'content'):
+                message = str(event.content) if event.content else "Mensaje vacío"
+            elif hasattr(event, 'text'):
+                message = str(event.text) if event.text else "Mensaje vacío"
+        except Exception as msg_error:
+            logger.warning(f"⚠️ Error accessing message: {msg_error}")
+            message = "Error al leer mensaje"
+        
+        return message
+    
+    async def _start_client(self) -> Optional[asyncio.Task]:
+        """Start the TikTok Live client, returning the task that runs its connection"""
+        if not self.client:
+            return None
+        logger.info(f"🚀 Starting TikTok Live client for @{self.username}")
+        client_task = await self.client.start()
+        self.connected_at = datetime.now()
+        logger.info(f"🎯 TikTok Live client started successfully")
+        return client_task
+    
+    async def _supervise_client(self):
+        """Keep the stream connected: start the client, wait for it to end, retry with backoff.
+        
+        Runs as connection_task, so disconnect() cancelling it also cancels
+        the client's own connection task awaited here.
+        """
+        while self.client:
+            error = None
+            try:
+                client_task = await self._start_client()
+                if client_task is None:
+                    return
+                # Returns (or raises) when TikTok drops the connection
+                await client_task
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            
+            self.is_connected = False
+            
+            failure = self._classify_error(error)
+            self.last_error = self._format_error_message(error)
+            logger.error(f"💥 TikTok connection for @{self.username} ended ({failure}): {self.last_error}")
+            
+            self.reconnect_attempts += 1
+            retry = failure != FAILURE_NOT_FOUND and self.reconnect_attempts <= settings.TIKTOK_RECONNECT_MAX_RETRIES
+            delay = reconnect_delay(self.reconnect_attempts, failure) if retry else None
+            
+            if self._websocket_manager:
+                await self._websocket_manager.broadcast_json({
+                    "type": "connection_status",
+                    "connected": False,
+                    "error": self.last_error,
+                    "reconnecting": retry,
+                    "retry_in": round(delay, 1) if retry else None,
+                    "attempt": self.reconnect_attempts if retry else None,
+                    "timestamp": datetime.now().isoformat()
+                }, stream=self.username)
+            
+            if not retry:
+                logger.warning(f"Giving up on @{self.username} after {self.reconnect_attempts} attempt(s)")
+                return
+            
+            logger.info(f"🔁 Reconnecting to @{self.username} in {delay:.1f}s (attempt {self.reconnect_attempts}/{settings.TIKTOK_RECONNECT_MAX_RETRIES})")
+            await asyncio.sleep(delay)
+            await self._reset_client()
+    
+    async def _reset_client(self):
+        """Release the previous connection's state so the same client can start again"""
+        if not self.client:
+            return
+        try:
+            await asyncio.wait_for(self.client.disconnect(), timeout=2.0)
+        except Exception as e:
+            logger.warning(f"Error resetting TikTok client for @{self.username}: {e}")
+    
+    def _classify_error(self, error) -> str:
+        """Failure class of a connection error (None for a connection TikTok closed)"""
+        if error is None:
+            return FAILURE_TRANSIENT
+        error_message = str(error)
+        if "UserOfflineError" in str(type(error)) or "No Message Provided" in error_message:
+            return FAILURE_OFFLINE
+        if "UserNotFoundError" in str(type(error)) or "Failed to parse room ID" in error_message:
+            return FAILURE_NOT_FOUND
+        return FAILURE_TRANSIENT
+    
+    def _format_error_message(self, error) -> str:
+        """Format error message for user display"""
+        failure = self._classify_error(error)
+        if error is None:
+            error_message = f"Lost connection to @{self.username}'s live stream."
+        elif failure == FAILURE_OFFLINE:
+            error_message = f"@{self.username} is not currently live. Please try again when they start streaming."
+        elif failure == FAILURE_NOT_FOUND:
+            error_message = f"Could not find live stream for @{self.username}. Please check the username and try again."
+        else:
+            error_message = f"Failed to connect to @{self.username}'s live stream: {error}"
+        
+        return error_message
@@ -0,0 +1,224 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import array
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import shutil
+import subprocess
+import wave
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Engine names (TTS_ENGINE)
+ENGINE_AUTO = "auto"
+ENGINE_ESPEAK = "espeak-ng"
+ENGINE_PIPER = "piper"
+ENGINE_FAKE = "fake"
+ENGINE_NONE = "none"
+
+class TTSError(Exception):
+    """Synthesis failed (engine missing, crashed or timed out)"""
+
+class TTSOverloaded(TTSError):
+    """The synthesis queue is full; the message is not spoken"""
+
+class TTSSuperseded(TTSError):
+    """A newer message for the same stream replaced this one while it was queued"""
+
+def wav_duration(audio: bytes) -> float:
+    """Length in seconds of a WAV file"""
+    with wave.open(io.BytesIO(audio)) as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+def concat_wav(clips: List[bytes]) -> bytes:
+    """Join WAV clips end to end; they must share channels, sample width and rate"""
+    buffer = io.BytesIO()
+    params = None
+    with wave.open(buffer, "wb") as output:
+        for clip in clips:
+            with wave.open(io.BytesIO(clip)) as wav:
+                clip_params = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+                if params is None:
+                    params = clip_params
+                    output.setnchannels(params[0])
+                    output.setsampwidth(params[1])
+                    output.setframerate(params[2])
+                elif clip_params != params:
+                    raise ValueError(f"cannot join WAV clips with different formats: {params} and {clip_params}")
+                output.writeframes(wav.readframes(wav.getnframes()))
+    return buffer.getvalue()
+
+# Engines are plain picklable objects: render() is the blocking synthesis that
+# SynthesisPool runs in worker processes, synthesize() the in-loop equivalent.
+
+class FakeTTSEngine:
+    """Deterministic engine for tests and development machines without a voice.
+
+    Renders a tone whose pitch comes from a hash of the text and whose
+    length grows with it, so equal text always yields byte-identical audio.
+    Rendering is pure-Python CPU work, like a real in-process synthesizer.
+    """
+
+    name = ENGINE_FAKE
+    mime_type = "audio/wav"
+    sample_rate = 16000
+
+    @property
+    def voice(self) -> str:
+        return f"{self.name}:{self.sample_rate}"
+
+    async def synthesize(self, text: str) -> bytes:
+        return self.render(text)
+
+    def render(self, text: str) -> bytes:
+        digest = hashlib.sha256(text.encode()).digest()
+        frequency = 220 + digest[0] * 2
+        duration = min(0.2 + 0.05 * len(text), 10.0)
+        samples = array.array("h", (
+            int(8000 * math.sin(2 * math.pi * frequency * i / self.sample_rate))
+            for i in range(int(duration * self.sample_rate))
+        ))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(samples.tobytes())
+        return buffer.getvalue()
+
+class SubprocessTTSEngine(ABC):
+    """Engine backed by a local command that writes a WAV file to stdout"""
+
+    name = ""
+    mime_type = "audio/wav"
+
+    def __init__(self, binary: str, timeout: float = None):
+        self.binary = binary
+        self.timeout = settings.TTS_SYNTH_TIMEOUT if timeout is None else timeout
+
+    @property
+    @abstractmethod
+    def voice(self) -> str:
+        """Identifies the voice in audio cache keys"""
+
+    def available(self) -> bool:
+        return shutil.which(self.binary) is not None
+
+    @abstractmethod
+    def command(self, text: str) -> List[str]:
+        """Command line that synthesizes text"""
+
+    def stdin(self, text: str) -> Optional[bytes]:
+        return None
+
+    def render(self, text: str) -> bytes:
+        """Blocking synthesis, for worker processes"""
+        try:
+            result = subprocess.run(self.command(text), input=self.stdin(text), capture_output=True, timeout=self.timeout)
+        except OSError as e:
+            raise TTSError(f"{self.name} could not be started: {e}") from e
+        except subprocess.TimeoutExpired:
+            raise TTSError(f"{self.name} timed out after {self.timeout}s")
+        if result.returncode != 0 or not result.stdout:
+            raise TTSError(f"{self.name} exited with {result.returncode}: {result.stderr.decode(errors='replace').strip()[:200]}")
+        return result.stdout
+
+    async def synthesize(self, text: str) -> bytes:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(text),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            raise TTSError(f"{self.name} could not be started: {e}") from e
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(self.stdin(text)), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise TTSError(f"{self.name} timed out after {self.timeout}s")
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+        if process.returncode != 0 or not stdout:
+            raise TTSError(f"{self.name} exited with {process.returncode}: {stderr.decode(errors='replace').strip()[:200]}")
+        return stdout
+
+class EspeakEngine(SubprocessTTSEngine):
+    """espeak-ng: small, fast, robotic; voices are language codes (es, es-419, ...)"""
+
+    name = ENGINE_ESPEAK
+
+    def __init__(self, binary: str = None, voice: str = None, rate: int = None, timeout: float = None):
+        super().__init__(binary or settings.TTS_ESPEAK_BINARY, timeout)
+        self.voice_name = voice or settings.TTS_VOICE
+        self.rate = rate or settings.TTS_RATE
+
+    @property
+    def voice(self) -> str:
+        return f"{self.name}:{self.voice_name}:{self.rate}"
+
+    def command(self, text: str) -> List[str]:
+        # "--" keeps comments starting with "-" from being read as options
+        return [self.binary, "--stdout", "-v", self.voice_name, "-s", str(self.rate), "--", text]
+
+class PiperEngine(SubprocessTTSEngine):
+    """Piper neural voices; TTS_PIPER_MODEL points at the voice's .onnx file"""
+
+    name = ENGINE_PIPER
+
+    def __init__(self, binary: str = None, model: str = None, timeout: float = None):
+        super().__init__(binary or settings.TTS_PIPER_BINARY, timeout)
+        self.model = model or settings.TTS_PIPER_MODEL
+
+    @property
+    def voice(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def available(self) -> bool:
+        return bool(self.model) and super().available()
+
+    def command(self, text: str) -> List[str]:
+        return [self.binary, "--model", self.model, "--output_file", "-"]
+
+    def stdin(self, text: str) -> bytes:
+        # One utterance per line: newlines in a comment would split it into several files
+        return " ".join(text.split()).encode() + b"\n"
+
+def create_tts_engine(name: str = None):
+    """Engine configured by TTS_ENGINE, or None when server-side speech is off.
+
+    "auto" prefers Piper when a model is configured, then espeak-ng, and
+    leaves speech to the browser when neither is installed.
+    """
+    name = (name or settings.TTS_ENGINE).lower()
+    if name == ENGINE_NONE:
+        return None
+    if name == ENGINE_FAKE:
+        return FakeTTSEngine()
+
+    candidates = {ENGINE_PIPER: PiperEngine, ENGINE_ESPEAK: EspeakEngine}
+    if name == ENGINE_AUTO:
+        for engine in (PiperEngine(), EspeakEngine()):
+            if engine.available():
+                return engine
+        logger.info("No local TTS engine found, speech stays in the browser")
+        return None
+    if name not in candidates:
+        logger.warning(f"Unknown TTS_ENGINE '{name}', speech stays in the browser")
+        return None
+
+    engine = candidates[name]()
+    if not engine.available():
+        logger.warning(f"TTS engine '{name}' is not installed or configured, speech stays in the browser")
+        return None
+    return engine
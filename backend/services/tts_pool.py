@@ -0,0 +1,192 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from config.settings import settings
+from services.tts_engine import TTSError, TTSOverloaded, TTSSuperseded
+
+logger = logging.getLogger(__name__)
+
+def _lower_priority(niceness: int):
+    """Worker process initializer: let the event loop win the CPU when cores are scarce"""
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+class SynthesisJob:
+    __slots__ = ("text", "key", "future", "enqueued_at")
+
+    def __init__(self, text: str, key: Optional[str], future: asyncio.Future):
+        self.text = text
+        self.key = key
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+class SynthesisPool:
+    """Runs an engine's blocking render() in worker processes.
+
+    Jobs wait in a bounded queue owned by the event loop and are handed to
+    the ProcessPoolExecutor only when a process is free, so a queued job can
+    always be withdrawn: when a job for the same key (the stream) arrives
+    while an older one is still queued, the older one fails with
+    TTSSuperseded. A full queue rejects new jobs with TTSOverloaded instead
+    of letting the backlog grow. A job running past the timeout fails with
+    TTSError, but its process stays counted as busy until the render really
+    returns, so admission reflects what the pool can actually take.
+    """
+
+    def __init__(self, engine, workers: int = None, queue_size: int = None, timeout: float = None, supersede: bool = None,
+                 niceness: int = None):
+        self.engine = engine
+        self.workers = settings.TTS_POOL_WORKERS if workers is None else workers
+        self.queue_size = settings.TTS_POOL_QUEUE_SIZE if queue_size is None else queue_size
+        self.timeout = settings.TTS_SYNTH_TIMEOUT if timeout is None else timeout
+        self.supersede = settings.TTS_POOL_SUPERSEDE if supersede is None else supersede
+        self.niceness = settings.TTS_POOL_NICE if niceness is None else niceness
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Deque[SynthesisJob] = deque()
+        self._queued_by_key: Dict[str, SynthesisJob] = {}
+        self._busy = 0
+
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+        self.superseded = 0
+        self.timed_out = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_wait_seconds = 0.0
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs the database driver's threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(self.niceness,)
+            )
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def synthesize(self, text: str, key: Optional[str] = None) -> bytes:
+        """Render text in a worker process; key identifies jobs that supersede each other"""
+        if self.supersede and key is not None:
+            previous = self._queued_by_key.pop(key, None)
+            if previous and not previous.future.done():
+                previous.future.set_exception(TTSSuperseded(f"superseded by a newer message for {key}"))
+                self.superseded += 1
+
+        self._discard_finished()
+        if self._busy >= self.workers and len(self._queue) >= self.queue_size:
+            self.rejected += 1
+            raise TTSOverloaded(f"synthesis queue full ({self.queue_size} waiting)")
+
+        job = SynthesisJob(text, key, asyncio.get_running_loop().create_future())
+        self._queue.append(job)
+        if self.supersede and key is not None:
+            self._queued_by_key[key] = job
+        self.admitted += 1
+        self._pump()
+        # Cancelling the caller cancels job.future, which _pump then skips
+        return await job.future
+
+    def _discard_finished(self):
+        """Drop superseded or cancelled jobs from the queue (it is short, bounded by queue_size)"""
+        if any(job.future.done() for job in self._queue):
+            self._queue = deque(job for job in self._queue if not job.future.done())
+
+    def _pump(self):
+        while self._busy < self.workers:
+            self._discard_finished()
+            if not self._queue:
+                return
+            job = self._queue.popleft()
+            if job.key is not None and self._queued_by_key.get(job.key) is job:
+                del self._queued_by_key[job.key]
+            self.queue_wait_seconds += time.perf_counter() - job.enqueued_at
+            self._start(job)
+
+    def _start(self, job: SynthesisJob):
+        self._busy += 1
+        try:
+            process_future: Future = self._ensure_executor().submit(self.engine.render, job.text)
+        except Exception as e:
+            self._busy -= 1
+            self.failed += 1
+            self._reset_if_broken(e)
+            job.future.set_exception(TTSError(f"could not start synthesis: {e}"))
+            return
+
+        loop = asyncio.get_running_loop()
+        timer = loop.call_later(self.timeout, self._expire, job)
+
+        def on_done(finished: Future):
+            try:
+                loop.call_soon_threadsafe(self._finish, job, finished, timer)
+            except RuntimeError:
+                pass  # the loop closed during shutdown
+
+        process_future.add_done_callback(on_done)
+
+    def _expire(self, job: SynthesisJob):
+        if not job.future.done():
+            self.timed_out += 1
+            job.future.set_exception(TTSError(f"synthesis timed out after {self.timeout}s"))
+
+    def _finish(self, job: SynthesisJob, finished: Future, timer: asyncio.TimerHandle):
+        timer.cancel()
+        self._busy -= 1
+        if not job.future.done():
+            error = finished.exception()
+            if error is None:
+                self.completed += 1
+                job.future.set_result(finished.result())
+            else:
+                self.failed += 1
+                self._reset_if_broken(error)
+                job.future.set_exception(error if isinstance(error, TTSError) else TTSError(str(error)))
+        self._pump()
+
+    def _reset_if_broken(self, error: BaseException):
+        """A worker process died: start a fresh executor for the next job"""
+        if isinstance(error, BrokenProcessPool) and self._executor:
+            logger.error("TTS worker process died, restarting the synthesis pool")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def shutdown(self):
+        for job in self._queue:
+            if not job.future.done():
+                job.future.cancel()
+        self._queue.clear()
+        self._queued_by_key.clear()
+        if self._executor:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, lambda: executor.shutdown(wait=True, cancel_futures=True))
+
+    def stats(self) -> dict:
+        started = self.completed + self.failed + self.timed_out
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "queued": len(self._queue),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "superseded": self.superseded,
+            "timed_out": self.timed_out,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_queue_wait_ms": round(self.queue_wait_seconds / started * 1000, 1) if started else 0.0
+        }
@@ -0,0 +1,151 @@
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Dict, Tuple
+import logging
+import re
+import time
+
+from config.settings import settings
+from models.chat_message import ChatMessage
+from services.audio_cache import normalize_speech_text
+from services.websocket_manager import normalize_stream
+
+logger = logging.getLogger(__name__)
+
+# Score contributions; a fresh comment from a quiet regular lands around 2-3.5
+MODERATOR_BONUS = 4.0    # moderators are also exempt from CHATTY_PENALTY
+GIFTER_BONUS = 3.0       # has sent the streamer gifts
+FIRST_TIME_BONUS = 2.5   # first comment of this user in the stream
+SUBSCRIBER_BONUS = 1.0
+LENGTH_BONUS = 1.5       # reached at LENGTH_WORDS words, proportionally below
+LENGTH_WORDS = 8
+NOVELTY_BONUS = 2.0      # halved by one copy of the text in the window, a third by two, ...
+CHATTY_PENALTY = 0.5     # per message the user already has in the window
+CHATTY_MAX_MESSAGES = 4
+
+# "jajajaja", "holaaaa", "🔥🔥🔥🔥": runs of a short unit count as one
+_REPEATS = re.compile(r"(.{1,4}?)\1{2,}", re.DOTALL)
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+def novelty_key(text: str) -> str:
+    """What makes two comments "the same" for novelty: case, spacing, repeats and punctuation do not"""
+    text = _REPEATS.sub(r"\1", normalize_speech_text(text[:settings.TTS_MAX_CHARS]))
+    stripped = _PUNCTUATION.sub("", text).strip()
+    # Emoji-only comments keep their emoji
+    return stripped or text
+
+class ChatWindow:
+    """Recent chat of one stream, kept as running counts.
+
+    Each message adds one entry and increments its user's and its text's
+    count; entries older than the window (or beyond its message cap) are
+    evicted from the front, decrementing the same counts. Every message is
+    added and evicted once, so upkeep is O(1) amortized per comment and a
+    lookup is a dict access, however busy the stream.
+    """
+
+    def __init__(self, seconds: float, max_messages: int, seen_users: int):
+        self.seconds = seconds
+        self.max_messages = max(1, max_messages)
+        self.seen_users = max(1, seen_users)
+        self._entries: Deque[Tuple[float, str, str]] = deque()
+        self._user_counts: Counter = Counter()
+        self._text_counts: Counter = Counter()
+        # LRU of users who have commented, for first-time chatters
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        deadline = now - self.seconds
+        while self._entries and (len(self._entries) >= self.max_messages or self._entries[0][0] < deadline):
+            _, user, text = self._entries.popleft()
+            self._decrement(self._user_counts, user)
+            self._decrement(self._text_counts, text)
+
+    @staticmethod
+    def _decrement(counts: Counter, key: str):
+        if counts[key] <= 1:
+            del counts[key]
+        else:
+            counts[key] -= 1
+
+    def add(self, user: str, text: str, now: float = None) -> Tuple[bool, int, int]:
+        """Record a comment; returns (first time, user's earlier messages, earlier copies of the text) in the window"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+
+        first_time = user not in self._seen
+        if first_time:
+            self._seen[user] = None
+            if len(self._seen) > self.seen_users:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(user)
+
+        user_messages = self._user_counts[user]
+        copies = self._text_counts[text]
+        self._entries.append((now, user, text))
+        self._user_counts[user] += 1
+        self._text_counts[text] += 1
+        return first_time, user_messages, copies
+
+class CommentScorer:
+    """Ranks chat messages for the TTS scheduler's priority policy.
+
+    Every offered comment is scored against its stream's ChatWindow:
+    first-time chatters, gifters, moderators and subscribers score higher,
+    as do longer comments and text nobody wrote recently; users other than
+    moderators who already chatted a lot in the window score lower. Scores are relative, for
+    choosing among the messages waiting at the same time.
+    """
+
+    def __init__(self, seconds: float = None, max_messages: int = None, seen_users: int = None):
+        self.seconds = settings.TTS_PRIORITY_WINDOW if seconds is None else seconds
+        self.max_messages = settings.TTS_PRIORITY_WINDOW_MESSAGES if max_messages is None else max_messages
+        self.seen_users = settings.TTS_PRIORITY_SEEN_USERS if seen_users is None else seen_users
+        self._windows: Dict[str, ChatWindow] = {}
+
+        # Counters
+        self.scored = 0
+        self.first_time = 0
+        self.total_score = 0.0
+
+    def score(self, chat_message: ChatMessage, now: float = None) -> float:
+        stream = normalize_stream(chat_message.username_stream)
+        window = self._windows.get(stream)
+        if window is None:
+            window = self._windows[stream] = ChatWindow(self.seconds, self.max_messages, self.seen_users)
+
+        first_time, user_messages, copies = window.add(chat_message.user_id, novelty_key(chat_message.message), now)
+
+        score = NOVELTY_BONUS / (1 + copies)
+        score += LENGTH_BONUS * min(len(chat_message.message.split()), LENGTH_WORDS) / LENGTH_WORDS
+        if not chat_message.moderator:
+            score -= CHATTY_PENALTY * min(user_messages, CHATTY_MAX_MESSAGES)
+        if first_time:
+            score += FIRST_TIME_BONUS
+            self.first_time += 1
+        if chat_message.gifter:
+            score += GIFTER_BONUS
+        if chat_message.moderator:
+            score += MODERATOR_BONUS
+        if chat_message.subscriber:
+            score += SUBSCRIBER_BONUS
+
+        self.scored += 1
+        self.total_score += score
+        return score
+
+    def forget(self, username_stream: str):
+        self._windows.pop(normalize_stream(username_stream), None)
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.seconds,
+            "streams": len(self._windows),
+            "window_messages": sum(len(window) for window in self._windows.values()),
+            "scored": self.scored,
+            "first_time": self.first_time,
+            "avg_score": round(self.total_score / self.scored, 2) if self.scored else 0.0
+        }
@@ -0,0 +1,194 @@
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import itertools
+import logging
+import time
+
+from config.settings import settings
+from models.chat_message import ChatMessage
+from services.websocket_manager import normalize_stream
+
+logger = logging.getLogger(__name__)
+
+# Queue policies (TTS_QUEUE_POLICY)
+POLICY_LATEST = "latest"
+POLICY_FIFO = "fifo"
+POLICY_PRIORITY = "priority"
+POLICIES = (POLICY_LATEST, POLICY_FIFO, POLICY_PRIORITY)
+
+class SpeechCandidate:
+    __slots__ = ("message", "score", "order", "enqueued_at")
+
+    def __init__(self, message: ChatMessage, score: float, order: int):
+        self.message = message
+        self.score = score
+        self.order = order
+        self.enqueued_at = time.monotonic()
+
+class SpeechQueue:
+    """Messages of one stream waiting to be spoken, bounded to size.
+
+    latest: a new message always gets in, the oldest waiting one makes room.
+    fifo: messages are spoken in arrival order, new ones are turned away when full.
+    priority: the highest score is spoken first (oldest among equals) and a
+    new message displaces the lowest scored one if it scores at least as high.
+    """
+
+    def __init__(self, policy: str, size: int):
+        self.policy = policy
+        self.size = max(1, size)
+        self._waiting: Deque[SpeechCandidate] = deque()
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def offer(self, candidate: SpeechCandidate) -> Optional[SpeechCandidate]:
+        """Add a candidate; returns the one left out (it or a waiting one), if any"""
+        if len(self._waiting) < self.size:
+            self._waiting.append(candidate)
+            return None
+        if self.policy == POLICY_FIFO:
+            return candidate
+        if self.policy == POLICY_PRIORITY:
+            lowest = min(self._waiting, key=lambda waiting: (waiting.score, waiting.order))
+            if candidate.score < lowest.score:
+                return candidate
+            self._waiting.remove(lowest)
+            self._waiting.append(candidate)
+            return lowest
+        self._waiting.append(candidate)
+        return self._waiting.popleft()
+
+    def pop(self) -> Optional[SpeechCandidate]:
+        """Next candidate to speak"""
+        if not self._waiting:
+            return None
+        if self.policy == POLICY_PRIORITY:
+            best = max(self._waiting, key=lambda waiting: (waiting.score, -waiting.order))
+            self._waiting.remove(best)
+            return best
+        return self._waiting.popleft()
+
+    def expire(self, max_age: float) -> int:
+        """Drop candidates that have waited longer than max_age seconds"""
+        deadline = time.monotonic() - max_age
+        fresh = deque(candidate for candidate in self._waiting if candidate.enqueued_at >= deadline)
+        expired = len(self._waiting) - len(fresh)
+        self._waiting = fresh
+        return expired
+
+    def clear(self):
+        self._waiting.clear()
+
+# speak(message, waiting) announces a message and returns how long it plays
+# in seconds, or None if it could not be spoken
+SpeakCallback = Callable[[ChatMessage, int], Awaitable[Optional[float]]]
+
+class TTSScheduler:
+    """Decides, per stream, which chat messages are spoken and when.
+
+    Messages are offered as they arrive and wait in a SpeechQueue whose
+    policy decides which ones survive. One player task per stream takes the
+    next message, has it announced (and synthesized) through the speak
+    callback, and waits for it to finish playing before taking another, so
+    every client hears the same messages in the same order and messages the
+    policy drops are never synthesized. The player exits when its queue runs
+    dry and is started again by the next offer.
+    """
+
+    def __init__(self, speak: SpeakCallback, policy: str = None, queue_size: int = None, max_age: float = None,
+                 gap: float = None):
+        self._speak = speak
+        policy = (policy or settings.TTS_QUEUE_POLICY).lower()
+        if policy not in POLICIES:
+            logger.warning(f"Unknown TTS_QUEUE_POLICY '{policy}', using '{POLICY_LATEST}'")
+            policy = POLICY_LATEST
+        self.policy = policy
+        self.queue_size = settings.TTS_QUEUE_SIZE if queue_size is None else queue_size
+        self.max_age = settings.TTS_QUEUE_MAX_AGE if max_age is None else max_age
+        self.gap = settings.TTS_QUEUE_GAP if gap is None else gap
+        # Optional score for the priority policy, computed when a message is offered
+        self.scorer: Optional[Callable[[ChatMessage], float]] = None
+        self._queues: Dict[str, SpeechQueue] = {}
+        self._players: Dict[str, asyncio.Task] = {}
+        self._order = itertools.count()
+
+        # Counters
+        self.offered = 0
+        self.dropped = 0
+        self.expired = 0
+        self.spoken = 0
+        self.failed = 0
+
+    def offer(self, chat_message: ChatMessage) -> bool:
+        """Queue a message for its stream; False if the policy turned it away"""
+        stream = normalize_stream(chat_message.username_stream)
+        score = self.scorer(chat_message) if self.scorer else 0.0
+        candidate = SpeechCandidate(chat_message, score, next(self._order))
+        self.offered += 1
+
+        queue = self._queues.get(stream)
+        if queue is None:
+            queue = self._queues[stream] = SpeechQueue(self.policy, self.queue_size)
+        left_out = queue.offer(candidate)
+        if left_out is not None:
+            self.dropped += 1
+
+        player = self._players.get(stream)
+        if player is None or player.done():
+            self._players[stream] = asyncio.create_task(self._play(stream, queue))
+        return left_out is not candidate
+
+    async def _play(self, stream: str, queue: SpeechQueue):
+        try:
+            while True:
+                self.expired += queue.expire(self.max_age)
+                candidate = queue.pop()
+                if candidate is None:
+                    return
+                try:
+                    duration = await self._speak(candidate.message, len(queue))
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"TTS scheduler could not speak message {candidate.message.id}: {e}")
+                    continue
+                if duration is None:
+                    continue
+                self.spoken += 1
+                # Clients play it now; the next message starts once it has finished
+                await asyncio.sleep(duration + self.gap)
+        finally:
+            if self._players.get(stream) is asyncio.current_task():
+                del self._players[stream]
+                if not queue and self._queues.get(stream) is queue:
+                    del self._queues[stream]
+
+    def clear(self, stream: Optional[str] = None):
+        """Forget waiting messages and stop speaking, for one stream or all of them"""
+        streams = [normalize_stream(stream)] if stream else list(self._queues)
+        for key in streams:
+            queue = self._queues.pop(key, None)
+            if queue:
+                queue.clear()
+            player = self._players.pop(key, None)
+            if player:
+                player.cancel()
+
+    async def stop(self):
+        players = list(self._players.values())
+        self.clear()
+        await asyncio.gather(*players, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "streams": len(self._queues),
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+            "offered": self.offered,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "spoken": self.spoken,
+            "failed": self.failed
+        }
@@ -0,0 +1,203 @@
+from datetime import datetime
+from typing import Optional
+import logging
+import time
+
+from config.settings import settings
+from models.chat_message import ChatMessage
+from services.audio_cache import AudioCache, audio_key
+from services.tts_engine import TTSError, TTSOverloaded, TTSSuperseded, concat_wav, create_tts_engine, wav_duration
+from services.tts_pool import SynthesisPool
+from services.tts_priority import CommentScorer
+from services.tts_scheduler import POLICY_PRIORITY, TTSScheduler
+
+logger = logging.getLogger(__name__)
+
+# What gets spoken for a chat message (the browser used the same phrasing). The two
+# parts are synthesized and cached separately: the same comment from different users,
+# or the same user commenting again, then reuses the cached half.
+SPEECH_TEMPLATE = "{user} dice: {message}"
+SPEAKER_TEMPLATE = "{user} dice:"
+
+class TTSService:
+    """Server-side speech for chat messages.
+
+    Runs as the "tts" ingestion pipeline stage on the worker that follows
+    the stream. Messages go to a TTSScheduler, which picks what each stream
+    speaks next; only picked messages are synthesized, and a tts_speaking
+    event tells every client what is being spoken now and where to fetch
+    the audio. Clips are content addressed in an AudioCache, so repeated
+    comments and speakers are not synthesized again. Synthesis itself runs
+    in a SynthesisPool of worker processes so it never blocks the event
+    loop serving TikTok and /api/ws.
+    Without an engine, messages are still scheduled and announced without
+    audio, and browsers speak them themselves.
+    """
+
+    def __init__(self, engine=None, cache: AudioCache = None, scheduler: TTSScheduler = None):
+        self.engine = engine if engine is not None else create_tts_engine()
+        self.cache = cache or AudioCache()
+        self.pool = SynthesisPool(self.engine) if self.engine and settings.TTS_POOL_WORKERS > 0 else None
+        self.scheduler = scheduler or TTSScheduler(self.announce)
+        # The priority policy ranks comments over a sliding window of each stream's chat
+        self.scorer = None
+        if self.scheduler.policy == POLICY_PRIORITY:
+            self.scorer = CommentScorer()
+            self.scheduler.scorer = self.scorer.score
+        # Mirrors the global TTS toggle, which reaches every worker as a tts_status event
+        self.enabled = True
+        self._websocket_manager = None
+
+        # Counters
+        self.synthesized = 0
+        self.failed = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.fully_cached = 0
+        self.synthesis_seconds = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.engine is not None
+
+    @property
+    def engine_name(self) -> Optional[str]:
+        return self.engine.name if self.engine else None
+
+    def set_dependencies(self, websocket_manager, pipeline=None):
+        self._websocket_manager = websocket_manager
+        if websocket_manager:
+            websocket_manager.add_listener("tts_status", self._on_tts_status)
+        if pipeline:
+            pipeline.add_stage("tts", self.handle_chat_message, concurrency=settings.PIPELINE_TTS_CONCURRENCY)
+
+    def _on_tts_status(self, event: dict):
+        self.enabled = bool(event.get("enabled", True))
+        if not self.enabled:
+            self.scheduler.clear()
+
+    async def handle_chat_message(self, chat_message: ChatMessage):
+        """Pipeline stage: offer a chat message to its stream's speech schedule"""
+        if not self.enabled:
+            self.skipped += 1
+            return
+        self.scheduler.offer(chat_message)
+
+    def forget_stream(self, username_stream: str):
+        """The stream is no longer followed here: drop what it had waiting to be spoken"""
+        self.scheduler.clear(username_stream)
+        if self.scorer:
+            self.scorer.forget(username_stream)
+
+    async def announce(self, chat_message: ChatMessage, waiting: int) -> Optional[float]:
+        """Scheduler callback: synthesize a picked message and tell its stream it is being spoken.
+
+        Returns how long it plays in seconds, None if it could not be spoken.
+        """
+        audio_id = None
+        if self.engine:
+            try:
+                audio_id, audio = await self.speak(chat_message.user, chat_message.message, key=chat_message.username_stream)
+            except (TTSOverloaded, TTSSuperseded) as e:
+                # Expected under load: the next pick for the stream will be spoken instead
+                self.dropped += 1
+                logger.debug(f"TTS dropped message {chat_message.id}: {e}")
+                return None
+            except TTSError as e:
+                self.failed += 1
+                logger.error(f"TTS failed for message {chat_message.id}: {e}")
+                return None
+            duration = wav_duration(audio)
+        else:
+            # The browser speaks it; estimate how long that takes to pace the schedule
+            text = SPEECH_TEMPLATE.format(user=chat_message.user, message=chat_message.message[:settings.TTS_MAX_CHARS])
+            duration = len(text) / settings.TTS_BROWSER_CHARS_PER_SECOND
+
+        if self._websocket_manager:
+            await self._websocket_manager.broadcast_json({
+                "type": "tts_speaking",
+                "id": audio_id,
+                "message_id": chat_message.id,
+                "user": chat_message.user,
+                "message": chat_message.message,
+                "url": f"/api/tts/audio/{audio_id}" if audio_id else None,
+                "mime_type": self.engine.mime_type if self.engine else None,
+                "duration": round(duration, 3),
+                "engine": self.engine_name,
+                "waiting": waiting,
+                "queue_size": self.scheduler.queue_size,
+                "policy": self.scheduler.policy,
+                "timestamp": datetime.now().isoformat()
+            }, stream=chat_message.username_stream)
+        return duration
+
+    async def speak(self, user: str, message: str, key: Optional[str] = None):
+        """(audio id, WAV) for a chat message, synthesizing only the parts not cached yet.
+
+        key (the stream) lets a newer message supersede this one while its
+        synthesis is still queued.
+        """
+        message = message[:settings.TTS_MAX_CHARS]
+        audio_id = audio_key(SPEECH_TEMPLATE.format(user=user, message=message), self.engine.voice)
+
+        synthesized_before = self.synthesized
+        clips = [await self._clip(SPEAKER_TEMPLATE.format(user=user), key), await self._clip(message, key)]
+        try:
+            audio = concat_wav(clips)
+        except ValueError as e:
+            logger.warning(f"Could not join cached clips ({e}), synthesizing the whole message")
+            audio = await self._synthesize(SPEECH_TEMPLATE.format(user=user, message=message), key)
+        if self.synthesized == synthesized_before:
+            self.fully_cached += 1
+
+        # Stored under its own address so any worker can serve it at /api/tts/audio/{id}; the
+        # joined clip is rarely asked for again, so it stays out of the memory tier
+        await self.cache.put(audio_id, audio, memory=False)
+        return audio_id, audio
+
+    async def _clip(self, text: str, key: Optional[str] = None) -> bytes:
+        clip_key = audio_key(text, self.engine.voice)
+        audio = await self.cache.get(clip_key)
+        if audio is None:
+            audio = await self._synthesize(text, key)
+            await self.cache.put(clip_key, audio)
+        return audio
+
+    async def _synthesize(self, text: str, key: Optional[str] = None) -> bytes:
+        started = time.perf_counter()
+        if self.pool:
+            audio = await self.pool.synthesize(text, key)
+        else:
+            audio = await self.engine.synthesize(text)
+        self.synthesis_seconds += time.perf_counter() - started
+        self.synthesized += 1
+        return audio
+
+    async def stop(self):
+        await self.scheduler.stop()
+        if self.pool:
+            await self.pool.shutdown()
+
+    async def get_audio(self, audio_id: str) -> Optional[bytes]:
+        """Audio for an id from a tts_speaking event, None if unknown or evicted"""
+        return await self.cache.peek(audio_id)
+
+    def stats(self) -> dict:
+        return {
+            "engine": self.engine_name,
+            "voice": self.engine.voice if self.engine else None,
+            "enabled": self.enabled,
+            "synthesized": self.synthesized,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "fully_cached_messages": self.fully_cached,
+            "avg_synthesis_ms": round(self.synthesis_seconds / self.synthesized * 1000, 1) if self.synthesized else 0.0,
+            "scheduler": self.scheduler.stats(),
+            "priority": self.scorer.stats() if self.scorer else None,
+            "cache": self.cache.stats(),
+            "pool": self.pool.stats() if self.pool else None
+        }
+
+# Global TTS service instance
+tts_service = TTSService()
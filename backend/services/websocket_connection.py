@@ -0,0 +1,230 @@
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional, Set, Union
+import asyncio
+import logging
+import time
+import uuid
+
+from fastapi import WebSocket
+
+from config.settings import settings
+from services.wire_format import JSON, encode_batch
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies applied per message type when a client's queue is full
+DROP_OLDEST = "drop_oldest"
+NEVER_DROP = "never_drop"
+
+# Wildcard used in subscriptions for "every stream" / "every message type"
+ALL = "*"
+
+def overflow_policy_for(message_type: Optional[str]) -> str:
+    """Resolve the overflow policy configured for a message type"""
+    if message_type in settings.WS_NEVER_DROP_TYPES:
+        return NEVER_DROP
+    return DROP_OLDEST
+
+class ClientConnection:
+    """A WebSocket client with its own bounded outbound queue and writer task.
+
+    With batching enabled, frames already waiting in the queue are coalesced
+    into one array frame, and while the event rate is above
+    WS_BATCH_MIN_RATE the writer also waits WS_BATCH_WINDOW seconds to let a
+    burst accumulate. At low rates every event is still sent immediately.
+    """
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[["ClientConnection"], None],
+                 queue_size: int = None, max_overflows: int = None, send_timeout: float = None, encoding: str = JSON,
+                 batch: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.encoding = encoding
+        self.batch = batch
+        self.batch_window = settings.WS_BATCH_WINDOW
+        self.batch_max_events = settings.WS_BATCH_MAX_EVENTS
+        self._burst_interval = 1.0 / settings.WS_BATCH_MIN_RATE if settings.WS_BATCH_MIN_RATE > 0 else 0.0
+        self._avg_interval = float("inf")  # moving average of the time between enqueued frames
+        self._last_enqueue = 0.0
+        self.queue_size = queue_size or settings.WS_QUEUE_SIZE
+        self.max_overflows = max_overflows or settings.WS_MAX_OVERFLOWS
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self.connected_at = datetime.now()
+        # Last time the client sent anything (message or pong); drives the heartbeat reaper
+        self.last_activity = time.monotonic()
+        self.last_activity_at = self.connected_at
+        self.heartbeat = True  # False for clients that cannot answer pings
+
+        # Subscription: which streams and message types this client wants
+        self.streams: Set[str] = {ALL}
+        self.message_types: Set[str] = {ALL}
+        # Capability: False for display-only clients that must never speak chat messages
+        self.tts = True
+
+        # Each entry is (payload, droppable)
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._on_failure = on_failure
+        self._writer_task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        # Counters
+        self.frames_sent = 0
+        self.batches_sent = 0
+        self.frames_dropped = 0
+        self.overflows = 0  # consecutive overflows since the queue last drained
+        self.total_overflows = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    def touch(self):
+        """Record inbound activity from the client"""
+        self.last_activity = time.monotonic()
+        self.last_activity_at = datetime.now()
+
+    def start(self):
+        """Start the writer task that drains this client's queue"""
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message: Union[str, bytes], message_type: Optional[str] = None) -> bool:
+        """Queue a frame for this client; bytes are sent as a binary frame.
+
+        Returns False when the client has overflowed too many times in a row
+        and should be evicted as a slow consumer.
+        """
+        if self.closed:
+            return False
+
+        droppable = overflow_policy_for(message_type) == DROP_OLDEST
+
+        if len(self._queue) >= self.queue_size:
+            self.overflows += 1
+            self.total_overflows += 1
+            if not self._drop_oldest_droppable() and droppable:
+                # Queue is full of frames we must not drop; discard the new one instead
+                self.frames_dropped += 1
+                return self.overflows < self.max_overflows
+            if self.overflows >= self.max_overflows:
+                return False
+
+        self._queue.append((message, droppable))
+        self._ready.set()
+
+        if self.batch:
+            now = time.monotonic()
+            if self._last_enqueue:
+                interval = now - self._last_enqueue
+                self._avg_interval = interval if self._avg_interval == float("inf") else 0.8 * self._avg_interval + 0.2 * interval
+            self._last_enqueue = now
+        return True
+
+    @property
+    def bursting(self) -> bool:
+        """Whether frames are arriving faster than WS_BATCH_MIN_RATE"""
+        return self._avg_interval < self._burst_interval
+
+    def _drop_oldest_droppable(self) -> bool:
+        """Drop the oldest frame whose type allows dropping"""
+        for index, (_, droppable) in enumerate(self._queue):
+            if droppable:
+                del self._queue[index]
+                self.frames_dropped += 1
+                return True
+        return False
+
+    async def _writer(self):
+        """Send queued frames in order, one at a time, with a per-send deadline"""
+        try:
+            while True:
+                if not self._queue:
+                    # Fully drained: the client is keeping up again
+                    self.overflows = 0
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                message, _ = self._queue.popleft()
+                if not self.batch:
+                    await self._send_with_deadline(message)
+                    self.frames_sent += 1
+                    continue
+
+                if self.bursting and len(self._queue) < self.batch_max_events:
+                    # Let the burst accumulate so it goes out as one frame
+                    await asyncio.sleep(self.batch_window)
+                frames = [message]
+                while self._queue and len(frames) < self.batch_max_events and type(self._queue[0][0]) is type(message):
+                    frames.append(self._queue.popleft()[0])
+                if len(frames) > 1:
+                    message = encode_batch(frames, self.encoding)
+                    self.batches_sent += 1
+                await self._send_with_deadline(message)
+                self.frames_sent += len(frames)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket client {self.id} exceeded {self.send_timeout}s send deadline")
+            self._on_failure(self)
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket client {self.id}: {e}")
+            self._on_failure(self)
+
+    async def _send_with_deadline(self, message: Union[str, bytes]):
+        """Send one frame, raising TimeoutError if it misses the deadline.
+
+        Avoids asyncio.wait_for, which on Python < 3.12 can swallow a
+        cancellation that races with a completed send and leave the writer
+        running after close() or at shutdown.
+        """
+        send_frame = self.websocket.send_bytes if isinstance(message, bytes) else self.websocket.send_text
+        if hasattr(asyncio, "timeout"):
+            async with asyncio.timeout(self.send_timeout):
+                await send_frame(message)
+            return
+
+        send = asyncio.ensure_future(send_frame(message))
+        try:
+            done, _ = await asyncio.wait({send}, timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            send.cancel()
+            raise
+        if not done:
+            send.cancel()
+            raise asyncio.TimeoutError()
+        send.result()
+
+    def close(self):
+        """Stop the writer task and discard any queued frames"""
+        self.closed = True
+        self._queue.clear()
+        if self._writer_task and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+
+    def stats(self) -> dict:
+        """Per-client delivery counters"""
+        return {
+            "id": self.id,
+            "client": f"{self.websocket.client.host}:{self.websocket.client.port}" if self.websocket.client else None,
+            "connected_at": self.connected_at.isoformat(),
+            "last_activity_at": self.last_activity_at.isoformat(),
+            "idle_seconds": round(self.idle_seconds, 1),
+            "heartbeat": self.heartbeat,
+            "encoding": self.encoding,
+            "batch": self.batch,
+            "streams": sorted(self.streams),
+            "message_types": sorted(self.message_types),
+            "tts": self.tts,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "frames_sent": self.frames_sent,
+            "batches_sent": self.batches_sent,
+            "frames_dropped": self.frames_dropped,
+            "overflows": self.total_overflows
+        }
@@ -1,56 +1,429 @@
 from fastapi import WebSocket
-from typing import List
-import json
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
 import logging
+import time
+import uuid
+
+from config.settings import settings
+from services.backplane import create_backplane
+from services.websocket_connection import ALL, ClientConnection
+from services import wire_format
 
 logger = logging.getLogger(__name__)
 
+# Shorthands clients can use instead of listing message types one by one
+MESSAGE_TYPE_GROUPS = {
+    "chat": {"chat_message"},
+    "status": {"connection_status", "tts_status"},
+    "tts": {"tts_speaking"},
+}
+
+# What is being spoken is not sent to clients that turned TTS off (?tts=0)
+TTS_ONLY_TYPES = {"tts_speaking"}
+
+def normalize_stream(username_stream: str) -> str:
+    """Canonical topic name for a TikTok username"""
+    return username_stream.replace("@", "").strip().lower()
+
+def expand_message_types(message_types: Iterable[str]) -> Set[str]:
+    """Expand group shorthands ("chat", "status") into concrete message types"""
+    expanded = set()
+    for message_type in message_types:
+        expanded |= MESSAGE_TYPE_GROUPS.get(message_type, {message_type})
+    return expanded or {ALL}
+
+class EventPayloads:
+    """Serialize-once cache for one broadcast event.
+
+    Clients sharing a wire encoding and payload variant get the very same
+    frame object; each distinct (encoding, variant) is serialized exactly
+    once. The only variant today is chat messages with TTS forced off for
+    clients that disabled it.
+    """
+
+    def __init__(self, event: dict):
+        self.event = event
+        self._frames: Dict[Tuple[str, bool], wire_format.Frame] = {}
+        self.serializations = 0
+
+    def frame_for(self, client: ClientConnection) -> wire_format.Frame:
+        tts_off = not client.tts and bool(self.event.get("tts_enabled"))
+        key = (client.encoding, tts_off)
+        frame = self._frames.get(key)
+        if frame is None:
+            event = {**self.event, "tts_enabled": False} if tts_off else self.event
+            frame = self._frames[key] = wire_format.encode(event, client.encoding)
+            self.serializations += 1
+        return frame
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Local WebSocket clients plus the backplane that connects this worker to the others.
+
+    broadcast_json publishes through the backplane; every worker (this one
+    included) receives the event and fans it out to its own clients. With
+    the default in-process backplane that is a direct call.
+    """
+
+    def __init__(self, replay_buffer_size: int = None, backplane_kind: str = None):
+        # id(websocket) -> client. Starlette WebSockets compare equal by scope contents, so key by
+        # identity; the client holds a reference to its websocket, so the id cannot be reused meanwhile.
+        self._clients: Dict[int, ClientConnection] = {}
+        # (stream, message_type) -> clients subscribed to that topic; either part may be ALL
+        self._topics: Dict[Tuple[str, str], Set[ClientConnection]] = {}
+
+        # Sequence numbers restart with the process; the epoch tells clients when that happened
+        self.epoch = uuid.uuid4().hex[:8]
+        self.replay_buffer_size = replay_buffer_size or settings.WS_REPLAY_BUFFER_SIZE
+        # stream (ALL for events without one) -> last sequence number / recent (seq, type, event)
+        self._sequences: Dict[str, int] = {}
+        self._replay: Dict[str, Deque[Tuple[int, Optional[str], dict]]] = {}
+
+        # Serialization counters for the broadcast path
+        self.events_broadcast = 0
+        self.serializations = 0
+        self.max_serializations_per_event = 0
+
+        # Heartbeat: ping idle clients, evict those silent for longer than the timeout
+        self.heartbeat_interval = settings.WS_HEARTBEAT_INTERVAL
+        self.heartbeat_timeout = settings.WS_HEARTBEAT_TIMEOUT
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.clients_reaped = 0
+
+        self.backplane = create_backplane(self._deliver, backplane_kind)
+        # message type -> callbacks run for every delivered event of that type, on every worker
+        self._listeners: Dict[str, List[Callable[[dict], None]]] = {}
+
+    def add_listener(self, message_type: str, callback: Callable[[dict], None]):
+        """Observe delivered events of a type (e.g. to keep per-worker caches in sync)"""
+        callbacks = self._listeners.setdefault(message_type, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    async def start(self):
+        """Join the backplane and start the heartbeat"""
+        await self.backplane.start()
+        self.start_heartbeat()
+
+    async def stop(self):
+        await self.stop_heartbeat()
+        await self.backplane.stop()
 
-    async def connect(self, websocket: WebSocket):
-        """Accept and add new WebSocket connection"""
+    async def connect(self, websocket: WebSocket, encoding: str = wire_format.JSON, batch: bool = False,
+                      heartbeat: bool = True) -> ClientConnection:
+        """Accept and add new WebSocket connection using the negotiated wire encoding.
+
+        batch=True lets the client receive several events as one array frame;
+        heartbeat=False exempts clients that cannot answer pings from the reaper.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        client = ClientConnection(
+            websocket, on_failure=self._on_client_failure, encoding=wire_format.negotiate(encoding), batch=batch
+        )
+        client.heartbeat = heartbeat
+        client.start()
+        self._clients[id(websocket)] = client
+        self._index_client(client)
+        client.enqueue(wire_format.encode(
+            {"type": "hello", "epoch": self.epoch, "client_id": client.id, "encoding": client.encoding, "batch": client.batch},
+            client.encoding
+        ))
+        logger.info(f"WebSocket connected. Total connections: {len(self._clients)}")
+        return client
+
+    @property
+    def active_connections(self) -> List[ClientConnection]:
+        """Snapshot of connected clients; safe to iterate while clients come and go"""
+        return list(self._clients.values())
+
+    def _find_client(self, websocket: WebSocket) -> Optional[ClientConnection]:
+        return self._clients.get(id(websocket))
 
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        client = self._find_client(websocket)
+        if client:
+            self._remove_client(client)
+        logger.info(f"WebSocket disconnected. Total connections: {len(self._clients)}")
+
+    def _remove_client(self, client: ClientConnection):
+        if self._clients.get(id(client.websocket)) is client:
+            del self._clients[id(client.websocket)]
+        self._unindex_client(client)
+        client.close()
+
+    def _client_topics(self, client: ClientConnection):
+        return [(stream, message_type) for stream in client.streams for message_type in client.message_types]
+
+    def _index_client(self, client: ClientConnection):
+        for topic in self._client_topics(client):
+            self._topics.setdefault(topic, set()).add(client)
+
+    def _unindex_client(self, client: ClientConnection):
+        for topic in self._client_topics(client):
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def subscribe(self, websocket: WebSocket, streams: Optional[Iterable[str]] = None,
+                  message_types: Optional[Iterable[str]] = None, tts: Optional[bool] = None) -> Optional[ClientConnection]:
+        """Replace a client's subscription; empty or missing values mean everything.
+
+        tts=False marks chat messages for this client as not to be spoken;
+        None leaves the current setting unchanged.
+        """
+        client = self._find_client(websocket)
+        if client is None:
+            return None
+        if tts is not None:
+            client.tts = tts
+
+        self._unindex_client(client)
+        client.streams = {normalize_stream(stream) for stream in (streams or []) if stream.strip()} or {ALL}
+        client.message_types = expand_message_types(message_types or [])
+        self._index_client(client)
+
+        logger.info(f"WebSocket client {client.id} subscribed to streams={sorted(client.streams)} types={sorted(client.message_types)}")
+        return client
+
+    def _recipients(self, message_type: Optional[str], stream: Optional[str]) -> Set[ClientConnection]:
+        """Look up the clients interested in a (stream, message_type) event"""
+        message_types = (message_type, ALL) if message_type else (ALL,)
+
+        recipients = set()
+        if stream is None:
+            # Not tied to a stream (e.g. tts_status): every client whose type filter matches
+            for (_, topic_type), subscribers in self._topics.items():
+                if topic_type in message_types:
+                    recipients |= subscribers
+        else:
+            for topic_stream in (normalize_stream(stream), ALL):
+                for topic_type in message_types:
+                    recipients |= self._topics.get((topic_stream, topic_type), set())
+
+        if message_type in TTS_ONLY_TYPES:
+            recipients = {client for client in recipients if client.tts}
+        return recipients
+
+    def _wants(self, client: ClientConnection, stream: str, message_type: Optional[str]) -> bool:
+        """Whether a sequenced event matches a client's subscription"""
+        if ALL not in client.message_types and message_type not in client.message_types:
+            return False
+        if message_type in TTS_ONLY_TYPES and not client.tts:
+            return False
+        return stream == ALL or ALL in client.streams or stream in client.streams
+
+    def resume(self, websocket: WebSocket, epoch: Optional[str], last_seqs: Dict[str, int]) -> int:
+        """Replay the events a reconnecting client missed.
+
+        last_seqs maps stream (ALL for events without one) to the last
+        sequence number the client saw. Streams whose gap has already left
+        the replay buffer, or sequences from an earlier server epoch, get a
+        "resync_required" message instead. Replayed events carry
+        "replayed": true so clients can skip what is only meaningful live
+        (like audio for tts_speaking). Returns the number of replayed events.
+        """
+        client = self._find_client(websocket)
+        if client is None:
+            return 0
+
+        replayed = 0
+        for stream, last_seq in last_seqs.items():
+            stream = stream if stream == ALL else normalize_stream(stream)
+            current = self._sequences.get(stream, 0)
+            if epoch == self.epoch and last_seq == current:
+                continue
+
+            buffer = self._replay.get(stream)
+            if epoch != self.epoch or last_seq > current or not buffer or buffer[0][0] > last_seq + 1:
+                client.enqueue(wire_format.encode(
+                    {"type": "resync_required", "stream": stream, "epoch": self.epoch, "seq": current}, client.encoding
+                ))
+                continue
+
+            for seq, message_type, event in buffer:
+                if seq > last_seq and self._wants(client, stream, message_type):
+                    if not client.enqueue(EventPayloads({**event, "replayed": True}).frame_for(client), message_type):
+                        self._evict_slow_consumer(client)
+                        return replayed
+                    replayed += 1
+
+        if replayed:
+            logger.info(f"WebSocket client {client.id} resumed with {replayed} replayed events")
+        return replayed
+
+    def _on_client_failure(self, client: ClientConnection):
+        """Writer task for a client failed or missed its send deadline"""
+        self._remove_client(client)
+        # Close the socket too, or the client would sit connected without frames and never reconnect
+        asyncio.create_task(self._close_quietly(client.websocket, code=1011))
+        logger.info(f"WebSocket client {client.id} removed after send failure. Total connections: {len(self._clients)}")
+
+    def touch(self, websocket: WebSocket):
+        """Record that a client sent something (any message, including pong)"""
+        client = self._find_client(websocket)
+        if client:
+            client.touch()
+
+    def start_heartbeat(self):
+        if self._heartbeat_task is None and self.heartbeat_interval > 0:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop_heartbeat(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat failed: {e}")
+
+    def reap(self) -> int:
+        """Evict clients silent past the timeout and ping the ones going idle"""
+        reaped = 0
+        for client in self.active_connections:
+            if not client.heartbeat:
+                continue
+            idle = client.idle_seconds
+            if idle >= self.heartbeat_timeout:
+                logger.warning(f"Evicting unresponsive WebSocket client {client.id}: no activity for {idle:.0f}s")
+                self._remove_client(client)
+                asyncio.create_task(self._close_quietly(client.websocket, code=1001))
+                reaped += 1
+            elif idle >= self.heartbeat_interval:
+                client.enqueue(wire_format.encode({"type": "ping", "ts": int(time.time() * 1000)}, client.encoding), "ping")
+        self.clients_reaped += reaped
+        return reaped
+
+    def _evict_slow_consumer(self, client: ClientConnection):
+        """Disconnect a client that keeps overflowing its send queue"""
+        logger.warning(
+            f"Evicting slow WebSocket client {client.id}: {client.overflows} consecutive overflows, "
+            f"{client.frames_dropped} frames dropped"
+        )
+        self._remove_client(client)
+        asyncio.create_task(self._close_quietly(client.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket, code: int = 1008):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=1.0)
+        except Exception:
+            pass
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send message to specific WebSocket connection"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
-
-    async def broadcast(self, message: str):
-        """Send message to all connected WebSocket clients"""
-        if not self.active_connections:
+        client = self._find_client(websocket)
+        if client is None:
+            logger.error("Error sending personal message: connection not registered")
+            return
+        if not client.enqueue(message):
+            self._evict_slow_consumer(client)
+
+    async def send_personal_json(self, data: dict, websocket: WebSocket):
+        """Send an event to one connection in its negotiated encoding"""
+        client = self._find_client(websocket)
+        if client is None:
+            logger.error("Error sending personal message: connection not registered")
+            return
+        if not client.enqueue(wire_format.encode(data, client.encoding), data.get("type")):
+            self._evict_slow_consumer(client)
+
+    async def broadcast(self, message: str, message_type: Optional[str] = None, stream: Optional[str] = None):
+        """Queue message for every client subscribed to this stream and message type.
+
+        Each client is drained by its own writer task, so a slow consumer only
+        ever delays itself. Events without a stream go to all clients whose
+        message type filter matches.
+        """
+        if not self._clients:
             logger.debug("No active WebSocket connections to broadcast to")
             return
-            
-        disconnected = []
-        for connection in self.active_connections:
+
+        # The recipient set is a snapshot, so evictions during the fan-out are safe
+        for client in self._recipients(message_type, stream):
+            if not client.enqueue(message, message_type):
+                self._evict_slow_consumer(client)
+
+    async def broadcast_json(self, data: dict, stream: Optional[str] = None):
+        """Send JSON data to clients subscribed to the given stream, on every worker"""
+        await self.backplane.publish({"data": data, "stream": stream})
+
+    async def _deliver(self, envelope: dict):
+        """Fan out an event received from the backplane to this worker's clients.
+
+        The event is stamped with the next sequence number of its stream and
+        kept in that stream's replay buffer for clients that reconnect. It is
+        serialized once per distinct payload variant among the recipients.
+        Sequence numbers are per worker: a client resuming on a different
+        worker gets resync_required because the epoch differs.
+        """
+        data, stream = envelope["data"], envelope.get("stream")
+        for callback in self._listeners.get(data.get("type"), ()):
             try:
-                await connection.send_text(message)
+                callback(data)
             except Exception as e:
-                logger.error(f"Error in broadcast: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
-    
-    async def broadcast_json(self, data: dict):
-        """Send JSON data to all connected WebSocket clients"""
-        message = json.dumps(data)
-        await self.broadcast(message)
+                logger.error(f"WebSocket event listener failed: {e}")
+
+        key = normalize_stream(stream) if stream else ALL
+        seq = self._sequences.get(key, 0) + 1
+        self._sequences[key] = seq
+
+        event = {**data, "seq": seq, "stream": key}
+        message_type = data.get("type")
+        replay = self._replay.get(key)
+        if replay is None:
+            replay = self._replay[key] = deque(maxlen=self.replay_buffer_size)
+        replay.append((seq, message_type, event))
+
+        if not self._clients:
+            logger.debug("No active WebSocket connections to broadcast to")
+            return
+
+        payloads = EventPayloads(event)
+        for client in self._recipients(message_type, stream):
+            if not client.enqueue(payloads.frame_for(client), message_type):
+                self._evict_slow_consumer(client)
+
+        self.events_broadcast += 1
+        self.serializations += payloads.serializations
+        self.max_serializations_per_event = max(self.max_serializations_per_event, payloads.serializations)
+
+    def get_connections(self) -> dict:
+        """Connection table with last-activity times, most idle first"""
+        clients = sorted((client.stats() for client in self._clients.values()), key=lambda c: c["idle_seconds"], reverse=True)
+        return {
+            "total_connections": len(clients),
+            "heartbeat_interval": self.heartbeat_interval,
+            "heartbeat_timeout": self.heartbeat_timeout,
+            "clients_reaped": self.clients_reaped,
+            "connections": clients
+        }
+
+    def get_stats(self) -> dict:
+        """Delivery counters for every connected client"""
+        clients = [client.stats() for client in self._clients.values()]
+        return {
+            "total_connections": len(clients),
+            "frames_dropped": sum(client["frames_dropped"] for client in clients),
+            "epoch": self.epoch,
+            "sequences": dict(self._sequences),
+            "backplane": self.backplane.stats(),
+            "serialization": {
+                "events_broadcast": self.events_broadcast,
+                "serializations": self.serializations,
+                "per_event": round(self.serializations / self.events_broadcast, 3) if self.events_broadcast else 0.0,
+                "max_per_event": self.max_serializations_per_event
+            },
+            "clients": clients
+        }
 
 # Global WebSocket manager instance
-websocket_manager = WebSocketManager()
\ No newline at end of file
+websocket_manager = WebSocketManager()
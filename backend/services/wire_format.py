@@ -0,0 +1,137 @@
+"""
+Encodings for events sent over /api/ws.
+
+json     verbose JSON text frames, as sent to the web frontend (default)
+compact  JSON text frames using the compact schema below
+msgpack  the compact schema as MessagePack binary frames (needs the msgpack package)
+
+Compact schema: keys are shortened via KEY_ALIASES, "type" becomes an
+integer tag from TYPE_TAGS (unknown types stay strings), ISO "timestamp"
+strings become epoch milliseconds, and "tts_enabled" is only present when
+it is false. Keys without an alias are passed through unchanged.
+
+Clients that opt into batching may receive an array of events in a single
+frame (in the same encoding) instead of one event per frame.
+"""
+
+from datetime import datetime
+from typing import Union
+import json
+import logging
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed by clients that negotiate msgpack
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+COMPACT = "compact"
+MSGPACK = "msgpack"
+
+TYPE_TAGS = {
+    "chat_message": 1,
+    "connection_status": 2,
+    "tts_status": 3,
+    "hello": 4,
+    "subscribed": 5,
+    "resync_required": 6,
+    "ping": 7,
+    "tts_speaking": 8,
+}
+TAG_TYPES = {tag: message_type for message_type, tag in TYPE_TAGS.items()}
+
+KEY_ALIASES = {
+    "type": "t",
+    "seq": "q",
+    "stream": "s",
+    "user": "u",
+    "message": "m",
+    "timestamp": "ts",
+    "username_stream": "us",
+    "tts_enabled": "x",
+    "connected": "c",
+    "username": "n",
+    "enabled": "e",
+    "error": "err",
+}
+ALIAS_KEYS = {alias: key for key, alias in KEY_ALIASES.items()}
+
+Frame = Union[str, bytes]
+
+def available_encodings() -> list:
+    encodings = [JSON, COMPACT]
+    if msgpack is not None:
+        encodings.append(MSGPACK)
+    return encodings
+
+def negotiate(requested: str) -> str:
+    """Pick the encoding for a client; unknown or unavailable requests fall back to JSON"""
+    requested = (requested or JSON).strip().lower()
+    if requested in available_encodings():
+        return requested
+    logger.warning(f"WebSocket encoding '{requested}' not available, using {JSON}")
+    return JSON
+
+def _epoch_ms(timestamp) -> int:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return int(timestamp.timestamp() * 1000)
+
+def to_compact(data: dict) -> dict:
+    """Rewrite an event dict into the compact schema"""
+    compact = {}
+    for key, value in data.items():
+        if key == "type":
+            value = TYPE_TAGS.get(value, value)
+        elif key == "timestamp" and value is not None:
+            value = _epoch_ms(value)
+        elif key == "tts_enabled":
+            if value:
+                continue
+            value = 0
+        compact[KEY_ALIASES.get(key, key)] = value
+    return compact
+
+def from_compact(compact: dict) -> dict:
+    """Inverse of to_compact (timestamps stay epoch milliseconds)"""
+    data = {"tts_enabled": True} if compact.get("t") == TYPE_TAGS["chat_message"] else {}
+    for alias, value in compact.items():
+        key = ALIAS_KEYS.get(alias, alias)
+        if key == "type":
+            value = TAG_TYPES.get(value, value)
+        elif key == "tts_enabled":
+            value = bool(value)
+        data[key] = value
+    return data
+
+def encode(data: dict, encoding: str = JSON) -> Frame:
+    """Serialize an event for one encoding; bytes mean a binary frame"""
+    if encoding == COMPACT:
+        return json.dumps(to_compact(data), separators=(",", ":"), ensure_ascii=False)
+    if encoding == MSGPACK:
+        return msgpack.packb(to_compact(data), use_bin_type=True)
+    return json.dumps(data)
+
+def encode_batch(frames: list, encoding: str = JSON) -> Frame:
+    """Join already encoded frames into one array frame without re-serializing"""
+    if encoding == MSGPACK:
+        count = len(frames)
+        if count < 16:
+            header = bytes([0x90 | count])
+        elif count < 0x10000:
+            header = b"\xdc" + count.to_bytes(2, "big")
+        else:
+            header = b"\xdd" + count.to_bytes(4, "big")
+        return header + b"".join(frames)
+    return "[" + ",".join(frames) + "]"
+
+def decode(frame: Frame, encoding: str = JSON) -> Union[dict, list]:
+    """Parse a frame produced by encode or encode_batch, as a client would"""
+    if encoding == JSON:
+        return json.loads(frame)
+    value = json.loads(frame) if encoding == COMPACT else msgpack.unpackb(frame, raw=False)
+    if isinstance(value, list):
+        return [from_compact(item) for item in value]
+    return from_compact(value)
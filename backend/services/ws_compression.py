@@ -0,0 +1,108 @@
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+import dataclasses
+import ipaddress
+import logging
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets import frames
+from websockets.datastructures import Headers
+from websockets.exceptions import NegotiationError
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that leaves messages below min_size uncompressed.
+
+    RFC 7692 lets the sender choose per message: skipped messages go out with
+    RSV1 unset and never touch the compression context.
+    """
+
+    def __init__(self, *args, min_size: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self._skip_message = False
+
+        # Counters
+        self.messages_compressed = 0
+        self.messages_skipped = 0
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        if frame.opcode is not frames.OP_CONT:
+            # Continuation frames follow the decision made for the first frame
+            self._skip_message = len(frame.data) < self.min_size
+            if self._skip_message:
+                self.messages_skipped += 1
+            else:
+                self.messages_compressed += 1
+        if self._skip_message:
+            return dataclasses.replace(frame, rsv1=False)
+        return super().encode(frame)
+
+class ThresholdPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    """Server factory for ThresholdPerMessageDeflate that can be disabled per connection"""
+
+    def __init__(self, min_size: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+        self.enabled = True
+
+    def process_request_params(self, params, accepted_extensions) -> Tuple[list, PerMessageDeflate]:
+        if not self.enabled:
+            # websockets treats this as "extension not accepted" and carries on uncompressed
+            raise NegotiationError("compression disabled for this connection")
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size
+        )
+
+def build_deflate_factory() -> ThresholdPerMessageDeflateFactory:
+    return ThresholdPerMessageDeflateFactory(
+        min_size=settings.WS_COMPRESSION_MIN_SIZE,
+        compress_settings={"memLevel": 5, "level": settings.WS_COMPRESSION_LEVEL}
+    )
+
+def _is_local_client(client: Optional[Tuple[str, int]], headers: Headers) -> bool:
+    """Loopback (or Unix socket) peers that are not a reverse proxy forwarding someone else"""
+    if "X-Forwarded-For" in headers or "Forwarded" in headers:
+        return False
+    if client is None:
+        return True
+    try:
+        return ipaddress.ip_address(client[0]).is_loopback
+    except ValueError:
+        return False
+
+class CompressionWebSocketProtocol(WebSocketProtocol):
+    """uvicorn websockets protocol with configurable, per-client permessage-deflate.
+
+    Compression is offered according to WS_COMPRESSION, skipped for messages
+    under WS_COMPRESSION_MIN_SIZE bytes, and declined for local overlay
+    clients on loopback (WS_COMPRESSION_SKIP_LOOPBACK) or for any client
+    that connects with ?compress=0.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deflate_factory = build_deflate_factory() if settings.WS_COMPRESSION else None
+        # Read by the handshake, which starts after connection_made
+        self.available_extensions = [self.deflate_factory] if self.deflate_factory else []
+
+    async def process_request(self, path: str, headers: Headers):
+        if self.deflate_factory:
+            query = parse_qs(path.partition("?")[2])
+            if query.get("compress", ["1"])[0].lower() in ("0", "false"):
+                self.deflate_factory.enabled = False
+            elif settings.WS_COMPRESSION_SKIP_LOOPBACK and _is_local_client(self.client, headers):
+                self.deflate_factory.enabled = False
+        return await super().process_request(path, headers)
@@ -33,24 +33,50 @@ function App() {
   const [chatMessages, setChatMessages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [connectionStatus, setConnectionStatus] = useState('disconnected');
-  const [ttsQueueLength, setTtsQueueLength] = useState(0);
+  const [ttsQueueLength, setTtsQueueLength] = useState(0); // Mensajes en espera en el servidor para este stream
+  const [ttsQueueSize, setTtsQueueSize] = useState(1);
+  const [nowSpeaking, setNowSpeaking] = useState(null);
   const [isProcessingTTSState, setIsProcessingTTSState] = useState(false);
   const [userDisconnected, setUserDisconnected] = useState(false); // Flag to prevent auto-reconnect
   
   // Constants
   const MAX_MESSAGES = 100; // Límite de mensajes para optimizar rendimiento
-  const MAX_TTS_QUEUE = 1; // Máximo 1 mensaje en cola (más el que se está reproduciendo) para evitar retrasos
   
   // Refs
   const wsRef = useRef(null);
+  const wsSession = useRef({ epoch: null, lastSeq: {} }); // Último seq visto por stream, para reanudar al reconectar
   const scrollAreaRef = useRef(null);
   const shouldAutoScroll = useRef(true);
-  const ttsQueue = useRef([]);
-  const isProcessingTTS = useRef(false);
+  const currentAudio = useRef(null);
+  const speakingId = useRef(null); // message_id del último evento tts_speaking
+
+  // Reproducir audio sintetizado en el servidor; resuelve al terminar o si falla
+  const playAudio = (audioUrl) => {
+    return new Promise((resolve) => {
+      const audio = new Audio(audioUrl);
+      currentAudio.current = audio;
+      const finish = () => {
+        if (currentAudio.current === audio) currentAudio.current = null;
+        resolve();
+      };
+      audio.onended = finish;
+      audio.onpause = finish; // detenido por un anuncio nuevo o al desactivar TTS
+      audio.onerror = () => {
+        console.warn(`⚠️ No se pudo reproducir el audio: ${audioUrl}`);
+        finish();
+      };
+      audio.play().catch((error) => {
+        console.warn('⚠️ Reproducción de audio bloqueada:', error);
+        finish();
+      });
+    });
+  };
 
   // Enhanced TTS Setup with Robust Error Handling and Browser API Fix
-  const speak = async (text, user) => {
-    if (!ttsEnabled || !window.speechSynthesis) return;
+  const speak = async (text, user, audioUrl = null) => {
+    if (!ttsEnabled) return;
+    if (audioUrl) return await playAudio(audioUrl);
+    if (!window.speechSynthesis) return;
     
     // Check if Speech Synthesis is available and working
     if (!window.speechSynthesis || window.speechSynthesis.speaking) {
@@ -197,111 +223,40 @@ function App() {
     return await attemptSpeak();
   };
 
-  // Smart TTS Queue Management - Maximum 2 messages (1 playing + 1 waiting)
-  const addToTTSQueue = (text, user) => {
-    if (!ttsEnabled) return;
-    
-    const messageData = { 
-      text, 
-      user, 
-      timestamp: Date.now(),
-      id: Date.now() + Math.random()
-    };
-    
-    console.log(`📨 NEW MESSAGE RECEIVED: "${text}" by ${user} (ID: ${messageData.id})`);
-    console.log(`📊 Current state - isProcessingTTS: ${isProcessingTTS.current}, queueLength: ${ttsQueue.current.length}`);
+  // El servidor decide qué se dice y cuándo (evento tts_speaking): todas las pestañas oyen lo mismo.
+  // Un anuncio nuevo interrumpe lo que aún suene de uno anterior (p. ej. eventos reenviados al reconectar).
+  const playSpeaking = async (data) => {
+    stopPlayback();
+    speakingId.current = data.message_id;
+    setNowSpeaking({ user: data.user, message: data.message });
+    setTtsQueueLength(data.waiting || 0);
+    setTtsQueueSize(data.queue_size || 1);
+    setIsProcessingTTSState(true);
     
-    if (isProcessingTTS.current) {
-      // TTS is currently playing a message
-      if (ttsQueue.current.length === 0) {
-        // No message waiting, add this one to queue
-        console.log(`🎤 TTS is playing, adding message to queue: "${text}" by ${user} (ID: ${messageData.id})`);
-        ttsQueue.current = [messageData];
-        setTtsQueueLength(1);
-      } else {
-        // There's already a message waiting, replace it with the latest one
-        console.log(`🎤 TTS is playing and queue is full, replacing waiting message with latest: "${text}" by ${user} (ID: ${messageData.id})`);
-        const oldMessage = ttsQueue.current[0];
-        console.log(`🗑️ Removing old waiting message: "${oldMessage.text}" by ${oldMessage.user} (ID: ${oldMessage.id})`);
-        ttsQueue.current = [messageData]; // Replace the waiting message
-        setTtsQueueLength(1);
+    try {
+      await speak(data.message, data.user, data.url ? `${BACKEND_URL}${data.url}` : null);
+    } catch (error) {
+      console.error(`❌ Error reproduciendo el mensaje ${data.message_id}:`, error);
+    } finally {
+      if (speakingId.current === data.message_id) {
+        speakingId.current = null;
+        setNowSpeaking(null);
+        setIsProcessingTTSState(false);
       }
-    } else {
-      // TTS is not processing, start immediately
-      console.log(`🎤 Adding message to empty TTS queue and starting: "${text}" by ${user} (ID: ${messageData.id})`);
-      ttsQueue.current = [messageData];
-      setTtsQueueLength(1);
-      processTTSQueue();
     }
   };
 
-  const processTTSQueue = async () => {
-    // Prevent multiple concurrent processing
-    if (isProcessingTTS.current) {
-      console.log('🎤 TTS queue already processing, skipping...');
-      return;
+  // Detener el audio del servidor y la voz del navegador que se estén reproduciendo
+  const stopPlayback = () => {
+    if (currentAudio.current) {
+      currentAudio.current.pause();
+      currentAudio.current = null;
     }
-    
-    if (ttsQueue.current.length === 0) {
-      console.log('🎤 TTS queue is empty');
-      setIsProcessingTTSState(false);
-      return;
-    }
-    
-    console.log(`🎤 Starting TTS processing with ${ttsQueue.current.length} message(s)`);
-    console.log(`📋 Queue contents:`, ttsQueue.current.map(m => `"${m.text}" by ${m.user} (ID: ${m.id})`));
-    
-    isProcessingTTS.current = true;
-    setIsProcessingTTSState(true);
-    
-    try {
-      while (ttsQueue.current.length > 0 && ttsEnabled) {
-        // Take the first message from queue (FIFO - First In, First Out) 
-        const message = ttsQueue.current.shift();
-        setTtsQueueLength(ttsQueue.current.length);
-        
-        console.log(`🎤 Processing TTS message ${message.id}: "${message.text}" by ${message.user}`);
-        console.log(`📊 Queue after shift - remaining messages: ${ttsQueue.current.length}`);
-        
-        try {
-          // Wait for the current message to complete FULLY before proceeding
-          console.log(`⏳ Starting TTS for message ${message.id}...`);
-          await speak(message.text, message.user);
-          console.log(`✅ Completed TTS message ${message.id}: "${message.text}" by ${message.user}`);
-          
-          // Shorter pause after completion to improve responsiveness
-          await new Promise(resolve => setTimeout(resolve, 200));
-          
-        } catch (error) {
-          console.error(`❌ Error processing TTS message ${message.id}:`, error);
-          // Continue with next message even if current one fails
-        }
-        
-        // Check if TTS was disabled during processing
-        if (!ttsEnabled) {
-          console.log('🔇 TTS disabled during processing, stopping queue');
-          break;
-        }
-        
-        // Continue with next message in queue if available
-        if (ttsQueue.current.length > 0) {
-          console.log(`📬 ${ttsQueue.current.length} message(s) remaining in queue`);
-          console.log(`📋 Remaining queue:`, ttsQueue.current.map(m => `"${m.text}" by ${m.user} (ID: ${m.id})`));
-        }
-      }
-    } catch (error) {
-      console.error('❌ Error in TTS queue processing:', error);
-    } finally {
-      isProcessingTTS.current = false;
-      setIsProcessingTTSState(false);
-      setTtsQueueLength(ttsQueue.current.length);
-      console.log(`🏁 TTS processing finished. Remaining messages: ${ttsQueue.current.length}`);
-      
-      // If there are still messages and TTS is enabled, continue processing
-      // This handles cases where new messages arrived while we were processing
-      if (ttsQueue.current.length > 0 && ttsEnabled) {
-        console.log('🔄 More messages in queue, continuing...');
-        setTimeout(() => processTTSQueue(), 100); // Reduced delay for better responsiveness
+    if (window.speechSynthesis?.speaking) {
+      try {
+        window.speechSynthesis.cancel();
+      } catch (error) {
+        console.warn('Error cancelling speech synthesis:', error);
       }
     }
   };
@@ -310,10 +265,17 @@ function App() {
   const clearTTSQueue = () => {
     console.log('🧹 Clearing TTS queue and stopping all speech...');
     
-    // Clear the queue
-    ttsQueue.current = [];
+    // La cola vive en el servidor (se vacía al desactivar TTS); aquí solo se olvida el estado mostrado
+    speakingId.current = null;
+    setNowSpeaking(null);
     setTtsQueueLength(0);
     
+    // Detener el audio del servidor que se esté reproduciendo
+    if (currentAudio.current) {
+      currentAudio.current.pause();
+      currentAudio.current = null;
+    }
+    
     // Aggressive cancellation of any ongoing speech
     if (window.speechSynthesis) {
       try {
@@ -331,7 +293,6 @@ function App() {
     }
     
     // Reset processing flags
-    isProcessingTTS.current = false;
     setIsProcessingTTSState(false);
     
     console.log('✅ TTS queue cleared and speech stopped');
@@ -342,7 +303,17 @@ function App() {
     if (wsRef.current?.readyState === WebSocket.OPEN) return;
 
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = BACKEND_URL.replace(/^https?:/, wsProtocol) + '/api/ws';
+    // batch=1: durante ráfagas de comentarios el servidor agrupa varios eventos en un solo frame
+    const params = new URLSearchParams({ batch: '1' });
+    
+    // Reanudar desde el último evento recibido para no perder mensajes durante la reconexión
+    const { epoch, lastSeq } = wsSession.current;
+    const resume = Object.entries(lastSeq).map(([stream, seq]) => `${stream}:${seq}`).join(',');
+    if (epoch && resume) {
+      params.set('epoch', epoch);
+      params.set('resume', resume);
+    }
+    const wsUrl = BACKEND_URL.replace(/^https?:/, wsProtocol) + '/api/ws?' + params.toString();
     
     wsRef.current = new WebSocket(wsUrl);
 
@@ -351,13 +322,38 @@ function App() {
       setConnectionStatus('websocket_connected');
     };
 
-    wsRef.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
+    const handleEvent = (data) => {
+      // Descartar eventos repetidos y recordar el último seq de cada stream
+      if (data.seq !== undefined) {
+        const lastSeq = wsSession.current.lastSeq;
+        if (data.seq <= (lastSeq[data.stream] || 0)) return;
+        lastSeq[data.stream] = data.seq;
+      }
       
       switch (data.type) {
+        case 'hello':
+          if (wsSession.current.epoch !== data.epoch) {
+            // El servidor se reinició: los seq anteriores ya no son válidos
+            wsSession.current = { epoch: data.epoch, lastSeq: {} };
+          }
+          break;
+          
+        case 'ping':
+          // Heartbeat del servidor: responder para no ser desconectado por inactividad
+          if (wsRef.current?.readyState === WebSocket.OPEN) {
+            wsRef.current.send(JSON.stringify({ type: 'pong' }));
+          }
+          break;
+          
+        case 'resync_required':
+          console.warn(`Hueco demasiado antiguo en el stream ${data.stream}, continuando desde seq ${data.seq}`);
+          wsSession.current.epoch = data.epoch;
+          wsSession.current.lastSeq[data.stream] = data.seq;
+          break;
+          
         case 'chat_message':
           const newMessage = {
-            id: Date.now() + Math.random(),
+            id: data.id || Date.now() + Math.random(),
             user: data.user,
             message: data.message,
             timestamp: new Date(data.timestamp)
@@ -368,10 +364,13 @@ function App() {
             // Mantener solo los últimos MAX_MESSAGES mensajes
             return updated.slice(0, MAX_MESSAGES);
           });
+          break;
           
-          // TTS for new messages - add to queue instead of immediate playback
-          if (data.tts_enabled && ttsEnabled) {
-            addToTTSQueue(data.message, data.user);
+        case 'tts_speaking':
+          // Mensaje elegido por el servidor; sin url lo dice la voz del navegador.
+          // Los eventos reenviados al reanudar ya sonaron: reproducirlos ahora sería audio viejo
+          if (ttsEnabled && !data.replayed) {
+            playSpeaking(data);
           }
           break;
           
@@ -385,7 +384,10 @@ function App() {
           } else {
             setCurrentUsername('');
             setConnectionStatus('disconnected');
-            if (data.error) {
+            if (data.reconnecting) {
+              // El backend reintenta solo, con espera exponencial
+              toast.warning(`${data.error} Reintentando en ${data.retry_in}s (intento ${data.attempt})`);
+            } else if (data.error) {
               toast.error(`Error: ${data.error}`);
             } else {
               toast.info('Desconectado de TikTok Live');
@@ -400,6 +402,12 @@ function App() {
       }
     };
 
+    wsRef.current.onmessage = (event) => {
+      const payload = JSON.parse(event.data);
+      // Un frame puede traer un solo evento o un arreglo de eventos agrupados
+      (Array.isArray(payload) ? payload : [payload]).forEach(handleEvent);
+    };
+
     wsRef.current.onclose = () => {
       console.log('WebSocket desconectado');
       setConnectionStatus('disconnected');
@@ -824,11 +832,11 @@ function App() {
                         <div className="w-full bg-gray-700 rounded-full h-1.5">
                           <div 
                             className="bg-gradient-to-r from-blue-500 to-purple-500 h-1.5 rounded-full transition-all duration-300"
-                            style={{ width: `${Math.min((ttsQueueLength / MAX_TTS_QUEUE) * 100, 100)}%` }}
+                            style={{ width: `${Math.min((ttsQueueLength / ttsQueueSize) * 100, 100)}%` }}
                           ></div>
                         </div>
                         <div className="text-xs text-gray-400 mt-1">
-                          {isProcessingTTSState ? 'Reproduciendo mensaje...' : 'Mensaje en espera'}
+                          {nowSpeaking ? `Reproduciendo mensaje de ${nowSpeaking.user}...` : 'Mensaje en espera'}
                         </div>
                       </div>
                     )}
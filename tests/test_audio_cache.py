@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+
+from services.audio_cache import AudioCache, audio_key
+
+
+def key(n):
+    return audio_key(f"clip {n}", "voice")
+
+
+def test_memory_then_disk_then_miss(tmp_path):
+    async def scenario():
+        cache = AudioCache(directory=str(tmp_path), memory_bytes=100, disk_bytes=10_000)
+        await cache.put(key(1), b"a" * 60)
+        await cache.put(key(2), b"b" * 60)  # evicts clip 1 from memory, both stay on disk
+        assert await cache.get(key(2)) == b"b" * 60
+        assert await cache.get(key(1)) == b"a" * 60
+        assert await cache.get(key(3)) is None
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert (cache.memory_hits, cache.disk_hits, cache.misses) == (1, 1, 1)
+
+
+def test_disk_only_clips_stay_out_of_memory(tmp_path):
+    async def scenario():
+        cache = AudioCache(directory=str(tmp_path), memory_bytes=1000, disk_bytes=10_000)
+        await cache.put(key(1), b"joined", memory=False)
+        assert cache.stats()["memory_entries"] == 0
+        assert await cache.peek(key(1)) == b"joined"
+        # Without a disk tier it has to live in memory to be served at all
+        no_disk = AudioCache(directory=str(tmp_path / "unused"), memory_bytes=1000, disk_bytes=0)
+        await no_disk.put(key(2), b"joined", memory=False)
+        assert await no_disk.peek(key(2)) == b"joined"
+
+    asyncio.run(scenario())
+
+
+def test_disk_tier_stays_within_budget(tmp_path):
+    async def scenario():
+        cache = AudioCache(directory=str(tmp_path), memory_bytes=0, disk_bytes=1000)
+        for n in range(30):
+            await cache.put(key(n), bytes(100))
+        return cache
+
+    cache = asyncio.run(scenario())
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert on_disk <= 1000
+    assert cache.stats()["disk_bytes"] == on_disk
+    assert cache.disk_evictions > 0
+
+
+def test_rewriting_a_clip_does_not_count_it_twice(tmp_path):
+    async def scenario():
+        cache = AudioCache(directory=str(tmp_path), memory_bytes=0, disk_bytes=1000)
+        for _ in range(20):
+            await cache.put(key(1), bytes(100))
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.stats()["disk_bytes"] == 100
+    assert cache.disk_evictions == 0
+
+
+def test_concurrent_writes_of_one_clip(tmp_path):
+    cache = AudioCache(directory=str(tmp_path), memory_bytes=0, disk_bytes=100_000_000)
+    audio = bytes(4_000_000)
+    start = threading.Barrier(8)
+
+    def write():
+        start.wait()
+        cache._write_disk(key(1), audio)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # One clip, counted once, and no temp files left behind
+    assert os.listdir(tmp_path) == [f"{key(1)}.wav"]
+    assert cache.stats()["disk_bytes"] == len(audio)
+
+
+def test_keys_must_be_content_addresses(tmp_path):
+    async def scenario():
+        cache = AudioCache(directory=str(tmp_path), memory_bytes=0, disk_bytes=1000)
+        await cache.put("../escape", b"x")
+        return await cache.peek("../escape")
+
+    assert asyncio.run(scenario()) is None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from services.backplane import UnixSocketBackplane
+
+
+class Worker:
+    """A backplane peer that records the events delivered to it"""
+
+    def __init__(self, path):
+        self.events = []
+        self.backplane = UnixSocketBackplane(self.receive, path=path, reconnect_delay=0.05)
+
+    async def receive(self, event):
+        self.events.append(event)
+
+    def received(self):
+        return [event["n"] for event in self.events]
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_events_reach_every_worker_in_the_same_order(tmp_path):
+    async def scenario():
+        first, second = Worker(str(tmp_path / "bp.sock")), Worker(str(tmp_path / "bp.sock"))
+        for worker in (first, second):
+            await worker.backplane.start()
+        await wait_until(lambda: first.backplane.connected and second.backplane.connected)
+
+        await first.backplane.publish({"n": 1})
+        await second.backplane.publish({"n": 2})
+        await first.backplane.publish({"n": 3})
+        await wait_until(lambda: len(first.events) == 3 and len(second.events) == 3)
+
+        roles = sorted(worker.backplane.stats()["role"] for worker in (first, second))
+        for worker in (first, second):
+            await worker.backplane.stop()
+        return first, second, roles
+
+    first, second, roles = asyncio.run(scenario())
+    # Publishers race each other to the broker, but whatever order it relays is the same everywhere
+    assert first.received() == second.received()
+    assert sorted(first.received()) == [1, 2, 3]
+    assert roles == ["broker", "peer"]
+    assert first.backplane.local_only == second.backplane.local_only == 0
+
+
+def test_another_worker_takes_over_when_the_broker_exits(tmp_path):
+    async def scenario():
+        workers = [Worker(str(tmp_path / "bp.sock")) for _ in range(3)]
+        for worker in workers:
+            await worker.backplane.start()
+        await wait_until(lambda: all(worker.backplane.connected for worker in workers))
+        [broker] = [worker for worker in workers if worker.backplane.is_broker]
+        survivors = [worker for worker in workers if worker is not broker]
+
+        await broker.backplane.stop()
+        await wait_until(lambda: any(worker.backplane.is_broker for worker in survivors)
+                         and all(worker.backplane.connected for worker in survivors))
+        await survivors[0].backplane.publish({"n": 1})
+        await survivors[1].backplane.publish({"n": 2})
+        await wait_until(lambda: all(len(worker.events) == 2 for worker in survivors))
+
+        for worker in survivors:
+            await worker.backplane.stop()
+        return broker, survivors
+
+    broker, survivors = asyncio.run(scenario())
+    first, second = (worker.received() for worker in survivors)
+    assert first == second and sorted(first) == [1, 2]
+    assert broker.events == []
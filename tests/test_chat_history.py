@@ -0,0 +1,46 @@
+from models.chat_message import decode_history_cursor, encode_history_cursor
+from services.chat_history_cache import ChatHistoryCache
+
+from .test_history_cursor import TIMESTAMPS, make_messages
+
+
+def cache_with(timestamps, capacity):
+    cache = ChatHistoryCache(capacity=capacity)
+    messages = make_messages(timestamps)
+    for message in messages:
+        cache.add(message)
+    return cache, messages
+
+
+def position(message):
+    return decode_history_cursor(encode_history_cursor(message.timestamp, message.id))
+
+
+def page_ids(result):
+    entries, has_more = result
+    return [formatted["id"] for _, formatted in entries], has_more
+
+
+def test_cache_pages_before_within_window():
+    cache, messages = cache_with(TIMESTAMPS, capacity=100)
+    # m00 is the only message at the oldest cached millisecond: positions after it are complete
+    assert page_ids(cache.page(3)) == (["m06", "m05", "m04"], True)
+    assert page_ids(cache.page(2, before=position(messages[4]))) == (["m03", "m02"], True)
+    # A page that would take every cached message left cannot tell whether older ones exist
+    assert cache.page(3, before=position(messages[4])) is None
+    assert cache.misses == 1
+
+
+def test_cache_misses_when_the_oldest_millisecond_was_partly_evicted():
+    # Capacity 5 keeps m02..m06; m01 (same millisecond as m02..m04) was evicted
+    cache, messages = cache_with(TIMESTAMPS, capacity=5)
+    assert page_ids(cache.page(1)) == (["m06"], True)
+    assert cache.page(2) is None
+
+
+def test_cache_pages_after():
+    cache, messages = cache_with(TIMESTAMPS, capacity=100)
+    assert page_ids(cache.page(2, after=position(messages[2]))) == (["m04", "m03"], True)
+    assert page_ids(cache.page(5, after=position(messages[2]))) == (["m06", "m05", "m04", "m03"], False)
+    # An after position at or before the oldest cached millisecond goes to the database
+    assert cache.page(2, after=position(messages[0])) is None
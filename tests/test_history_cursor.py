@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.chat_message import ChatMessage, decode_history_cursor, encode_history_cursor
+from routes import chat_routes
+from services.chat_history_cache import ChatHistoryCache
+from services.database import db_service
+
+START = datetime(2024, 5, 1, 20, 0, 0, 123000)
+
+
+def make_messages(timestamps, stream="streamer"):
+    """ChatMessages with fixed ids (m00, m01, ...) and timestamps given as millisecond offsets from START"""
+    messages = []
+    for i, offset in enumerate(timestamps):
+        message = ChatMessage(user=f"user{i % 2}", message=f"message {i}", username_stream=stream)
+        message.id = f"m{i:02d}"
+        message.timestamp = START + timedelta(milliseconds=offset)
+        messages.append(message)
+    return messages
+
+
+# Four messages share one millisecond, so only the id tells them apart
+TIMESTAMPS = [0, 1, 1, 1, 1, 2, 3]
+
+
+def compare(value, condition):
+    if isinstance(condition, dict):
+        return all({"$lt": value < bound, "$gt": value > bound}[op] for op, bound in condition.items())
+    return value == condition
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif not compare(document.get(field), condition):
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeChatMessages:
+    """Just enough of a collection for DatabaseService.get_chat_history"""
+
+    def __init__(self, documents):
+        self.stored = documents
+
+    def find(self, query):
+        return FakeCursor([dict(document) for document in self.stored if matches(document, query)])
+
+
+class FakeDb:
+    def __init__(self, documents):
+        self.chat_messages = FakeChatMessages(documents)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Serve /api/chat-history from the fake collection (cache disabled) and return a page fetcher"""
+    monkeypatch.setattr(db_service, "db", FakeDb([message.to_dict() for message in make_messages(TIMESTAMPS)]))
+    monkeypatch.setattr(chat_routes, "chat_history_cache", ChatHistoryCache(capacity=0))
+
+    def fetch(limit, before=None, after=None):
+        return asyncio.run(chat_routes.get_chat_history(limit=limit, before=before, after=after, username_stream=None, user=None))
+
+    return fetch
+
+
+def ids(page):
+    return [message["id"] for message in page["messages"]]
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 20, 0, 0, 123456)
+    cursor = encode_history_cursor(timestamp, "abc-123")
+    assert "=" not in cursor
+    # Positions keep MongoDB's millisecond precision
+    assert decode_history_cursor(cursor) == (datetime(2024, 5, 1, 20, 0, 0, 123000), "abc-123")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_history_cursor(START, "x")[:-3]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
+
+
+def test_database_pages_backwards_through_equal_timestamps(history):
+    first = history(3)
+    assert ids(first) == ["m06", "m05", "m04"]
+    assert first["has_more"]
+
+    second = history(3, before=first["before_cursor"])
+    assert ids(second) == ["m03", "m02", "m01"]
+    assert second["has_more"]
+
+    last = history(3, before=second["before_cursor"])
+    assert ids(last) == ["m00"]
+    assert not last["has_more"]
+
+
+def test_database_exact_page_has_no_more(history):
+    page = history(7)
+    assert len(ids(page)) == 7
+    assert not page["has_more"]
+    assert history(6)["has_more"]
+
+
+def test_database_pages_forwards_with_after(history):
+    oldest = history(2, before=history(5)["before_cursor"])
+    assert ids(oldest) == ["m01", "m00"]
+
+    newer = history(3, after=oldest["after_cursor"])
+    # Newest first, starting right after m01 even though m02..m04 share its millisecond
+    assert ids(newer) == ["m04", "m03", "m02"]
+    assert newer["has_more"]
+
+    newest = history(3, after=newer["after_cursor"])
+    assert ids(newest) == ["m06", "m05"]
+    assert not newest["has_more"]
+
+    # Polling from the newest position returns nothing and keeps the cursor
+    empty = history(3, after=newest["after_cursor"])
+    assert ids(empty) == []
+    assert empty["after_cursor"] == newest["after_cursor"]
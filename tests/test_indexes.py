@@ -0,0 +1,84 @@
+import asyncio
+
+from pymongo import ASCENDING, DESCENDING
+
+from services.database import CHAT_MESSAGE_INDEXES, SUPERSEDED_CHAT_MESSAGE_INDEXES, DatabaseService
+
+
+class FakeIndexedCollection:
+    """Keeps indexes as name -> key list, reported the way index_information() does"""
+
+    def __init__(self, indexes=None):
+        self.indexes = {"_id_": [("_id", ASCENDING)]}
+        self.indexes.update(indexes or {})
+        self.created = []
+        self.dropped = []
+        self.fail_create = set()
+
+    async def create_index(self, keys, name):
+        if name in self.fail_create:
+            raise RuntimeError(f"cannot build {name}")
+        self.created.append(name)
+        self.indexes[name] = list(keys)
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+        del self.indexes[name]
+
+    async def index_information(self):
+        # The server reports directions as floats
+        return {name: {"key": [(field, float(direction)) for field, direction in keys], "v": 2}
+                for name, keys in self.indexes.items()}
+
+
+class FakeDb:
+    def __init__(self, collection):
+        self.chat_messages = collection
+
+
+def service_with(collection):
+    service = DatabaseService()
+    service.db = FakeDb(collection)
+    return service
+
+
+def test_ensure_indexes_creates_history_indexes_and_drops_superseded_ones():
+    collection = FakeIndexedCollection({
+        "username_stream_timestamp": [("username_stream", ASCENDING), ("timestamp", DESCENDING)],
+        "timestamp": [("timestamp", DESCENDING)],
+        "user_1": [("user", ASCENDING)],
+    })
+    service = service_with(collection)
+
+    async def scenario():
+        await service.ensure_indexes()
+        return await service.check_indexes()
+
+    assert asyncio.run(scenario()) == []
+    assert collection.created == [name for name, _ in CHAT_MESSAGE_INDEXES]
+    assert sorted(collection.dropped) == sorted(SUPERSEDED_CHAT_MESSAGE_INDEXES)
+    # Indexes the service does not manage are left alone
+    assert "user_1" in collection.indexes
+
+
+def test_check_indexes_reports_missing_key_patterns():
+    stream_keys = dict(CHAT_MESSAGE_INDEXES)["username_stream_timestamp_id"]
+    # Matched by key pattern, not by name
+    service = service_with(FakeIndexedCollection({"created_by_hand": stream_keys}))
+    assert service.missing_indexes is None
+
+    missing = asyncio.run(service.check_indexes())
+    assert missing == ["user_timestamp_id", "timestamp_id"]
+    assert service.missing_indexes == missing
+
+
+def test_failed_index_build_is_reported_missing():
+    collection = FakeIndexedCollection()
+    collection.fail_create.add("timestamp_id")
+    service = service_with(collection)
+
+    async def scenario():
+        await service.ensure_indexes()
+        return await service.check_indexes()
+
+    assert asyncio.run(scenario()) == ["timestamp_id"]
@@ -0,0 +1,78 @@
+import asyncio
+
+from models.chat_message import ChatMessage
+from services import tiktok_service as tiktok_service_module
+from services.ingestion_pipeline import IngestionPipeline
+from services.tiktok_service import TikTokService
+
+
+class RecordingSinks:
+    """Stands in for the WebSocket manager, database and TTS service, recording what reaches them"""
+
+    def __init__(self):
+        self.broadcast = []
+        self.saved = []
+        self.spoken = []
+
+    def add_listener(self, message_type, callback):
+        pass
+
+    async def broadcast_json(self, data, stream=None):
+        self.broadcast.append(data)
+
+    async def save_chat_message(self, chat_message):
+        self.saved.append(chat_message)
+
+    async def handle_chat_message(self, chat_message):
+        self.spoken.append(chat_message)
+
+
+def make_service(pipeline):
+    sinks = RecordingSinks()
+    service = TikTokService()
+    service.set_dependencies(sinks, sinks, pipeline)
+    return service, sinks
+
+
+def test_full_pipeline_drops_instead_of_processing_inline():
+    async def scenario():
+        pipeline = IngestionPipeline(queue_size=1)
+        service, sinks = make_service(pipeline)
+        await pipeline.start()
+        # The dispatcher has not run yet: the first message fills the ingress queue
+        await service._handle_chat_message("ana", "uno", "streamer")
+        await service._handle_chat_message("ana", "dos", "streamer")
+        assert pipeline.dropped == 1
+        assert sinks.broadcast == []  # nothing was handled inline on the caller
+        await pipeline.stop()
+        return sinks
+
+    sinks = asyncio.run(scenario())
+    assert [event["message"] for event in sinks.broadcast] == ["uno"]
+
+
+def test_messages_are_processed_inline_without_a_running_pipeline(monkeypatch):
+    async def scenario():
+        service, sinks = make_service(IngestionPipeline())
+        monkeypatch.setattr(tiktok_service_module, "tts_service", sinks)
+        await service._handle_chat_message("ana", "hola", "streamer")
+        return sinks
+
+    sinks = asyncio.run(scenario())
+    assert [event["message"] for event in sinks.broadcast] == ["hola"]
+    assert [message.message for message in sinks.saved] == ["hola"]
+    assert [message.message for message in sinks.spoken] == ["hola"]
+
+
+def test_submit_counts_only_real_drops():
+    async def scenario():
+        pipeline = IngestionPipeline(queue_size=1)
+        assert not pipeline.submit(ChatMessage("ana", "antes", "s"))  # not running: not a drop
+        await pipeline.start()
+        assert pipeline.submit(ChatMessage("ana", "uno", "s"))
+        assert not pipeline.submit(ChatMessage("ana", "dos", "s"))
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert (pipeline.submitted, pipeline.dropped) == (1, 1)
@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import zlib
+
+import bson
+
+from services.spill_log import FSYNC_NEVER, RECORD_HEADER, SpillLog
+
+
+def open_log(directory, segment_bytes=1 << 20):
+    return SpillLog(str(directory), segment_bytes, FSYNC_NEVER)
+
+
+def replay_all(log):
+    """What replay_spill does with a SpillLog: claim, read and remove every replayable segment"""
+    documents = []
+    for path in log.segments():
+        handle = log.claim(path)
+        if handle is None:
+            continue
+        try:
+            documents.extend(log.read_segment(path))
+            log.remove(path)
+        finally:
+            log.release(handle)
+    return documents
+
+
+def test_records_are_length_crc_and_bson(tmp_path):
+    log = open_log(tmp_path)
+    log.append([{"n": 1}, {"n": 2, "user": "ana"}])
+    log.seal()
+
+    [path] = log.segments()
+    data = open(path, "rb").read()
+    payload = bson.encode({"n": 1})
+    assert data[:RECORD_HEADER.size] == RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+    assert data[RECORD_HEADER.size:RECORD_HEADER.size + len(payload)] == payload
+    assert log.read_segment(path) == [{"n": 1}, {"n": 2, "user": "ana"}]
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    log = open_log(tmp_path)
+    log.append([{"n": 1}, {"n": 2}])
+    log.seal()
+    [path] = log.segments()
+    # Crash mid-append: the last record lost its end
+    os.truncate(path, os.path.getsize(path) - 3)
+    assert log.read_segment(path) == [{"n": 1}]
+
+
+def test_bad_crc_stops_reading(tmp_path):
+    log = open_log(tmp_path)
+    log.append([{"n": 1}, {"n": 2}, {"n": 3}])
+    log.seal()
+    [path] = log.segments()
+    data = bytearray(open(path, "rb").read())
+    second = RECORD_HEADER.size + len(bson.encode({"n": 1}))
+    data[second + RECORD_HEADER.size + 5] ^= 0xFF
+    open(path, "wb").write(data)
+    assert log.read_segment(path) == [{"n": 1}]
+
+
+def test_seal_and_remove(tmp_path):
+    log = open_log(tmp_path, segment_bytes=64)
+    log.append([{"n": 1}])
+    # The active segment is not replayable until sealed
+    assert log.segments() == []
+    assert log.has_pending()
+
+    log.append([{"text": "x" * 64}])  # crosses segment_bytes, which seals it
+    assert len(log.segments()) == 1
+    log.append([{"n": 2}])
+    log.seal()
+    assert len(log.segments()) == 2
+
+    assert replay_all(log) == [{"n": 1}, {"text": "x" * 64}, {"n": 2}]
+    assert log.segments() == []
+    assert not log.has_pending()
+
+
+def test_claimed_segment_is_not_claimed_twice(tmp_path):
+    log = open_log(tmp_path)
+    log.append([{"n": 1}])
+    log.seal()
+    [path] = log.segments()
+
+    handle = log.claim(path)
+    assert handle is not None
+    assert log.claim(path) is None
+    log.remove(path)
+    log.release(handle)
+    assert log.claim(path) is None
+
+
+def spill_and_wait(directory, ready, done):
+    """Another worker: one sealed segment and one still being written"""
+    log = open_log(directory)
+    log.append([{"writer": "other", "n": 1}])
+    log.seal()
+    log.append([{"writer": "other", "n": 2}])
+    ready.set()
+    done.wait(30)
+    # Exits without sealing, as a worker that dies would
+
+
+def test_two_writers_sharing_a_directory(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    ready, done = context.Event(), context.Event()
+    other = context.Process(target=spill_and_wait, args=(str(tmp_path), ready, done))
+    other.start()
+    try:
+        assert ready.wait(30)
+        log = open_log(tmp_path)
+        log.append([{"writer": "this", "n": 1}])
+        log.seal()
+        log.append([{"writer": "this", "n": 2}])
+
+        # The other writer is alive: none of its segments are ours to replay
+        assert replay_all(log) == [{"writer": "this", "n": 1}]
+        assert len(os.listdir(tmp_path)) == 3
+
+        # Even if listed, its active segment cannot be claimed while it writes
+        others = sorted(os.path.join(tmp_path, name) for name in os.listdir(tmp_path) if f"-{other.pid}-" in name)
+        assert len(others) == 2
+        assert log.claim(others[-1]) is None
+    finally:
+        done.set()
+        other.join(30)
+
+    # Once it is gone both of its segments are orphans this worker replays
+    log.seal()
+    assert replay_all(log) == [{"writer": "other", "n": 1}, {"writer": "other", "n": 2}, {"writer": "this", "n": 2}]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+
+from services import tiktok_service as tiktok_service_module
+from services.stream_lease import StreamLeaseManager
+
+
+def hold_lease(directory, key, ready, done):
+    """Another worker holding a stream's lease until it exits"""
+    leases = StreamLeaseManager(directory, enabled=True)
+    assert leases.acquire(key)
+    ready.set()
+    done.wait(30)
+
+
+def test_only_one_worker_holds_a_lease(tmp_path):
+    first = StreamLeaseManager(str(tmp_path), enabled=True)
+    second = StreamLeaseManager(str(tmp_path), enabled=True)
+
+    assert first.acquire("alice")
+    assert first.acquire("alice")  # already ours
+    assert not second.acquire("alice")
+    assert second.contended == 1
+    assert first.owns("alice") and not second.owns("alice")
+    assert second.owner("alice") == os.getpid()
+
+    # Releasing hands the stream to whoever polls next
+    first.release("alice")
+    assert first.owner("alice") is None
+    assert second.acquire("alice")
+
+
+def test_lease_of_a_dead_worker_is_taken_over(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    ready, done = context.Event(), context.Event()
+    other = context.Process(target=hold_lease, args=(str(tmp_path), "alice", ready, done))
+    other.start()
+    leases = StreamLeaseManager(str(tmp_path), enabled=True)
+    try:
+        assert ready.wait(30)
+        assert leases.owner("alice") == other.pid
+        assert not leases.acquire("alice")
+    finally:
+        other.kill()
+        other.join(30)
+
+    # flock locks die with their process
+    assert leases.owner("alice") is None
+    assert leases.acquire("alice")
+    assert leases.owner("alice") == os.getpid()
+
+
+def test_wanted_streams_and_primary_are_shared(tmp_path):
+    first = StreamLeaseManager(str(tmp_path), enabled=True)
+    second = StreamLeaseManager(str(tmp_path), enabled=True)
+
+    first.want("alice", "@Alice")
+    first.want("bob", "bob")
+    assert second.wanted() == {"alice": "@Alice", "bob": "bob"}
+    assert second.is_wanted("alice")
+    second.unwant("alice")
+    assert first.wanted() == {"bob": "bob"}
+
+    first.set_primary("carol")
+    assert second.primary() == "carol"
+    second.set_primary(None)
+    assert first.primary() is None
+
+
+def test_disabled_leases_share_nothing(tmp_path):
+    leases = StreamLeaseManager(str(tmp_path / "unused"), enabled=False)
+    assert leases.acquire("alice")
+    assert StreamLeaseManager(str(tmp_path / "unused"), enabled=False).acquire("alice")
+    leases.want("alice", "alice")
+    assert leases.wanted() == {}
+    assert leases.is_wanted("bob")
+    assert not os.path.exists(tmp_path / "unused")
+
+
+class IdleClient:
+    """A TikTok client that connects and then stays quiet"""
+
+    def __init__(self, unique_id):
+        self.unique_id = unique_id
+
+    def on(self, event_type):
+        return lambda handler: handler
+
+    async def start(self):
+        return asyncio.create_task(asyncio.sleep(3600))
+
+    async def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    """The TikTokService singleton following streams through leases in tmp_path"""
+    service = tiktok_service_module.TikTokService()
+    monkeypatch.setattr(service, "_streams", {})
+    monkeypatch.setattr(service, "_primary", None)
+    monkeypatch.setattr(service, "_websocket_manager", None)
+    monkeypatch.setattr(service, "_pipeline", None)
+    monkeypatch.setattr(service, "client_factory", IdleClient)
+    monkeypatch.setattr(tiktok_service_module, "stream_leases", StreamLeaseManager(str(tmp_path), enabled=True))
+    return service
+
+
+def test_service_follows_only_streams_it_holds_and_takes_over(service, tmp_path):
+    other_worker = StreamLeaseManager(str(tmp_path), enabled=True)
+
+    async def scenario():
+        other_worker.want("alice", "alice")
+        assert other_worker.acquire("alice")
+
+        # Wanted here too, but the other worker keeps serving it
+        assert await service.connect_stream("alice")
+        assert "alice" not in service._streams
+        assert service.list_streams() == [{"username": "alice", "connected": None, "owner_pid": os.getpid()}]
+
+        # Its owner goes away: the next reconcile takes the stream over
+        other_worker.release("alice")
+        await service.reconcile_leases()
+        assert "alice" in service._streams
+        assert service.get_stream_status("alice")["owner_pid"] == os.getpid()
+
+        # Disconnected through the other worker: the client stops here and the lease is free
+        other_worker.unwant("alice")
+        await service.reconcile_leases()
+        assert "alice" not in service._streams
+        assert other_worker.acquire("alice")
+
+    asyncio.run(scenario())
@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+from TikTokLive.client.errors import UserOfflineError
+
+from config.settings import settings
+from services import tiktok_service as tiktok_service_module
+from services.stream_lease import StreamLeaseManager
+from services.tiktok_stream import FAILURE_NOT_FOUND, FAILURE_OFFLINE, FAILURE_TRANSIENT, TikTokStream, reconnect_delay
+
+
+class FakeTikTokClient:
+    """Plays one step of a shared script per start(): an error to raise, "drop" or "ok" (stays connected)"""
+
+    def __init__(self, script, unique_id):
+        self.script = script
+        self.unique_id = unique_id
+        self.handlers = {}
+
+    def on(self, event_type):
+        def register(handler):
+            self.handlers[event_type.__name__] = handler
+            return handler
+        return register
+
+    async def start(self):
+        self.script.starts += 1
+        step = self.script.pop(0) if self.script else "ok"
+        if isinstance(step, Exception):
+            raise step
+
+        async def run():
+            await self.handlers["ConnectEvent"](type("ConnectEvent", (), {"unique_id": self.unique_id})())
+            if step == "drop":
+                await asyncio.sleep(0.01)
+                await self.handlers["DisconnectEvent"](type("DisconnectEvent", (), {})())
+                return
+            await asyncio.sleep(3600)
+        return asyncio.create_task(run())
+
+    async def disconnect(self):
+        pass
+
+
+class Script(list):
+    starts = 0
+
+
+class RecordingManager:
+    def __init__(self):
+        self.events = []
+
+    def add_listener(self, message_type, callback):
+        pass
+
+    async def broadcast_json(self, data, stream=None):
+        self.events.append(data)
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    """The TikTokService singleton with fast retries, fake clients and no other workers"""
+    for name, value in (("TIKTOK_RECONNECT_BASE_DELAY", 0.01), ("TIKTOK_RECONNECT_MAX_DELAY", 0.04),
+                        ("TIKTOK_RECONNECT_OFFLINE_DELAY", 0.02), ("TIKTOK_RECONNECT_OFFLINE_MAX_DELAY", 0.04),
+                        ("TIKTOK_RECONNECT_MAX_RETRIES", 3)):
+        monkeypatch.setattr(settings, name, value)
+    service = tiktok_service_module.TikTokService()
+    monkeypatch.setattr(service, "_streams", {})
+    monkeypatch.setattr(service, "_primary", None)
+    monkeypatch.setattr(tiktok_service_module, "stream_leases", StreamLeaseManager(str(tmp_path), enabled=False))
+    monkeypatch.setattr(service, "_websocket_manager", RecordingManager())
+    monkeypatch.setattr(service, "_pipeline", None)
+    monkeypatch.setattr(service, "script", Script(), raising=False)
+    monkeypatch.setattr(service, "client_factory", lambda unique_id: FakeTikTokClient(service.script, unique_id))
+    return service
+
+
+def test_reconnect_delay_grows_with_jitter_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_BASE_DELAY", 1.0)
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_MAX_DELAY", 8.0)
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_OFFLINE_DELAY", 30.0)
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_OFFLINE_MAX_DELAY", 300.0)
+    for attempt, ceiling in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (10, 8.0)):
+        delays = [reconnect_delay(attempt, FAILURE_TRANSIENT) for _ in range(200)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+    assert 15.0 <= reconnect_delay(1, FAILURE_OFFLINE) <= 30.0
+    assert 150.0 <= reconnect_delay(20, FAILURE_OFFLINE) <= 300.0
+
+
+@pytest.mark.parametrize("error, failure", [
+    (None, FAILURE_TRANSIENT),
+    (OSError("connection reset"), FAILURE_TRANSIENT),
+    (UserOfflineError(), FAILURE_OFFLINE),
+    (Exception("Failed to parse room ID"), FAILURE_NOT_FOUND),
+])
+def test_classify_error(error, failure):
+    assert TikTokStream(None, "alice")._classify_error(error) == failure
+
+
+def test_transient_errors_and_drops_reconnect(service):
+    async def scenario():
+        service.script[:] = [OSError("reset"), OSError("reset"), "drop", OSError("reset"), "ok"]
+        await service.connect_stream("alice")
+        await asyncio.sleep(0.5)
+        status = service.get_stream_status("alice")
+        await service.disconnect_stream("alice")
+        return status
+
+    status = asyncio.run(scenario())
+    assert status["connected"]
+    assert service.script.starts == 5
+    # The drop came after a successful connection, so the retry budget started over
+    assert status["reconnect_attempts"] == 0
+    retries = [event["attempt"] for event in service._websocket_manager.events if event.get("reconnecting")]
+    assert retries == [1, 2, 1, 2]
+
+
+def test_a_drop_is_reported_once(service):
+    async def scenario():
+        service.script[:] = ["drop", "ok"]
+        await service.connect_stream("erin")
+        await asyncio.sleep(0.2)
+        events = list(service._websocket_manager.events)
+        await service.disconnect_stream("erin")
+        return events
+
+    statuses = [event for event in asyncio.run(scenario()) if event["type"] == "connection_status"]
+    # connected, dropped (reported by the supervisor with its retry plan), connected again
+    assert [event["connected"] for event in statuses] == [True, False, True]
+    assert statuses[1]["reconnecting"]
+
+
+def test_offline_stream_gives_up_after_max_retries(service):
+    async def scenario():
+        service.script[:] = [UserOfflineError()] * 10
+        await service.connect_stream("bob")
+        await asyncio.sleep(0.5)
+        status = service.get_stream_status("bob")
+        await service.disconnect_stream("bob")
+        return status
+
+    status = asyncio.run(scenario())
+    assert service.script.starts == settings.TIKTOK_RECONNECT_MAX_RETRIES + 1
+    assert status["task_done"] and not status["connected"]
+    outcomes = [event["reconnecting"] for event in service._websocket_manager.events if "reconnecting" in event]
+    assert outcomes == [True] * settings.TIKTOK_RECONNECT_MAX_RETRIES + [False]
+
+
+def test_missing_stream_is_not_retried(service):
+    async def scenario():
+        service.script[:] = [Exception("Failed to parse room ID"), "ok"]
+        await service.connect_stream("carol")
+        await asyncio.sleep(0.2)
+        await service.disconnect_stream("carol")
+
+    asyncio.run(scenario())
+    assert service.script.starts == 1
+
+
+def test_disconnect_during_backoff_stops_retrying(service, monkeypatch):
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_BASE_DELAY", 0.2)
+    monkeypatch.setattr(settings, "TIKTOK_RECONNECT_MAX_DELAY", 0.2)
+
+    async def scenario():
+        service.script[:] = [OSError("reset")] * 5
+        await service.connect_stream("dave")
+        await asyncio.sleep(0.05)
+        await service.disconnect_stream("dave")
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    assert service.script.starts == 1
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from services.tts_engine import FakeTTSEngine, TTSError, TTSOverloaded, TTSSuperseded
+from services.tts_pool import SynthesisPool
+
+
+class SlowEngine(FakeTTSEngine):
+    """Fake engine that takes a while per render; "crash" kills the worker process instead"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def render(self, text):
+        if text == "crash":
+            os._exit(1)
+        time.sleep(self.delay)
+        return super().render(text)
+
+
+def run_pool(scenario, **options):
+    """Run scenario(pool) against a pool of worker processes, shutting the pool down afterwards"""
+    async def main():
+        pool = SynthesisPool(options.pop("engine", SlowEngine()), niceness=0, **options)
+        try:
+            return await scenario(pool), pool.stats()
+        finally:
+            await pool.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_a_newer_message_supersedes_the_queued_one_for_its_stream():
+    async def scenario(pool):
+        speaking = asyncio.create_task(pool.synthesize("uno", key="s1"))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(pool.synthesize("dos", key="s1"))
+        other_stream = asyncio.create_task(pool.synthesize("otro", key="s2"))
+        await asyncio.sleep(0)
+        newest = asyncio.create_task(pool.synthesize("tres", key="s1"))
+        return await asyncio.gather(speaking, waiting, other_stream, newest, return_exceptions=True)
+
+    (speaking, waiting, other_stream, newest), stats = run_pool(
+        scenario, engine=SlowEngine(0.2), workers=1, queue_size=5, timeout=30, supersede=True)
+    engine = FakeTTSEngine()
+    # The job already rendering is not withdrawn; only the queued one for the same stream is
+    assert speaking == engine.render("uno")
+    assert isinstance(waiting, TTSSuperseded)
+    assert other_stream == engine.render("otro")
+    assert newest == engine.render("tres")
+    assert (stats["superseded"], stats["completed"]) == (1, 3)
+
+
+def test_without_supersede_every_queued_job_is_rendered():
+    async def scenario(pool):
+        return await asyncio.gather(*(pool.synthesize(text, key="s1") for text in ("uno", "dos", "tres")))
+
+    results, stats = run_pool(scenario, workers=1, queue_size=5, timeout=30, supersede=False)
+    assert len(results) == 3
+    assert (stats["superseded"], stats["completed"]) == (0, 3)
+
+
+def test_a_job_past_the_timeout_fails_but_keeps_its_worker_busy():
+    async def scenario(pool):
+        with pytest.raises(TTSError, match="timed out"):
+            await pool.synthesize("hola")
+        return pool.stats()
+
+    during, after = run_pool(scenario, engine=SlowEngine(1.0), workers=1, queue_size=5, timeout=0.3)
+    assert during["timed_out"] == 1
+    # The render has not returned, so its process still counts against admission
+    assert during["busy"] == 1
+    assert after["completed"] == 0
+
+
+def test_a_full_queue_rejects_new_jobs():
+    async def scenario(pool):
+        running = asyncio.create_task(pool.synthesize("uno"))
+        queued = asyncio.create_task(pool.synthesize("dos"))
+        await asyncio.sleep(0)
+        with pytest.raises(TTSOverloaded):
+            await pool.synthesize("tres")
+        return await asyncio.gather(running, queued)
+
+    results, stats = run_pool(scenario, engine=SlowEngine(0.2), workers=1, queue_size=1, timeout=30)
+    assert len(results) == 2
+    assert (stats["admitted"], stats["rejected"], stats["completed"]) == (2, 1, 2)
+
+
+def test_the_pool_is_rebuilt_after_a_worker_process_dies():
+    async def scenario(pool):
+        with pytest.raises(TTSError):
+            await pool.synthesize("crash")
+        return await pool.synthesize("hola")
+
+    audio, stats = run_pool(scenario, workers=1, queue_size=5, timeout=30)
+    assert audio == FakeTTSEngine().render("hola")
+    assert (stats["failed"], stats["completed"], stats["busy"]) == (1, 1, 0)
@@ -0,0 +1,100 @@
+import pytest
+
+from models.chat_message import ChatMessage
+from services.tts_priority import (
+    CHATTY_MAX_MESSAGES, CHATTY_PENALTY, NOVELTY_BONUS, ChatWindow, CommentScorer, novelty_key
+)
+
+
+@pytest.mark.parametrize("text, same_as", [
+    ("  Hola   Mundo ", "hola mundo"),
+    ("JAJAJAJA!!", "jajaja"),
+    ("Holaaaa!!", "hola"),
+    ("🔥🔥🔥🔥", "🔥"),
+])
+def test_novelty_key_ignores_case_spacing_repeats_and_punctuation(text, same_as):
+    assert novelty_key(text) == novelty_key(same_as)
+
+
+def test_novelty_key_keeps_different_words_apart():
+    assert novelty_key("hola") != novelty_key("adiós")
+    # Emoji-only and punctuation-only comments are not all the same empty key
+    assert novelty_key("🔥") != novelty_key("???")
+    assert novelty_key("🔥") != ""
+
+
+def test_window_counts_expire_with_the_window():
+    window = ChatWindow(seconds=10, max_messages=100, seen_users=100)
+    assert window.add("ana", "hola", now=0) == (True, 0, 0)
+    assert window.add("ana", "hola", now=5) == (False, 1, 1)
+    # The comment from t=0 has left the window, the one from t=5 has not
+    assert window.add("bob", "hola", now=12) == (True, 0, 1)
+    assert window.add("ana", "hola", now=30) == (False, 0, 0)
+    assert len(window) == 1
+
+
+def test_window_caps_the_number_of_messages():
+    window = ChatWindow(seconds=3600, max_messages=3, seen_users=100)
+    for now in range(5):
+        window.add("ana", "hola", now=now)
+    assert len(window) == 3
+    assert window.add("ana", "hola", now=5) == (False, 2, 2)
+
+
+def test_first_time_outlives_the_window_but_not_the_seen_users_limit():
+    window = ChatWindow(seconds=10, max_messages=100, seen_users=2)
+    window.add("ana", "hola", now=0)
+    # Long after the window, ana is still not new
+    assert window.add("ana", "otra vez", now=100)[0] is False
+    window.add("bob", "hola", now=101)
+    window.add("carla", "hola", now=102)  # pushes the least recent chatter (ana) out
+    assert window.add("ana", "volví", now=103)[0] is True
+
+
+def message(text, user="ana", **standing):
+    return ChatMessage(user=user, message=text, username_stream="s1", **standing)
+
+
+def test_scores_rank_standing_newcomers_and_chatty_users():
+    scorer = CommentScorer(seconds=60, max_messages=100, seen_users=100)
+    for n in range(CHATTY_MAX_MESSAGES + 2):
+        scorer.score(message(f"mensaje {n}", user="chatty"), now=n)
+    scorer.score(message("saludos", user="regular"), now=10)
+
+    standing = {"mod": {"moderator": True}, "gifter": {"gifter": True}, "newcomer": {}, "regular": {}, "chatty": {}}
+    scores = {user: scorer.score(message(f"saludos desde {user}", user=user, **flags), now=20)
+              for user, flags in standing.items()}
+    # Equally long, equally novel comments: only the author's standing separates them
+    assert sorted(scores, key=scores.get, reverse=True) == ["mod", "gifter", "newcomer", "regular", "chatty"]
+
+
+def test_chatty_penalty_is_capped_and_spares_moderators():
+    scorer = CommentScorer(seconds=60, max_messages=100, seen_users=100)
+    scores = [scorer.score(message(f"texto {n}"), now=n) for n in range(CHATTY_MAX_MESSAGES + 3)]
+    # First-time bonus aside, each earlier message costs CHATTY_PENALTY until the cap
+    assert scores[1] - scores[2] == pytest.approx(CHATTY_PENALTY)
+    assert scores[-1] == pytest.approx(scores[-2])
+
+    mods = [scorer.score(message(f"texto {n}", user="mod", moderator=True), now=20 + n) for n in range(4)]
+    assert mods[1] == pytest.approx(mods[3])
+
+
+def test_novelty_decays_with_copies_in_the_window_and_recovers_after_it():
+    scorer = CommentScorer(seconds=10, max_messages=100, seen_users=100)
+    # Different first-time users, so only the copies of the text change the score
+    scores = [scorer.score(message("JAJAJA", user=f"user{n}"), now=n) for n in range(3)]
+    assert scores[0] - scores[1] == pytest.approx(NOVELTY_BONUS - NOVELTY_BONUS / 2)
+    assert scores[1] - scores[2] == pytest.approx(NOVELTY_BONUS / 2 - NOVELTY_BONUS / 3)
+    # Written differently, it is still the same text
+    assert scorer.score(message("jajajaja!!", user="user3"), now=3) < scores[2]
+    # Once the copies leave the window it is novel again
+    assert scorer.score(message("jajaja", user="user4"), now=30) == pytest.approx(scores[0])
+
+
+def test_streams_are_scored_independently():
+    scorer = CommentScorer(seconds=60, max_messages=100, seen_users=100)
+    first = scorer.score(message("hola"), now=0)
+    elsewhere = scorer.score(ChatMessage(user="ana", message="hola", username_stream="@Other"), now=1)
+    assert elsewhere == pytest.approx(first)
+    scorer.forget("s1")
+    assert scorer.stats()["streams"] == 1
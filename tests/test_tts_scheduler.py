@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from models.chat_message import ChatMessage
+from services.tts_scheduler import (
+    POLICY_FIFO, POLICY_LATEST, POLICY_PRIORITY, SpeechCandidate, SpeechQueue, TTSScheduler
+)
+
+
+def candidate(text, score=0.0, order=0):
+    return SpeechCandidate(ChatMessage(user="ana", message=text, username_stream="s1"), score, order)
+
+
+def texts(candidates):
+    return [c.message.message if c else None for c in candidates]
+
+
+def drain(queue):
+    spoken = []
+    while queue:
+        spoken.append(queue.pop())
+    return texts(spoken)
+
+
+def test_latest_keeps_the_newest():
+    queue = SpeechQueue(POLICY_LATEST, 2)
+    left_out = [queue.offer(candidate(text, order=n)) for n, text in enumerate(["a", "b", "c", "d"])]
+    assert texts(left_out) == [None, None, "a", "b"]
+    assert drain(queue) == ["c", "d"]
+
+
+def test_fifo_turns_new_messages_away():
+    queue = SpeechQueue(POLICY_FIFO, 2)
+    left_out = [queue.offer(candidate(text, order=n)) for n, text in enumerate(["a", "b", "c", "d"])]
+    assert texts(left_out) == [None, None, "c", "d"]
+    assert drain(queue) == ["a", "b"]
+
+
+def test_priority_keeps_and_speaks_the_highest_scores():
+    queue = SpeechQueue(POLICY_PRIORITY, 3)
+    offers = [("low", 1.0), ("high", 5.0), ("mid", 3.0), ("lower", 0.5), ("top", 9.0), ("mid again", 3.0)]
+    left_out = [queue.offer(candidate(text, score, n)) for n, (text, score) in enumerate(offers)]
+    # "lower" scores below everything waiting; "top" then displaces "low"; an equal score
+    # displaces the older of the lowest ("mid")
+    assert texts(left_out) == [None, None, None, "lower", "low", "mid"]
+    assert drain(queue) == ["top", "high", "mid again"]
+
+
+def test_priority_speaks_the_oldest_among_equal_scores():
+    queue = SpeechQueue(POLICY_PRIORITY, 3)
+    for n, text in enumerate(["first", "second", "third"]):
+        queue.offer(candidate(text, 1.0, n))
+    assert drain(queue) == ["first", "second", "third"]
+
+
+def test_expire_drops_messages_that_waited_too_long():
+    queue = SpeechQueue(POLICY_FIFO, 5)
+    stale, fresh = candidate("stale", order=0), candidate("fresh", order=1)
+    stale.enqueued_at -= 60
+    queue.offer(stale)
+    queue.offer(fresh)
+    assert queue.expire(30) == 1
+    assert drain(queue) == ["fresh"]
+
+
+class RecordingSpeaker:
+    """speak callback that records what the scheduler picked and plays for a fixed time"""
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.spoken = []
+
+    async def __call__(self, chat_message, waiting):
+        self.spoken.append(chat_message.message)
+        return self.duration
+
+
+def run_scheduler(scheduler, messages, settle=0.1):
+    async def scenario():
+        for text, stream in messages:
+            scheduler.offer(ChatMessage(user="ana", message=text, username_stream=stream))
+        await asyncio.sleep(settle)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (POLICY_LATEST, ["uno", "cuatro"]),
+    (POLICY_FIFO, ["uno", "dos"]),
+])
+def test_scheduler_speaks_one_message_at_a_time(policy, expected):
+    speaker = RecordingSpeaker(duration=0.05)
+    scheduler = TTSScheduler(speaker, policy=policy, queue_size=1, max_age=30, gap=0)
+
+    async def scenario():
+        scheduler.offer(ChatMessage(user="ana", message="uno", username_stream="s1"))
+        await asyncio.sleep(0)  # the player picks "uno" and starts playing it
+        for text in ("dos", "tres", "cuatro"):
+            scheduler.offer(ChatMessage(user="ana", message=text, username_stream="s1"))
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert speaker.spoken == expected
+    assert scheduler.stats()["spoken"] == 2
+    assert scheduler.stats()["dropped"] == 2
+
+
+def test_scheduler_uses_the_scorer_for_priority():
+    speaker = RecordingSpeaker()
+    scheduler = TTSScheduler(speaker, policy=POLICY_PRIORITY, queue_size=2, max_age=30, gap=0)
+    scheduler.scorer = lambda chat_message: {"spam": 0.0, "question": 5.0, "greeting": 2.0}[chat_message.message]
+    run_scheduler(scheduler, [("spam", "s1"), ("question", "s1"), ("greeting", "s1")])
+    assert speaker.spoken == ["question", "greeting"]
+
+
+def test_streams_are_scheduled_independently():
+    speaker = RecordingSpeaker(duration=0.05)
+    scheduler = TTSScheduler(speaker, policy=POLICY_FIFO, queue_size=1, max_age=30, gap=0)
+    run_scheduler(scheduler, [("a1", "s1"), ("b1", "@S2"), ("a2", "s1")], settle=0.2)
+    assert sorted(speaker.spoken) == ["a1", "b1"]
+
+
+def test_scheduler_expires_messages_older_than_max_age():
+    speaker = RecordingSpeaker(duration=0.2)
+    scheduler = TTSScheduler(speaker, policy=POLICY_FIFO, queue_size=5, max_age=0.1, gap=0)
+    run_scheduler(scheduler, [("uno", "s1"), ("dos", "s1"), ("tres", "s1")], settle=0.4)
+    # "uno" was picked at once; the others waited through its 0.2s and expired
+    assert speaker.spoken == ["uno"]
+    assert scheduler.expired == 2
+
+
+def test_clear_forgets_a_stream():
+    speaker = RecordingSpeaker(duration=1.0)
+    scheduler = TTSScheduler(speaker, policy=POLICY_FIFO, queue_size=5, max_age=30, gap=0)
+
+    async def scenario():
+        for text in ("uno", "dos"):
+            scheduler.offer(ChatMessage(user="ana", message=text, username_stream="s1"))
+        await asyncio.sleep(0.05)
+        scheduler.clear("s1")
+        await asyncio.sleep(0.05)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert speaker.spoken == ["uno"]
+    assert (stats["streams"], stats["waiting"]) == (0, 0)
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from config.settings import settings
+from models.chat_message import ChatMessage
+from services.audio_cache import AudioCache
+from services.tts_engine import (
+    ENGINE_FAKE, EspeakEngine, FakeTTSEngine, SubprocessTTSEngine, concat_wav, create_tts_engine, wav_duration
+)
+from services.tts_scheduler import TTSScheduler
+from services.tts_service import TTSService
+from services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    client = None
+
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.received.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.received.append(data)
+
+    def events(self, message_type):
+        return [event for event in self.received if isinstance(event, dict) and event.get("type") == message_type]
+
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    """A TTSService on the fake engine, synthesizing in the event loop, with no pause between messages"""
+    monkeypatch.setattr(settings, "TTS_POOL_WORKERS", 0)
+    service = TTSService(engine=FakeTTSEngine(), cache=AudioCache(directory=str(tmp_path)))
+    service.scheduler = TTSScheduler(service.announce, gap=0)
+    return service
+
+
+def test_fake_engine_is_deterministic_wav():
+    engine = FakeTTSEngine()
+    audio = engine.render("hola")
+    assert audio[:4] == b"RIFF"
+    assert audio == engine.render("hola")
+    assert audio != engine.render("adiós")
+    assert wav_duration(engine.render("a longer sentence")) > wav_duration(audio)
+
+
+def test_concat_wav_adds_durations():
+    engine = FakeTTSEngine()
+    first, second = engine.render("uno"), engine.render("dos tres")
+    assert wav_duration(concat_wav([first, second])) == pytest.approx(wav_duration(first) + wav_duration(second))
+
+
+def test_create_tts_engine():
+    assert create_tts_engine("none") is None
+    assert create_tts_engine(ENGINE_FAKE).name == ENGINE_FAKE
+    assert create_tts_engine("festival") is None
+
+
+def test_subprocess_engines_must_define_their_command():
+    with pytest.raises(TypeError):
+        SubprocessTTSEngine("true")
+
+
+def test_espeak_command_passes_text_as_one_argument():
+    command = EspeakEngine(binary="espeak-ng", voice="es", rate=150).command("-x hola")
+    assert command[0] == "espeak-ng"
+    assert command[-1] == "-x hola"
+    assert "es" in command and "150" in command
+
+
+def test_speaking_is_announced_only_to_clients_with_tts(service):
+    async def scenario():
+        manager = WebSocketManager()
+        service.set_dependencies(manager)
+        await manager.start()
+        listener, muted = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(listener)
+        (await manager.connect(muted)).tts = False
+
+        await service.handle_chat_message(ChatMessage(user="ana", message="hola a todos", username_stream="s1"))
+        await asyncio.sleep(0.5)
+        await service.stop()
+        await manager.stop()
+        return listener, muted
+
+    listener, muted = asyncio.run(scenario())
+    [event] = listener.events("tts_speaking")
+    assert muted.events("tts_speaking") == []
+    assert (event["user"], event["message"], event["engine"]) == ("ana", "hola a todos", ENGINE_FAKE)
+    assert event["url"] == f"/api/tts/audio/{event['id']}"
+    audio = asyncio.run(service.get_audio(event["id"]))
+    assert audio[:4] == b"RIFF"
+    assert event["duration"] == pytest.approx(wav_duration(audio), abs=0.001)
+
+
+def test_unknown_audio_ids_are_not_served(service):
+    assert asyncio.run(service.get_audio("../../etc/passwd")) is None
+    assert asyncio.run(service.get_audio("0" * 32)) is None
+
+
+def test_disabled_tts_skips_messages(service):
+    async def scenario():
+        service._on_tts_status({"type": "tts_status", "enabled": False})
+        await service.handle_chat_message(ChatMessage(user="ana", message="hola", username_stream="s1"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert service.skipped == 1
+    assert service.synthesized == 0
@@ -0,0 +1,276 @@
+import asyncio
+import json
+
+from services import wire_format
+from services.websocket_connection import ClientConnection
+from services.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """Records frames and close codes; sends block while gate is cleared"""
+
+    client = None
+
+    def __init__(self):
+        self.frames = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await self.gate.wait()
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        await self.gate.wait()
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    def events(self):
+        """Decoded JSON events, batches flattened"""
+        events = []
+        for frame in self.frames:
+            value = json.loads(frame)
+            events.extend(value if isinstance(value, list) else [value])
+        return events
+
+    def of_type(self, message_type):
+        return [event for event in self.events() if event["type"] == message_type]
+
+
+def chat(text, stream="s1"):
+    return {"type": "chat_message", "user": "ana", "message": text, "tts_enabled": True, "username_stream": stream}
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def queued(client):
+    return [json.loads(frame)["message"] for frame, _ in client._queue]
+
+
+# Overflow policies (a client whose writer is not running, so the queue only fills)
+
+def make_client(queue_size=3, max_overflows=100):
+    return ClientConnection(FakeWebSocket(), on_failure=lambda client: None, queue_size=queue_size, max_overflows=max_overflows)
+
+
+def frame(text, message_type="chat_message"):
+    return json.dumps({"type": message_type, "message": text})
+
+
+def test_full_queue_drops_oldest_droppable_frame():
+    client = make_client()
+    for text in "abcde":
+        assert client.enqueue(frame(text), "chat_message")
+    assert queued(client) == ["c", "d", "e"]
+    assert client.frames_dropped == 2
+
+
+def test_never_drop_frames_survive_overflow():
+    client = make_client()
+    client.enqueue(frame("status 1", "connection_status"), "connection_status")
+    client.enqueue(frame("a"), "chat_message")
+    client.enqueue(frame("status 2", "connection_status"), "connection_status")
+    # The chat frame makes room for a new chat frame...
+    client.enqueue(frame("b"), "chat_message")
+    assert queued(client) == ["status 1", "status 2", "b"]
+    client.enqueue(frame("status 3", "connection_status"), "connection_status")
+    assert queued(client) == ["status 1", "status 2", "status 3"]
+    # ...but with only never-drop frames waiting, a new chat frame is discarded
+    client.enqueue(frame("c"), "chat_message")
+    assert queued(client) == ["status 1", "status 2", "status 3"]
+    # and a never-drop frame is queued past the limit rather than lost
+    client.enqueue(frame("status 4", "connection_status"), "connection_status")
+    assert queued(client) == ["status 1", "status 2", "status 3", "status 4"]
+
+
+def test_enqueue_reports_a_slow_consumer_after_max_overflows():
+    client = make_client(queue_size=2, max_overflows=3)
+    results = [client.enqueue(frame(str(n)), "chat_message") for n in range(5)]
+    assert results == [True, True, True, True, False]
+
+
+# Manager: eviction and send failures
+
+def test_slow_consumer_is_evicted_and_closed():
+    async def scenario():
+        manager = WebSocketManager()
+        slow = FakeWebSocket()
+        slow.gate.clear()
+        client = await manager.connect(slow)
+        client.queue_size, client.max_overflows = 2, 3
+        await settle()  # the writer is now stuck sending "hello"
+        for n in range(10):
+            await manager.broadcast_json(chat(str(n)))
+        await settle()
+        return manager, slow
+
+    manager, slow = asyncio.run(scenario())
+    assert manager.active_connections == []
+    assert slow.closed_with == 1008
+
+
+def test_missed_send_deadline_removes_and_closes_the_client():
+    async def scenario():
+        manager = WebSocketManager()
+        stuck = FakeWebSocket()
+        stuck.gate.clear()
+        client = await manager.connect(stuck)
+        client.send_timeout = 0.05
+        await asyncio.sleep(0.2)
+        return manager, stuck
+
+    manager, stuck = asyncio.run(scenario())
+    assert manager.active_connections == []
+    assert stuck.closed_with == 1011
+
+
+# Routing by (stream, type)
+
+def test_events_are_routed_by_stream_and_type():
+    async def scenario():
+        manager = WebSocketManager()
+        everything, alice_chat, status_only, muted = (FakeWebSocket() for _ in range(4))
+        for websocket in (everything, alice_chat, status_only, muted):
+            await manager.connect(websocket)
+        manager.subscribe(alice_chat, streams=["@Alice"], message_types=["chat"])
+        manager.subscribe(status_only, message_types=["status"])
+        manager.subscribe(muted, tts=False)
+
+        await manager.broadcast_json(chat("hola alice", "alice"), stream="alice")
+        await manager.broadcast_json(chat("hola bob", "bob"), stream="bob")
+        await manager.broadcast_json({"type": "connection_status", "connected": True}, stream="alice")
+        await manager.broadcast_json({"type": "tts_status", "enabled": True})
+        await manager.broadcast_json({"type": "tts_speaking", "message": "hola alice"}, stream="alice")
+        await settle()
+        return everything, alice_chat, status_only, muted
+
+    everything, alice_chat, status_only, muted = asyncio.run(scenario())
+    types = lambda websocket: [event["type"] for event in websocket.events() if event["type"] != "hello"]
+    assert types(everything) == ["chat_message", "chat_message", "connection_status", "tts_status", "tts_speaking"]
+    assert [event["message"] for event in alice_chat.of_type("chat_message")] == ["hola alice"]
+    assert types(alice_chat) == ["chat_message"]
+    assert types(status_only) == ["connection_status", "tts_status"]
+    # TTS off: chat still arrives, marked not to be spoken, and nothing is announced as speaking
+    assert types(muted) == ["chat_message", "chat_message", "connection_status", "tts_status"]
+    assert all(event["tts_enabled"] is False for event in muted.of_type("chat_message"))
+
+
+def test_each_payload_variant_is_serialized_once():
+    async def scenario():
+        manager = WebSocketManager()
+        for encoding, tts in ((wire_format.JSON, True), (wire_format.JSON, True), (wire_format.JSON, False),
+                              (wire_format.COMPACT, True), (wire_format.COMPACT, True)):
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, encoding=encoding)
+            manager.subscribe(websocket, tts=tts)
+        await manager.broadcast_json(chat("hola"), stream="s1")
+        await manager.broadcast_json({"type": "tts_status", "enabled": True})
+        return manager.get_stats()["serialization"]
+
+    stats = asyncio.run(scenario())
+    # chat: json, json with TTS off, compact; tts_status: json, compact
+    assert stats["events_broadcast"] == 2
+    assert stats["serializations"] == 5
+    assert stats["max_per_event"] == 3
+
+
+# Resume
+
+def resume_scenario(replay_buffer_size, missed, epoch=None, last_seq=None):
+    async def scenario():
+        manager = WebSocketManager(replay_buffer_size=replay_buffer_size)
+        for n in range(3):
+            await manager.broadcast_json(chat(f"seen {n}"), stream="s1")
+        for n in range(missed):
+            await manager.broadcast_json(chat(f"missed {n}"), stream="s1")
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        replayed = manager.resume(websocket, epoch or manager.epoch, {"s1": 3 if last_seq is None else last_seq})
+        await settle()
+        return replayed, websocket
+
+    return asyncio.run(scenario())
+
+
+def test_resume_replays_missed_events_within_the_buffer():
+    replayed, websocket = resume_scenario(replay_buffer_size=10, missed=4)
+    assert replayed == 4
+    events = websocket.of_type("chat_message")
+    assert [event["message"] for event in events] == [f"missed {n}" for n in range(4)]
+    assert [event["seq"] for event in events] == [4, 5, 6, 7]
+    assert all(event["replayed"] for event in events)
+    assert websocket.of_type("resync_required") == []
+
+
+def test_resume_beyond_the_buffer_requires_resync():
+    replayed, websocket = resume_scenario(replay_buffer_size=3, missed=5)
+    assert replayed == 0
+    assert websocket.of_type("chat_message") == []
+    [resync] = websocket.of_type("resync_required")
+    assert (resync["stream"], resync["seq"]) == ("s1", 8)
+
+
+def test_resume_across_an_epoch_change_requires_resync():
+    replayed, websocket = resume_scenario(replay_buffer_size=10, missed=1, epoch="restarted")
+    assert replayed == 0
+    assert len(websocket.of_type("resync_required")) == 1
+
+
+def test_resume_when_up_to_date_sends_nothing():
+    replayed, websocket = resume_scenario(replay_buffer_size=10, missed=0)
+    assert replayed == 0
+    assert [event["type"] for event in websocket.events()] == ["hello"]
+
+
+# Batching
+
+def test_batch_clients_get_waiting_frames_as_one_array():
+    async def scenario():
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        await manager.connect(websocket, batch=True)
+        await settle()  # writer blocked on "hello"
+        for n in range(5):
+            await manager.broadcast_json(chat(str(n)), stream="s1")
+        websocket.gate.set()
+        await asyncio.sleep(0.1)
+        return websocket
+
+    websocket = asyncio.run(scenario())
+    assert len(websocket.frames) == 2
+    assert [event["message"] for event in json.loads(websocket.frames[1])] == ["0", "1", "2", "3", "4"]
+
+
+# Heartbeat
+
+def test_reap_pings_idle_clients_and_evicts_silent_ones():
+    async def scenario():
+        manager = WebSocketManager()
+        manager.heartbeat_interval, manager.heartbeat_timeout = 10, 30
+        active, idle, silent, exempt = (FakeWebSocket() for _ in range(4))
+        clients = {}
+        for name, websocket in (("active", active), ("idle", idle), ("silent", silent), ("exempt", exempt)):
+            clients[name] = await manager.connect(websocket, heartbeat=name != "exempt")
+        clients["idle"].last_activity -= 15
+        clients["silent"].last_activity -= 45
+        clients["exempt"].last_activity -= 45
+        reaped = manager.reap()
+        await settle()
+        return manager, reaped, active, idle, silent, exempt
+
+    manager, reaped, active, idle, silent, exempt = asyncio.run(scenario())
+    assert reaped == 1
+    assert silent.closed_with == 1001
+    assert len(manager.active_connections) == 3
+    assert len(idle.of_type("ping")) == 1
+    assert active.of_type("ping") == [] and exempt.of_type("ping") == []
@@ -0,0 +1,93 @@
+from datetime import datetime
+import json
+
+import pytest
+
+from services import wire_format
+from services.wire_format import COMPACT, JSON, KEY_ALIASES, MSGPACK, TYPE_TAGS, decode, encode, encode_batch
+
+TIMESTAMP = datetime(2024, 5, 1, 20, 0, 0, 123000)
+EPOCH_MS = int(TIMESTAMP.timestamp() * 1000)
+
+CHAT_EVENT = {
+    "type": "chat_message",
+    "seq": 42,
+    "stream": "streamer",
+    "id": "m1",
+    "user": "ana",
+    "message": "hola ñandú 🔥",
+    "timestamp": TIMESTAMP.isoformat(),
+    "username_stream": "streamer",
+    "tts_enabled": True,
+}
+
+# msgpack is optional; its cases run where the package is installed
+ENCODINGS = wire_format.available_encodings()
+
+
+def expected(data, encoding):
+    """What a client decodes: the event itself, with epoch-millisecond timestamps in the compact schema"""
+    if encoding == JSON or "timestamp" not in data:
+        return data
+    return {**data, "timestamp": EPOCH_MS}
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_chat_message_round_trip(encoding):
+    assert decode(encode(CHAT_EVENT, encoding), encoding) == expected(CHAT_EVENT, encoding)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_tts_disabled_round_trip(encoding):
+    event = {**CHAT_EVENT, "tts_enabled": False}
+    assert decode(encode(event, encoding), encoding) == expected(event, encoding)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("message_type", sorted(TYPE_TAGS))
+def test_every_type_tag_round_trips(encoding, message_type):
+    event = {"type": message_type, "stream": "streamer", "connected": True, "username": "streamer", "enabled": False,
+             "error": None}
+    if message_type == "chat_message":
+        event["tts_enabled"] = True  # implied by its absence in the compact schema
+    assert decode(encode(event, encoding), encoding) == event
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_unknown_types_and_keys_pass_through(encoding):
+    event = {"type": "future_event", "payload": {"a": [1, 2]}, "seq": 1}
+    assert decode(encode(event, encoding), encoding) == event
+
+
+def test_compact_schema_uses_aliases_and_tags():
+    compact = json.loads(encode(CHAT_EVENT, COMPACT))
+    assert compact["t"] == TYPE_TAGS["chat_message"]
+    assert compact["ts"] == EPOCH_MS
+    # tts_enabled is only sent when false
+    assert "x" not in compact
+    assert set(compact) == {KEY_ALIASES.get(key, key) for key in CHAT_EVENT if key != "tts_enabled"}
+    assert json.loads(encode({**CHAT_EVENT, "tts_enabled": False}, COMPACT))["x"] == 0
+
+
+def test_aliases_and_tags_are_unambiguous():
+    assert len(set(KEY_ALIASES.values())) == len(KEY_ALIASES)
+    assert not set(KEY_ALIASES.values()) & set(KEY_ALIASES)
+    assert len(set(TYPE_TAGS.values())) == len(TYPE_TAGS)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+# msgpack array headers change at 16 and 65536 elements
+@pytest.mark.parametrize("count", [0, 1, 15, 16, 300, 65536])
+def test_batch_round_trip(encoding, count):
+    events = [{**CHAT_EVENT, "seq": seq, "tts_enabled": seq % 3 != 0} for seq in range(count)]
+    frame = encode_batch([encode(event, encoding) for event in events], encoding)
+    assert isinstance(frame, bytes if encoding == MSGPACK else str)
+    assert decode(frame, encoding) == [expected(event, encoding) for event in events]
+
+
+def test_negotiate_falls_back_to_json(monkeypatch):
+    assert wire_format.negotiate("COMPACT ") == COMPACT
+    assert wire_format.negotiate("protobuf") == JSON
+    assert wire_format.negotiate(None) == JSON
+    monkeypatch.setattr(wire_format, "msgpack", None)
+    assert wire_format.negotiate(MSGPACK) == JSON
@@ -0,0 +1,122 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from services.database import BufferedChatWriter
+from services.spill_log import FSYNC_NEVER, SpillLog
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.reachable = True
+
+    async def command(self, name):
+        if not self.reachable:
+            raise ConnectionError("database down")
+
+
+class FakeCollection:
+    """Records insert_many batches; fail can be set to an exception to raise instead"""
+
+    def __init__(self):
+        self.database = FakeDatabase()
+        self.batches = []
+        self.fail = None
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise self.fail
+        self.batches.append(list(documents))
+
+    @property
+    def documents(self):
+        return [document for batch in self.batches for document in batch]
+
+
+def bulk_error(*codes):
+    return BulkWriteError({"writeErrors": [{"index": i, "code": code, "errmsg": f"error {code}"} for i, code in enumerate(codes)]})
+
+
+def test_flush_on_batch_size():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BufferedChatWriter(collection, batch_size=3, flush_interval=60, max_buffer=100)
+        writer.start()
+        for n in range(3):
+            writer.add({"n": n})
+        await asyncio.sleep(0.05)
+        batches = list(collection.batches)
+        await writer.stop()
+        return batches
+
+    assert asyncio.run(scenario()) == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+
+
+def test_flush_on_interval():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BufferedChatWriter(collection, batch_size=100, flush_interval=0.2, max_buffer=100)
+        writer.start()
+        writer.add({"n": 1})
+        await asyncio.sleep(0.05)
+        before = len(collection.documents)
+        await asyncio.sleep(0.3)
+        after = len(collection.documents)
+        await writer.stop()
+        return before, after
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_failed_batch_is_spilled_and_replayed(tmp_path):
+    async def scenario():
+        collection = FakeCollection()
+        spill = SpillLog(str(tmp_path), 1 << 20, FSYNC_NEVER)
+        writer = BufferedChatWriter(collection, batch_size=10, flush_interval=60, max_buffer=100, spill=spill)
+        collection.fail = ConnectionError("database down")
+        collection.database.reachable = False
+        writer.add({"n": 1})
+        await writer.flush()
+        assert writer.documents_spilled == 1
+        assert not writer.db_available
+
+        collection.fail = None
+        collection.database.reachable = True
+        await writer.replay_spill()
+        return collection, writer, spill
+
+    collection, writer, spill = asyncio.run(scenario())
+    assert [document["n"] for document in collection.documents] == [1]
+    assert writer.documents_replayed == 1
+    assert not spill.has_pending()
+
+
+def replay_with(tmp_path, error, replays=1):
+    async def scenario():
+        collection = FakeCollection()
+        spill = SpillLog(str(tmp_path), 1 << 20, FSYNC_NEVER)
+        spill.append([{"n": 1}, {"n": 2}])
+        writer = BufferedChatWriter(collection, batch_size=10, flush_interval=60, max_buffer=100, spill=spill)
+        collection.fail = error
+        for _ in range(replays):
+            await writer.replay_spill()
+        return writer, spill
+
+    return asyncio.run(scenario())
+
+
+def test_replay_treats_duplicates_as_replayed(tmp_path):
+    writer, spill = replay_with(tmp_path, bulk_error(11000, 11000))
+    assert writer.documents_replayed == 2
+    assert not spill.has_pending()
+
+
+def test_replay_quarantines_segments_with_other_write_errors(tmp_path):
+    writer, spill = replay_with(tmp_path, bulk_error(11000, 121), replays=3)
+    assert writer.documents_replayed == 0
+    # Set aside once instead of being retried on every flush
+    assert writer.segments_quarantined == 1
+    assert spill.segments() == []
+    [quarantined] = spill.quarantined()
+    assert spill.read_segment(quarantined) == [{"n": 1}, {"n": 2}]
+    assert spill.stats()["quarantined_segments"] == 1